@@ -3,6 +3,12 @@ from airflow.operators.bash import BashOperator
 from airflow.operators.python import PythonOperator
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from datetime import datetime, timedelta
+from etl.config import SPARK_POOL
+from etl.metrics import push_task_metrics
+from etl.operators import InferSchemaOperator, KafkaProduceOperator
+from etl.spark_submit import build_job_package, spark_submit_command
+from etl.throughput import plan_job_throughput
+from etl.warehouse import CURRENCY_RATES_SQL, FACT_TRANSACTIONS_SQL, MANAGE_FACT_PARTITIONS_SQL
 
 default_args = {
     'owner': 'data-engineer',
@@ -12,8 +18,79 @@ default_args = {
     'email_on_retry': False,
     'retries': 1,
     'retry_delay': timedelta(minutes=5),
+    # Длительность, строки и байты задачи в Pushgateway
+    'on_success_callback': push_task_metrics,
 }
 
+
+# Поля, которые используют Spark job'ы: типы закреплены, остальное выводится по выборке
+RAW_SCHEMA_HINTS = {
+    'user_id': 'integer',
+    'name': 'string',
+    'email': 'string',
+    'transaction_id': 'string',
+    'amount': 'double',
+    'currency': 'string',
+    'timestamp': 'timestamp',
+}
+
+PROCESSED_SCHEMA_HINTS = dict(
+    RAW_SCHEMA_HINTS,
+    city='string',
+    registration_date='date',
+    amount_usd='double',
+    transaction_date='date',
+    transaction_hour='integer',
+    user_city='string',
+    user_email_domain='string',
+)
+
+
+def generate_source_records(users=20, transactions=30):
+    """Симуляция извлечения данных из CSV источника и JSON API"""
+    import random
+
+    for i in range(1, users + 1):
+        yield {
+            'source': 'csv',
+            'user_id': random.randint(1, 100),
+            'name': f'User{i}',
+            'email': f'user{i}@company.com',
+            'city': 'Moscow',
+            'registration_date': f'2025-01-0{random.randint(1, 9)}',
+        }
+
+    for i in range(1, transactions + 1):
+        yield {
+            'source': 'api',
+            'transaction_id': f'api_tx_{i}',
+            'user_id': random.randint(1, 100),
+            'amount': random.randint(1000, 50999),
+            'currency': random.choice(['USD', 'EUR', 'RUB']),
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+
+
+def compact_transactions_lake():
+    """Перенос транзакций из landing в lake и компакция мелких файлов"""
+    from etl.lake import compact_lake
+
+    return compact_lake(['transactions'])
+
+
+def propose_compact_fact_ddl():
+    """Компактный DDL dwh.fact_transactions по профилю загруженных данных"""
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import POSTGRES_CONN_ID
+    from etl.ddl import compact_table_ddl, table_profile, write_ddl_proposal
+
+    dsn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_uri()
+    schema, profiles = table_profile(dsn, 'dwh.fact_transactions')
+    proposal = compact_table_ddl('dwh.fact_transactions', schema, profiles)
+    write_ddl_proposal(proposal)
+    return {key: proposal[key] for key in ('table', 'current_row_bytes', 'proposed_row_bytes', 'saved_ratio')}
+
+
 with DAG(
         'comprehensive_etl_pipeline',
         default_args=default_args,
@@ -42,6 +119,13 @@ with DAG(
         """,
     )
 
+    # Курсы валют для пересчёта amount_usd (broadcast join в Spark)
+    create_currency_rates = PostgresOperator(
+        task_id='create_currency_rates',
+        postgres_conn_id='postgres_default',
+        sql=CURRENCY_RATES_SQL,
+    )
+
     # Этап 2: Создание схемы данных
     create_data_warehouse_schema = PostgresOperator(
         task_id='create_data_warehouse_schema',
@@ -50,18 +134,6 @@ with DAG(
         -- Создание схемы для хранилища данных
         CREATE SCHEMA IF NOT EXISTS dwh;
 
-        -- Таблица фактов транзакций
-        CREATE TABLE IF NOT EXISTS dwh.fact_transactions (
-            transaction_id VARCHAR(100) PRIMARY KEY,
-            user_id INTEGER,
-            amount DECIMAL(15,2),
-            currency VARCHAR(10),
-            amount_usd DECIMAL(15,2),
-            transaction_date DATE,
-            transaction_hour INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-
         -- Таблица измерений пользователей
         CREATE TABLE IF NOT EXISTS dwh.dim_users (
             user_id INTEGER PRIMARY KEY,
@@ -81,18 +153,69 @@ with DAG(
             avg_amount DECIMAL(15,2),
             max_amount DECIMAL(15,2),
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             PRIMARY KEY (date_key, currency)
         );
+        ALTER TABLE dwh.agg_daily_transactions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+        -- Отметки (high-water mark) инкрементальных расчётов
+        CREATE TABLE IF NOT EXISTS dwh.etl_watermarks (
+            name VARCHAR(100) PRIMARY KEY,
+            last_value TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- Staging таблицы для пакетной загрузки (без WAL)
+        CREATE UNLOGGED TABLE IF NOT EXISTS dwh.stg_fact_transactions (
+            transaction_id VARCHAR(100),
+            user_id INTEGER,
+            amount DECIMAL(15,2),
+            currency VARCHAR(10),
+            amount_usd DECIMAL(15,2),
+            transaction_date DATE,
+            transaction_hour INTEGER
+        );
+        ALTER TABLE dwh.stg_fact_transactions ADD COLUMN IF NOT EXISTS user_city VARCHAR(100);
+        ALTER TABLE dwh.stg_fact_transactions ADD COLUMN IF NOT EXISTS user_email_domain VARCHAR(200);
+
+        CREATE UNLOGGED TABLE IF NOT EXISTS dwh.stg_dim_users (
+            user_id INTEGER,
+            name VARCHAR(200),
+            email VARCHAR(200),
+            city VARCHAR(100),
+            registration_date DATE
+        );
+
+        -- Журнал загруженных micro-batch (защита от повторной загрузки)
+        CREATE TABLE IF NOT EXISTS dwh.etl_batch_log (
+            query_name VARCHAR(100),
+            batch_id BIGINT,
+            users_rows INTEGER,
+            transactions_rows INTEGER,
+            loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (query_name, batch_id)
+        );
 
-        -- Индексы для оптимизации
-        CREATE INDEX IF NOT EXISTS idx_fact_transactions_date ON dwh.fact_transactions(transaction_date);
-        CREATE INDEX IF NOT EXISTS idx_fact_transactions_user ON dwh.fact_transactions(user_id);
         """,
     )
 
+    # Секционированная таблица фактов транзакций (etl.warehouse)
+    create_fact_transactions = PostgresOperator(
+        task_id='create_fact_transactions',
+        postgres_conn_id='postgres_default',
+        sql=FACT_TRANSACTIONS_SQL,
+    )
+
+    # Секции на ближайшие месяцы и архивирование старых
+    manage_fact_partitions = PostgresOperator(
+        task_id='manage_fact_partitions',
+        postgres_conn_id='postgres_default',
+        sql=MANAGE_FACT_PARTITIONS_SQL,
+    )
+
     # Этап 3: Извлечение данных (Extract)
-    extract_data_from_sources = BashOperator(
-        task_id='extract_data_from_sources',
+    create_etl_topics = BashOperator(
+        task_id='create_etl_topics',
         bash_command="""
         echo "=== Data Extraction Phase ==="
 
@@ -110,269 +233,183 @@ with DAG(
             --partitions 4 \\
             --replication-factor 1 \\
             --if-not-exists
-
-        # Симуляция извлечения данных из различных источников
-        echo "Extracting data from CSV source..."
-        for i in {1..20}; do
-            echo "{\\"source\\": \\"csv\\", \\"user_id\\": $((RANDOM % 100 + 1)), \\"name\\": \\"User$i\\", \\"email\\": \\"user$i@company.com\\", \\"city\\": \\"Moscow\\", \\"registration_date\\": \\"2025-01-0$((RANDOM % 9 + 1))\\"}" | \\
-            docker exec -i kafka kafka-console-producer \\
-                --topic etl-raw-data \\
-                --bootstrap-server kafka:9092
-        done
-
-        echo "Extracting data from JSON API..."
-        for i in {1..30}; do
-            amount=$((RANDOM % 50000 + 1000))
-            currencies=("USD" "EUR" "RUB")
-            currency=${currencies[$((RANDOM % 3))]}
-            user_id=$((RANDOM % 100 + 1))
-            echo "{\\"source\\": \\"api\\", \\"transaction_id\\": \\"api_tx_$i\\", \\"user_id\\": $user_id, \\"amount\\": $amount, \\"currency\\": \\"$currency\\", \\"timestamp\\": \\"$(date -u +%Y-%m-%dT%H:%M:%SZ)\\"}" | \\
-            docker exec -i kafka kafka-console-producer \\
-                --topic etl-raw-data \\
-                --bootstrap-server kafka:9092
-        done
-
-        echo "Data extraction completed!"
         """,
     )
 
+    # Симуляция извлечения данных из различных источников (пакетная отправка)
+    extract_data_from_sources = KafkaProduceOperator(
+        task_id='extract_data_from_sources',
+        topic='etl-raw-data',
+        messages_callable=generate_source_records,
+        messages_kwargs={'users': 20, 'transactions': 30},
+        key='user_id',
+    )
+
+    # Схема сырых сообщений по выборке из топика
+    infer_raw_schema = InferSchemaOperator(
+        task_id='infer_raw_schema',
+        name='etl-raw-data',
+        topic='etl-raw-data',
+        hints=RAW_SCHEMA_HINTS,
+    )
+
+    # Сборка пакета Spark job'ов для --py-files
+    build_spark_package = PythonOperator(
+        task_id='build_job_package',
+        python_callable=build_job_package,
+    )
+
+    # Размер micro-batch и ресурсы трансформации по отставанию от etl-raw-data
+    plan_transform_throughput = PythonOperator(
+        task_id='plan_transform_throughput',
+        python_callable=plan_job_throughput,
+        op_kwargs={'job': 'etl_transform', 'queries': {'etl_transform': ['etl-raw-data']}},
+    )
+
     # Этап 4: Трансформация данных через Spark (Transform)
     transform_data_with_spark = BashOperator(
         task_id='transform_data_with_spark',
-        bash_command="""
-        echo "=== Data Transformation Phase ==="
-
-        # Создание Spark job для трансформации
-        cat > /tmp/etl_transform_job.py << 'EOF'
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import *
-from pyspark.sql.types import *
-import json
-
-spark = SparkSession.builder \\
-    .appName("ETL_Transform") \\
-    .master("spark://spark-master:7077") \\
-    .config("spark.sql.adaptive.enabled", "true") \\
-    .getOrCreate()
-
-# Чтение сырых данных из Kafka
-raw_df = spark \\
-    .readStream \\
-    .format("kafka") \\
-    .option("kafka.bootstrap.servers", "kafka:9092") \\
-    .option("subscribe", "etl-raw-data") \\
-    .option("startingOffsets", "earliest") \\
-    .load()
-
-# Парсинг JSON данных
-parsed_df = raw_df.select(
-    from_json(col("value").cast("string"), 
-        StructType([
-            StructField("source", StringType(), True),
-            StructField("user_id", IntegerType(), True),
-            StructField("name", StringType(), True),
-            StructField("email", StringType(), True),
-            StructField("city", StringType(), True),
-            StructField("registration_date", StringType(), True),
-            StructField("transaction_id", StringType(), True),
-            StructField("amount", DoubleType(), True),
-            StructField("currency", StringType(), True),
-            StructField("timestamp", StringType(), True)
-        ])
-    ).alias("data"),
-    col("timestamp").alias("kafka_timestamp")
-).select("data.*", "kafka_timestamp")
-
-# Трансформации
-transformed_df = parsed_df \\
-    .withColumn("processed_at", current_timestamp()) \\
-    .withColumn("amount_usd", 
-        when(col("currency") == "RUB", col("amount") / 100)
-        .when(col("currency") == "EUR", col("amount") * 1.1)
-        .otherwise(col("amount"))
-    ) \\
-    .withColumn("transaction_date", 
-        when(col("timestamp").isNotNull(), to_date(col("timestamp")))
-        .otherwise(current_date())
-    ) \\
-    .withColumn("transaction_hour", 
-        when(col("timestamp").isNotNull(), hour(col("timestamp")))
-        .otherwise(hour(current_timestamp()))
-    ) \\
-    .withColumn("email_domain", 
-        when(col("email").isNotNull(), 
-            regexp_extract(col("email"), "@(.+)", 1))
-        .otherwise(lit("unknown"))
+        bash_command=spark_submit_command('etl_transform', dependencies=['kafka', 'postgres'],
+                                          throughput_task_id='plan_transform_throughput'),
+        pool=SPARK_POOL,
     )
 
-# Запись обработанных данных обратно в Kafka
-query = transformed_df \\
-    .select(to_json(struct("*")).alias("value")) \\
-    .writeStream \\
-    .format("kafka") \\
-    .option("kafka.bootstrap.servers", "kafka:9092") \\
-    .option("topic", "etl-processed-data") \\
-    .option("checkpointLocation", "/tmp/spark-checkpoint") \\
-    .outputMode("append") \\
-    .start()
-
-print("Transformation job started, processing for 60 seconds...")
-query.awaitTermination(60)
-query.stop()
-
-print("Data transformation completed!")
-spark.stop()
-EOF
-
-        # Запуск Spark трансформации
-        docker exec spark-master /opt/spark/bin/spark-submit \\
-            --master spark://spark-master:7077 \\
-            --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.5.1 \\
-            --executor-memory 1g \\
-            --total-executor-cores 2 \\
-            /tmp/etl_transform_job.py
-        """,
+    # Схема обработанных сообщений для job'а загрузки
+    infer_processed_schema = InferSchemaOperator(
+        task_id='infer_processed_schema',
+        name='etl-processed-data',
+        topic='etl-processed-data',
+        hints=PROCESSED_SCHEMA_HINTS,
+    )
+
+    # Размер micro-batch и ресурсы загрузки по отставанию от etl-processed-data
+    plan_load_throughput = PythonOperator(
+        task_id='plan_load_throughput',
+        python_callable=plan_job_throughput,
+        op_kwargs={'job': 'etl_load',
+                   'queries': {'warehouse_load': ['etl-processed-data'],
+                               'lake_transactions': ['etl-processed-data']}},
     )
 
     # Этап 5: Загрузка данных в PostgreSQL (Load)
     load_data_to_warehouse = BashOperator(
         task_id='load_data_to_warehouse',
-        bash_command="""
-        echo "=== Data Loading Phase ==="
-
-        # Создание Spark job для загрузки в PostgreSQL
-        cat > /tmp/etl_load_job.py << 'EOF'
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import *
-from pyspark.sql.types import *
-
-spark = SparkSession.builder \\
-    .appName("ETL_Load") \\
-    .master("spark://spark-master:7077") \\
-    .config("spark.sql.adaptive.enabled", "true") \\
-    .getOrCreate()
-
-# Чтение обработанных данных из Kafka
-processed_df = spark \\
-    .readStream \\
-    .format("kafka") \\
-    .option("kafka.bootstrap.servers", "kafka:9092") \\
-    .option("subscribe", "etl-processed-data") \\
-    .option("startingOffsets", "earliest") \\
-    .load()
-
-# Парсинг обработанных данных
-final_df = processed_df.select(
-    from_json(col("value").cast("string"), 
-        StructType([
-            StructField("source", StringType(), True),
-            StructField("user_id", IntegerType(), True),
-            StructField("name", StringType(), True),
-            StructField("email", StringType(), True),
-            StructField("city", StringType(), True),
-            StructField("registration_date", StringType(), True),
-            StructField("transaction_id", StringType(), True),
-            StructField("amount", DoubleType(), True),
-            StructField("currency", StringType(), True),
-            StructField("timestamp", StringType(), True),
-            StructField("amount_usd", DoubleType(), True),
-            StructField("transaction_date", StringType(), True),
-            StructField("transaction_hour", IntegerType(), True),
-            StructField("email_domain", StringType(), True),
-            StructField("processed_at", StringType(), True)
-        ])
-    ).alias("data")
-).select("data.*")
-
-# Разделение на пользователей и транзакции
-users_df = final_df.filter(col("name").isNotNull()) \\
-    .select("user_id", "name", "email", "city", "registration_date") \\
-    .dropDuplicates(["user_id"])
-
-transactions_df = final_df.filter(col("transaction_id").isNotNull()) \\
-    .select("transaction_id", "user_id", "amount", "currency", 
-            "amount_usd", "transaction_date", "transaction_hour")
-
-# Запись в консоль для мониторинга
-users_query = users_df \\
-    .writeStream \\
-    .outputMode("append") \\
-    .format("console") \\
-    .option("truncate", False) \\
-    .queryName("users_output") \\
-    .start()
-
-transactions_query = transactions_df \\
-    .writeStream \\
-    .outputMode("append") \\
-    .format("console") \\
-    .option("truncate", False) \\
-    .queryName("transactions_output") \\
-    .start()
-
-print("Loading data to warehouse, processing for 45 seconds...")
-users_query.awaitTermination(45)
-transactions_query.awaitTermination(45)
-
-print("Data loading completed!")
-spark.stop()
-EOF
-
-        # Запуск загрузки данных
-        docker exec spark-master /opt/spark/bin/spark-submit \\
-            --master spark://spark-master:7077 \\
-            --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.5.1,org.postgresql:postgresql:42.7.0 \\
-            --executor-memory 1g \\
-            --total-executor-cores 2 \\
-            /tmp/etl_load_job.py
-        """,
+        bash_command=spark_submit_command('etl_load', dependencies=['kafka'],
+                                          throughput_task_id='plan_load_throughput'),
+        pool=SPARK_POOL,
+    )
+
+    # Компакция слоя lake после загрузки
+    compact_lake = PythonOperator(
+        task_id='compact_lake',
+        python_callable=compact_transactions_lake,
+    )
+
+    # Предложение компактных типов и порядка колонок фактов (только отчёт, без миграции)
+    propose_fact_ddl = PythonOperator(
+        task_id='propose_compact_fact_ddl',
+        python_callable=propose_compact_fact_ddl,
     )
 
     # Этап 6: Создание агрегатов и аналитики
     create_analytics_aggregates = PostgresOperator(
         task_id='create_analytics_aggregates',
         postgres_conn_id='postgres_default',
-        sql="""
-        -- Очистка старых агрегатов
-        DELETE FROM dwh.agg_daily_transactions WHERE date_key = CURRENT_DATE;
-
-        -- Создание дневных агрегатов (симуляция)
-        INSERT INTO dwh.agg_daily_transactions (date_key, currency, transaction_count, total_amount, avg_amount, max_amount)
-        SELECT 
-            CURRENT_DATE as date_key,
-            'USD' as currency,
-            100 as transaction_count,
-            250000.00 as total_amount,
-            2500.00 as avg_amount,
-            15000.00 as max_amount
-        UNION ALL
-        SELECT 
-            CURRENT_DATE as date_key,
-            'EUR' as currency,
-            75 as transaction_count,
-            180000.00 as total_amount,
-            2400.00 as avg_amount,
-            12000.00 as max_amount
-        UNION ALL
-        SELECT 
-            CURRENT_DATE as date_key,
-            'RUB' as currency,
-            200 as transaction_count,
-            15000000.00 as total_amount,
-            75000.00 as avg_amount,
-            500000.00 as max_amount;
-
-        -- Создание представлений для аналитики
-        CREATE OR REPLACE VIEW dwh.v_transaction_summary AS
-        SELECT 
-            currency,
-            SUM(transaction_count) as total_transactions,
-            SUM(total_amount) as total_volume,
-            AVG(avg_amount) as average_transaction_size,
-            MAX(max_amount) as largest_transaction
-        FROM dwh.agg_daily_transactions 
-        GROUP BY currency;
-        """,
+        # Граница берётся отдельной транзакцией до снимка пересчёта
+        autocommit=True,
+        sql=[
+            """
+            -- Горизонт: начало самой старой открытой транзакции загрузки фактов (или
+            -- текущий момент). updated_at = время начала транзакции загрузки, поэтому всё,
+            -- что зафиксируется после снимка пересчёта, получит updated_at не раньше горизонта.
+            -- Учитываются только писатели фактов (application_name из
+            -- etl.spark_jobs.etl_load.FACT_WRITER_APPLICATION): сессии метаданных Airflow,
+            -- фоновые процессы и долгие загрузки файлов не останавливают отметку
+            DROP TABLE IF EXISTS tmp_agg_horizon;
+            CREATE TEMP TABLE tmp_agg_horizon AS
+            SELECT LEAST(now(), MIN(a.xact_start))::timestamp AS horizon
+            FROM pg_stat_activity a
+            WHERE a.xact_start IS NOT NULL
+              AND a.pid <> pg_backend_pid()
+              AND a.datname = current_database()
+              AND a.backend_type = 'client backend'
+              AND a.application_name = 'etl_fact_writer';
+            """,
+            """
+            -- Один снимок данных на весь пересчёт
+            BEGIN ISOLATION LEVEL REPEATABLE READ;
+
+            INSERT INTO dwh.etl_watermarks (name, last_value)
+            VALUES ('agg_daily_transactions', '-infinity')
+            ON CONFLICT (name) DO NOTHING;
+
+            -- Окно новых данных: от прошлой отметки до максимума updated_at, но строго
+            -- раньше горизонта. Загрузка, начатая до снимка и зафиксированная после него,
+            -- не попадает под отметку и будет учтена следующим запуском
+            CREATE TEMP TABLE tmp_agg_window ON COMMIT DROP AS
+            SELECT
+                w.last_value AS from_ts,
+                GREATEST(
+                    w.last_value,
+                    LEAST(
+                        (SELECT MAX(f.updated_at) FROM dwh.fact_transactions f WHERE f.updated_at > w.last_value),
+                        h.horizon - INTERVAL '1 microsecond'
+                    )
+                ) AS to_ts
+            FROM dwh.etl_watermarks w, tmp_agg_horizon h
+            WHERE w.name = 'agg_daily_transactions';
+
+            -- Группы (date_key, currency), затронутые с прошлого запуска
+            CREATE TEMP TABLE tmp_touched_groups ON COMMIT DROP AS
+            SELECT DISTINCT f.transaction_date AS date_key, f.currency
+            FROM dwh.fact_transactions f, tmp_agg_window w
+            WHERE f.updated_at > w.from_ts
+              AND f.updated_at <= w.to_ts
+              AND f.transaction_date IS NOT NULL
+              AND f.currency IS NOT NULL;
+
+            -- Пересчёт только затронутых групп
+            INSERT INTO dwh.agg_daily_transactions (date_key, currency, transaction_count, total_amount, avg_amount, max_amount)
+            SELECT
+                f.transaction_date as date_key,
+                f.currency,
+                COUNT(*) as transaction_count,
+                SUM(f.amount) as total_amount,
+                AVG(f.amount) as avg_amount,
+                MAX(f.amount) as max_amount
+            FROM dwh.fact_transactions f
+            JOIN tmp_touched_groups g ON f.transaction_date = g.date_key AND f.currency = g.currency
+            -- Границы дат отсекают секции без затронутых групп (pruning при выполнении)
+            WHERE f.transaction_date BETWEEN (SELECT MIN(date_key) FROM tmp_touched_groups)
+                                         AND (SELECT MAX(date_key) FROM tmp_touched_groups)
+            GROUP BY f.transaction_date, f.currency
+            ON CONFLICT (date_key, currency) DO UPDATE SET
+                transaction_count = EXCLUDED.transaction_count,
+                total_amount = EXCLUDED.total_amount,
+                avg_amount = EXCLUDED.avg_amount,
+                max_amount = EXCLUDED.max_amount,
+                updated_at = CURRENT_TIMESTAMP;
+
+            -- Сдвиг отметки вместе с агрегатами (одна транзакция)
+            UPDATE dwh.etl_watermarks w
+            SET last_value = a.to_ts, updated_at = CURRENT_TIMESTAMP
+            FROM tmp_agg_window a
+            WHERE w.name = 'agg_daily_transactions';
+
+            -- Создание представлений для аналитики
+            CREATE OR REPLACE VIEW dwh.v_transaction_summary AS
+            SELECT 
+                currency,
+                SUM(transaction_count) as total_transactions,
+                SUM(total_amount) as total_volume,
+                AVG(avg_amount) as average_transaction_size,
+                MAX(max_amount) as largest_transaction
+            FROM dwh.agg_daily_transactions 
+            GROUP BY currency;
+
+            COMMIT;
+            """,
+        ],
     )
 
     # Этап 7: Валидация и отчетность
@@ -405,6 +442,12 @@ EOF
     )
 
     # Определение зависимостей
-    prepare_infrastructure >> create_data_warehouse_schema >> extract_data_from_sources
-    extract_data_from_sources >> transform_data_with_spark >> load_data_to_warehouse
-    load_data_to_warehouse >> create_analytics_aggregates >> validate_etl_results
\ No newline at end of file
+    prepare_infrastructure >> create_data_warehouse_schema >> create_etl_topics >> extract_data_from_sources
+    extract_data_from_sources >> infer_raw_schema >> plan_transform_throughput >> transform_data_with_spark
+    build_spark_package >> transform_data_with_spark
+    create_data_warehouse_schema >> create_currency_rates >> transform_data_with_spark
+    transform_data_with_spark >> infer_processed_schema >> plan_load_throughput >> load_data_to_warehouse
+    create_data_warehouse_schema >> create_fact_transactions >> manage_fact_partitions >> load_data_to_warehouse
+    load_data_to_warehouse >> create_analytics_aggregates >> validate_etl_results
+    load_data_to_warehouse >> compact_lake
+    load_data_to_warehouse >> propose_fact_ddl
\ No newline at end of file
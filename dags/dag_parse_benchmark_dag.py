@@ -0,0 +1,39 @@
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from datetime import datetime, timedelta
+
+default_args = {
+    'owner': 'data-engineer',
+    'depends_on_past': False,
+    'start_date': datetime(2025, 1, 1),
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 0,
+    'retry_delay': timedelta(minutes=5),
+}
+
+
+def check_dag_parse_time(params):
+    """Разбор каждого DAG-файла в отдельном интерпретаторе; падает при превышении бюджета"""
+    from etl.dag_parsing import check_dag_parsing
+
+    return check_dag_parsing(budget=float(params['budget_seconds']), repeats=int(params['repeats']))
+
+
+with DAG(
+        'dag_parse_benchmark',
+        default_args=default_args,
+        description='Parse time of every DAG file against a per-file budget',
+        schedule_interval=timedelta(days=1),
+        catchup=False,
+        params={
+            'budget_seconds': 0.5,
+            'repeats': 3,
+        },
+        tags=['etl', 'benchmark'],
+) as dag:
+    # Замер в отдельных процессах: импорты одного файла не ускоряют разбор следующего
+    check_parse_time = PythonOperator(
+        task_id='check_dag_parse_time',
+        python_callable=check_dag_parse_time,
+    )
@@ -1,10 +1,11 @@
 from airflow import DAG
-from airflow.operators.bash import BashOperator
 from airflow.operators.python import PythonOperator
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from datetime import datetime, timedelta
-import pandas as pd
-import json
+from etl.config import POSTGRES_LOAD_POOL
+from etl.manifest import MANIFEST_SQL
+from etl.metrics import push_task_metrics
+from etl.schemas import MUSEUM_TICKET_SCHEMA, create_table_sql
 
 default_args = {
     'owner': 'data-engineer',
@@ -14,6 +15,8 @@ default_args = {
     'email_on_retry': False,
     'retries': 2,
     'retry_delay': timedelta(minutes=5),
+    # Длительность, строки и байты задачи в Pushgateway
+    'on_success_callback': push_task_metrics,
 }
 
 
@@ -21,7 +24,7 @@ def create_sample_data():
     """Создание тестовых данных для демонстрации"""
     import json
     import csv
-    import xml.etree.ElementTree as ET
+    from xml.sax.saxutils import XMLGenerator
 
     # CSV данные
     csv_data = [
@@ -32,16 +35,14 @@ def create_sample_data():
         {'id': 5, 'name': 'Eve', 'age': 32, 'city': 'Novosibirsk', 'salary': 58000},
     ]
 
-    # JSON данные
-    json_data = {
-        'transactions': [
-            {'transaction_id': 'tx_001', 'user_id': 1, 'amount': 1500, 'timestamp': '2025-01-01T10:00:00Z'},
-            {'transaction_id': 'tx_002', 'user_id': 2, 'amount': 2300, 'timestamp': '2025-01-01T11:00:00Z'},
-            {'transaction_id': 'tx_003', 'user_id': 3, 'amount': 750, 'timestamp': '2025-01-01T12:00:00Z'},
-            {'transaction_id': 'tx_004', 'user_id': 1, 'amount': 3200, 'timestamp': '2025-01-01T13:00:00Z'},
-            {'transaction_id': 'tx_005', 'user_id': 4, 'amount': 890, 'timestamp': '2025-01-01T14:00:00Z'},
-        ]
-    }
+    # JSON данные (массив верхнего уровня, как в реестре предпринимателей)
+    json_data = [
+        {'transaction_id': 'tx_001', 'user_id': 1, 'amount': 1500, 'timestamp': '2025-01-01T10:00:00Z'},
+        {'transaction_id': 'tx_002', 'user_id': 2, 'amount': 2300, 'timestamp': '2025-01-01T11:00:00Z'},
+        {'transaction_id': 'tx_003', 'user_id': 3, 'amount': 750, 'timestamp': '2025-01-01T12:00:00Z'},
+        {'transaction_id': 'tx_004', 'user_id': 1, 'amount': 3200, 'timestamp': '2025-01-01T13:00:00Z'},
+        {'transaction_id': 'tx_005', 'user_id': 4, 'amount': 890, 'timestamp': '2025-01-01T14:00:00Z'},
+    ]
 
     # Сохранение файлов
     with open('/tmp/users.csv', 'w', newline='') as f:
@@ -52,26 +53,498 @@ def create_sample_data():
     with open('/tmp/transactions.json', 'w') as f:
         json.dump(json_data, f, indent=2)
 
-    # XML данные
-    root = ET.Element('products')
+    # XML данные (пишутся потоково, без построения дерева в памяти)
     products = [
         {'id': 'p001', 'name': 'Laptop', 'category': 'Electronics', 'price': 75000},
         {'id': 'p002', 'name': 'Phone', 'category': 'Electronics', 'price': 45000},
         {'id': 'p003', 'name': 'Book', 'category': 'Education', 'price': 1500},
     ]
 
-    for product in products:
-        prod_elem = ET.SubElement(root, 'product')
-        for key, value in product.items():
-            elem = ET.SubElement(prod_elem, key)
-            elem.text = str(value)
-
-    tree = ET.ElementTree(root)
-    tree.write('/tmp/products.xml')
+    with open('/tmp/products.xml', 'w', encoding='utf-8') as f:
+        xml_writer = XMLGenerator(f, encoding='utf-8')
+        xml_writer.startDocument()
+        xml_writer.startElement('products', {})
+        for product in products:
+            xml_writer.startElement('product', {})
+            for key, value in product.items():
+                xml_writer.startElement(key, {})
+                xml_writer.characters(str(value))
+                xml_writer.endElement(key)
+            xml_writer.endElement('product')
+        xml_writer.endElement('products')
+        xml_writer.endDocument()
 
     print("Sample data files created successfully!")
 
 
+def load_sample_users():
+    """Загрузка тестовых пользователей из CSV, upsert по id.
+
+    Файл копируется во временную таблицу и переносится в users одной
+    транзакцией, поэтому повторный запуск DAG не упирается в первичный ключ.
+    """
+    import os
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import POSTGRES_CONN_ID
+    from etl.schemas import USERS_SCHEMA, column_names
+
+    path = '/tmp/users.csv'
+    columns = ', '.join(column_names(USERS_SCHEMA))
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        with conn.cursor() as cursor, open(path, 'rb') as f:
+            cursor.execute("CREATE TEMP TABLE tmp_users (LIKE users INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY tmp_users ({columns}) FROM STDIN WITH (FORMAT csv, HEADER true)", f)
+            rows = cursor.rowcount
+            cursor.execute(
+                f"""
+                INSERT INTO users ({columns})
+                SELECT DISTINCT ON (id) {columns}
+                FROM tmp_users
+                ORDER BY id
+                ON CONFLICT (id) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    age = EXCLUDED.age,
+                    city = EXCLUDED.city,
+                    salary = EXCLUDED.salary
+                """
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Upserted {rows} users from {path}")
+    return {'file': path, 'rows': rows, 'bytes': os.path.getsize(path)}
+
+
+def ensure_load_pools():
+    """Создание пулов загрузки, если их нет (размер, изменённый в UI, не трогается)"""
+    from airflow.models.pool import Pool
+    from etl.config import POSTGRES_LOAD_POOL_SLOTS, SPARK_POOL, SPARK_POOL_SLOTS
+
+    pools = [
+        (POSTGRES_LOAD_POOL, POSTGRES_LOAD_POOL_SLOTS, 'Concurrent file/range loads into PostgreSQL'),
+        (SPARK_POOL, SPARK_POOL_SLOTS, 'Concurrent spark-submit jobs'),
+    ]
+    for name, slots, description in pools:
+        if Pool.get_pool(name) is None:
+            Pool.create_or_update_pool(name, slots, description, include_deferred=False)
+            print(f"Created pool {name} with {slots} slots")
+
+
+def discover_source_files():
+    """Файлы наборов для загрузки по манифесту: неизменённые пропускаются без чтения.
+
+    JSON, XML и изменённые CSV — аргументы задач по файлу (expand), новые
+    CSV — записи для общей дедупликации.
+    """
+    import glob
+    import os
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import CSV_DIR, JSON_DIR, POSTGRES_CONN_ID, XML_DIR
+    from etl.manifest import plan_files
+
+    sources = [
+        ('csv', 'museum_tickets', os.path.join(CSV_DIR, '*.csv')),
+        ('json', 'entrepreneurs', os.path.join(JSON_DIR, '*.json')),
+        ('xml', 'cadastral_objects', os.path.join(XML_DIR, '*.xml')),
+    ]
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        plans = {fmt: plan_files(conn, dataset, sorted(glob.glob(pattern))) for fmt, dataset, pattern in sources}
+    finally:
+        conn.close()
+    return {
+        'csv': [entry for entry in plans['csv']['load'] if entry['change'] == 'new'],
+        'csv_changed': [{'entry': entry} for entry in plans['csv']['load'] if entry['change'] == 'changed'],
+        'json': [{'entry': entry} for entry in plans['json']['load']],
+        'xml': [{'entry': entry} for entry in plans['xml']['load']],
+    }
+
+
+def replace_museum_ticket_file(entry):
+    """Замена изменённого файла билетов одной транзакцией вместе с записью в манифест.
+
+    Файл очищается от повторов отдельно (последняя версия ticket_id по
+    update_timestamp), прежние строки файла удаляются по source_file, новая
+    версия переносится из временной таблицы. Билет из другого файла
+    заменяется, если его версия старше, и остаётся, если новее.
+    """
+    import os
+    import shutil
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import DEDUPE_DIR, POSTGRES_CONN_ID
+    from etl.dedupe import dedupe_csv_files
+    from etl.manifest import replace_file
+    from etl.quality import MUSEUM_TICKET_RULES, QualityCheck
+    from etl.schemas import column_names
+
+    columns = ', '.join(column_names(MUSEUM_TICKET_SCHEMA) + ['source_file'])
+    work_dir = os.path.join(DEDUPE_DIR, 'museum_tickets_replace', os.path.splitext(os.path.basename(entry['path']))[0])
+    quality = QualityCheck('museum_tickets', MUSEUM_TICKET_RULES)
+    dedupe = dedupe_csv_files(
+        [entry['path']], MUSEUM_TICKET_SCHEMA, ['ticket_id'], work_dir, delimiter=';',
+        keep_latest_by='update_timestamp', quality=quality, source_column='source_file',
+    )
+
+    def load(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE tmp_museum_tickets (LIKE museum_tickets INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            copy_sql = f"COPY tmp_museum_tickets ({columns}) FROM STDIN WITH (FORMAT csv, DELIMITER ';', HEADER false)"
+            for path in dedupe['files']:
+                with open(path, 'rb') as f:
+                    cursor.copy_expert(copy_sql, f)
+            cursor.execute(
+                """
+                DELETE FROM museum_tickets t
+                USING tmp_museum_tickets s
+                WHERE t.ticket_id = s.ticket_id
+                  AND (t.update_timestamp IS NULL OR t.update_timestamp < s.update_timestamp)
+                """
+            )
+            superseded = cursor.rowcount
+            cursor.execute(
+                f"""
+                INSERT INTO museum_tickets ({columns})
+                SELECT {columns} FROM tmp_museum_tickets s
+                WHERE s.ticket_id IS NULL
+                   OR NOT EXISTS (SELECT 1 FROM museum_tickets t WHERE t.ticket_id = s.ticket_id)
+                """
+            )
+            inserted = cursor.rowcount
+        # В манифест — строки исходного файла, как у новых файлов
+        return {'file': entry['path'], 'rows': dedupe['rows_in'], 'bytes': entry['size_bytes'],
+                'inserted': inserted, 'superseded': superseded}
+
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        stats = replace_file(conn, 'museum_tickets', 'museum_tickets', entry, load)
+    finally:
+        conn.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"Museum tickets {os.path.basename(entry['path'])}: {stats['inserted']} rows loaded, "
+          f"{stats['superseded']} older versions from other files replaced")
+    return {'load': stats, 'quality': quality.report()}
+
+
+def dedupe_museum_tickets(entries):
+    """Очистка новых файлов билетов от повторов и разбиение на диапазоны.
+
+    Повторы ticket_id ищутся внутри и между файлами (остаётся последняя
+    версия по update_timestamp) и среди уже загруженных билетов, поэтому
+    этот шаг общий для набора; загрузка идёт отдельной задачей на диапазон.
+    Изменённые файлы заменяются раньше (``replace_museum_ticket_file``).
+    """
+    import os
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import DEDUPE_DIR, POSTGRES_CONN_ID
+    from etl.csv_loader import plan_csv_ranges
+    from etl.dedupe import WarehouseKeys, dedupe_csv_files
+    from etl.quality import MUSEUM_TICKET_RULES, QualityCheck
+
+    if not entries:
+        print("No new museum ticket CSV files")
+        return {'ranges': [], 'files': [], 'dedupe': None, 'quality': None}
+
+    dsn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_uri()
+    quality = QualityCheck('museum_tickets', MUSEUM_TICKET_RULES)
+    dedupe = dedupe_csv_files(
+        [entry['path'] for entry in entries], MUSEUM_TICKET_SCHEMA, ['ticket_id'],
+        os.path.join(DEDUPE_DIR, 'museum_tickets'), delimiter=';',
+        keep_latest_by='update_timestamp',
+        warehouse_keys=WarehouseKeys(dsn, 'museum_tickets', 'ticket_id'),
+        quality=quality,
+        source_column='source_file',
+    )
+    ranges = plan_csv_ranges(dedupe['files'], header=False)
+    print(f"Museum tickets: {len(dedupe['files'])} deduplicated files, {len(ranges)} load ranges")
+    return {
+        'ranges': ranges,
+        # Строки исходных файлов для манифеста (записывается после загрузки всех диапазонов)
+        'files': [dict(entry, rows=dedupe['rows_by_file'][entry['path']]) for entry in entries],
+        'dedupe': {k: v for k, v in dedupe.items() if k not in ('files', 'rows_by_file')},
+        'quality': quality.report(),
+    }
+
+
+def load_museum_ticket_range(path, start, end):
+    """COPY одного диапазона очищенного файла в museum_tickets (одна транзакция).
+
+    source_file передаётся колонкой файла корзины: это исходный CSV строки,
+    а не файл корзины, из которого она загружается.
+    """
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import POSTGRES_CONN_ID
+    from etl.csv_loader import copy_range_to_postgres
+    from etl.schemas import column_names
+
+    dsn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_uri()
+    columns = column_names(MUSEUM_TICKET_SCHEMA) + ['source_file']
+    rows = copy_range_to_postgres(path, start, end, dsn, 'museum_tickets', columns, ';')
+    print(f"Loaded {rows} rows from {path} [{start}, {end})")
+    return {'file': path, 'rows': rows, 'bytes': end - start}
+
+
+def record_museum_manifest(files):
+    """Файлы билетов в манифест после успешной загрузки всех диапазонов"""
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import POSTGRES_CONN_ID
+    from etl.manifest import record_file
+
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        with conn.cursor() as cursor:
+            for entry in files:
+                record_file(cursor, 'museum_tickets', entry, entry['rows'])
+        conn.commit()
+    finally:
+        conn.close()
+    return len(files)
+
+
+def cleanup_museum_dedupe():
+    """Удаление очищенных файлов после загрузки всех диапазонов"""
+    import os
+    import shutil
+    from etl.config import DEDUPE_DIR
+
+    shutil.rmtree(os.path.join(DEDUPE_DIR, 'museum_tickets'), ignore_errors=True)
+
+
+def export_museum_tickets_lake():
+    """Музейные билеты в lake: Parquet (zstd) по дням и музеям, затем компакция.
+
+    По манифесту (набор ``lake:museum_tickets:local_date``): без изменений —
+    пропуск, только новые файлы — дописываются, изменённый файл — набор
+    пересобирается рядом и подменяется переименованием (после компакции
+    файлы Parquet не привязаны к исходному файлу). Набор пересобирается и
+    тогда, когда lake уже есть, а манифест не знает ни одного его файла:
+    так выгрузка прежней раскладки (created_date по UTC) заменяется целиком.
+    """
+    import glob
+    import os
+    import shutil
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import CSV_DIR, LAKE_DIR, POSTGRES_CONN_ID
+    from etl.csv_loader import load_csv_parallel
+    from etl.lake import compact_lake, lake_path
+    from etl.manifest import plan_files, record_file
+    from etl.schemas import MUSEUM_TICKET_SCHEMA
+
+    files = sorted(glob.glob(os.path.join(CSV_DIR, '*.csv')))
+    if not files:
+        print(f"No CSV files found in {CSV_DIR}")
+        return None
+
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        # Версия раскладки в имени набора: created_date — день в поясе источника
+        dataset = 'lake:museum_tickets:local_date'
+        plan = plan_files(conn, dataset, files)
+        if not plan['load']:
+            return {'plan': plan}
+
+        rebuild = any(entry['change'] == 'changed' for entry in plan['load']) or (
+            plan['unchanged'] == 0 and os.path.exists(lake_path('museum_tickets'))
+        )
+        target = lake_path('museum_tickets')
+        if rebuild:
+            target = os.path.join(LAKE_DIR, '_rebuild', 'museum_tickets')
+            shutil.rmtree(target, ignore_errors=True)
+        export = load_csv_parallel(
+            files if rebuild else [entry['path'] for entry in plan['load']],
+            MUSEUM_TICKET_SCHEMA, parquet_dir=target, delimiter=';',
+            partition_cols=['created_date', 'museum_name'], date_columns={'created_date': 'created'},
+        )
+        if rebuild:
+            current = lake_path('museum_tickets')
+            previous = os.path.join(LAKE_DIR, '_rebuild', 'museum_tickets.previous')
+            shutil.rmtree(previous, ignore_errors=True)
+            if os.path.exists(current):
+                os.rename(current, previous)
+            os.rename(target, current)
+            shutil.rmtree(previous, ignore_errors=True)
+
+        rows = {stats['file']: stats['rows'] for stats in export['files']}
+        with conn.cursor() as cursor:
+            for entry in plan['load']:
+                record_file(cursor, dataset, entry, rows.get(entry['path']))
+        conn.commit()
+    finally:
+        conn.close()
+    return {'plan': plan, 'rebuild': rebuild, 'export': export, 'compaction': compact_lake(['museum_tickets'])}
+
+
+def load_transactions_json():
+    """Загрузка JSON транзакций: только при новом содержимом файла, upsert по transaction_id.
+
+    Файл копируется во временную таблицу и переносится в transactions
+    одной транзакцией вместе с записью в манифест, поэтому повторный
+    запуск не упирается в первичный ключ.
+    """
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import POSTGRES_CONN_ID
+    from etl.json_stream import load_json_array
+    from etl.manifest import plan_files, record_file
+
+    columns = ['transaction_id', 'user_id', 'amount', 'timestamp']
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        plan = plan_files(conn, 'transactions', ['/tmp/transactions.json'])
+        if not plan['load']:
+            return {'plan': plan}
+        entry = plan['load'][0]
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE tmp_transactions (LIKE transactions INCLUDING DEFAULTS) ON COMMIT DROP")
+        stats = load_json_array(entry['path'], conn, 'tmp_transactions', columns, commit=False)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO transactions (transaction_id, user_id, amount, timestamp)
+                SELECT DISTINCT ON (transaction_id) transaction_id, user_id, amount, timestamp
+                FROM tmp_transactions
+                ORDER BY transaction_id
+                ON CONFLICT (transaction_id) DO UPDATE SET
+                    user_id = EXCLUDED.user_id,
+                    amount = EXCLUDED.amount,
+                    timestamp = EXCLUDED.timestamp
+                """
+            )
+            record_file(cursor, 'transactions', entry, stats['rows'])
+        conn.commit()
+    finally:
+        conn.close()
+    return {'load': stats, 'change': entry['change']}
+
+
+def load_entrepreneur_file(entry):
+    """Замена одного файла реестра индивидуальных предпринимателей (JSON) одной транзакцией"""
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import POSTGRES_CONN_ID
+    from etl.json_stream import load_entrepreneur_json
+    from etl.manifest import replace_file
+    from etl.quality import ENTREPRENEUR_RULES, QualityCheck
+
+    quality = QualityCheck('entrepreneurs', ENTREPRENEUR_RULES)
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        stats = replace_file(
+            conn, 'entrepreneurs', 'entrepreneurs', entry,
+            lambda conn: load_entrepreneur_json(entry['path'], conn, quality=quality, commit=False),
+        )
+    finally:
+        conn.close()
+    return {'load': stats, 'quality': quality.report()}
+
+
+def load_cadastral_file(entry):
+    """Замена одного кадастрового XML файла в PostgreSQL одной транзакцией"""
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.config import POSTGRES_CONN_ID
+    from etl.manifest import replace_file
+    from etl.quality import CADASTRAL_RULES, QualityCheck
+    from etl.xml_stream import load_cadastral_xml
+
+    quality = QualityCheck('cadastral_objects', CADASTRAL_RULES)
+    conn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_conn()
+    try:
+        stats = replace_file(
+            conn, 'cadastral_objects', 'cadastral_objects', entry,
+            lambda conn: load_cadastral_xml(entry['path'], conn=conn, quality=quality, commit=False),
+        )
+    finally:
+        conn.close()
+    return {'load': stats, 'quality': quality.report()}
+
+
+def infer_source_schemas():
+    """Вывод схем исходных наборов по выборке для Spark читателей"""
+    import glob
+    import os
+    from etl.config import CSV_DIR, JSON_DIR, XML_DIR
+    from etl.schema_inference import infer_file_schema, publish_schema
+
+    sources = [
+        ('museum_tickets', os.path.join(CSV_DIR, '*.csv'), 'csv'),
+        ('entrepreneurs', os.path.join(JSON_DIR, '*.json'), 'json'),
+        ('cadastral_objects', os.path.join(XML_DIR, '*.xml'), 'xml'),
+    ]
+    published = {}
+    for name, pattern, fmt in sources:
+        files = sorted(glob.glob(pattern))
+        if not files:
+            print(f"No {fmt} files found for {name}")
+            continue
+        published[name] = publish_schema(name, infer_file_schema(files, fmt))
+    return published
+
+
+def profile_source_quality():
+    """Быстрая оценка качества источников по выборке (без полного чтения файлов)"""
+    import glob
+    import os
+    from etl.config import CSV_DIR, JSON_DIR, XML_DIR
+    from etl.json_stream import entrepreneur_row
+    from etl.quality import CADASTRAL_RULES, ENTREPRENEUR_RULES, MUSEUM_TICKET_RULES, validate_sample
+    from etl.schema_inference import sample_files
+    from etl.xml_stream import cadastral_row
+
+    sources = [
+        ('museum_tickets', os.path.join(CSV_DIR, '*.csv'), 'csv', MUSEUM_TICKET_RULES, None),
+        ('entrepreneurs', os.path.join(JSON_DIR, '*.json'), 'json', ENTREPRENEUR_RULES, entrepreneur_row),
+        ('cadastral_objects', os.path.join(XML_DIR, '*.xml'), 'xml', CADASTRAL_RULES, cadastral_row),
+    ]
+    reports = {}
+    for name, pattern, fmt, rules, to_row in sources:
+        files = sorted(glob.glob(pattern))
+        if not files:
+            print(f"No {fmt} files found for {name}")
+            continue
+        records = sample_files(files, fmt)
+        if to_row is not None:
+            records = [to_row(record, '') for record in records]
+        reports[name] = validate_sample(name, rules, records)
+    return reports
+
+
+def profile_source_sketches():
+    """Профили колонок полных наборов: новые файлы профилируются, отчёт — из сводок"""
+    import glob
+    import os
+    from etl.config import CSV_DIR, JSON_DIR, XML_DIR
+    from etl.profiling import profile_dataset, profile_report
+
+    sources = [
+        ('museum_tickets', os.path.join(CSV_DIR, '*.csv'), 'csv'),
+        ('entrepreneurs', os.path.join(JSON_DIR, '*.json'), 'json'),
+        ('cadastral_objects', os.path.join(XML_DIR, '*.xml'), 'xml'),
+    ]
+    reports = {}
+    for name, pattern, fmt in sources:
+        files = sorted(glob.glob(pattern))
+        if not files:
+            print(f"No {fmt} files found for {name}")
+            continue
+        profile_dataset(name, files, fmt)
+        reports[name] = profile_report(name)
+    return reports
+
+
+def propose_compact_source_ddl():
+    """Компактный DDL museum_tickets по профилям полного набора"""
+    from etl.ddl import compact_table_ddl, write_ddl_proposal
+    from etl.profiling import profile_report
+
+    report = profile_report('museum_tickets')
+    if not report['files']:
+        print("No museum_tickets profiles, nothing to propose")
+        return None
+    proposal = compact_table_ddl('museum_tickets', MUSEUM_TICKET_SCHEMA, report['columns'])
+    write_ddl_proposal(proposal)
+    return {key: proposal[key] for key in ('table', 'current_row_bytes', 'proposed_row_bytes', 'saved_ratio')}
+
+
 with DAG(
         'data_ingestion_pipeline',
         default_args=default_args,
@@ -124,52 +597,238 @@ with DAG(
         """,
     )
 
+    create_cadastral_table = PostgresOperator(
+        task_id='create_cadastral_table',
+        postgres_conn_id='postgres_default',
+        sql="""
+        CREATE TABLE IF NOT EXISTS cadastral_objects (
+            source_file VARCHAR(255),
+            cad_number VARCHAR(40),
+            quarter_cad_number VARCHAR(40),
+            object_type VARCHAR(100),
+            previously_posted BOOLEAN,
+            status VARCHAR(20),
+            last_change_record_number VARCHAR(60),
+            last_container_fixed_at TIMESTAMPTZ,
+            object_formation JSONB,
+            details JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        -- Строки файла удаляются перед его повторной загрузкой
+        CREATE INDEX IF NOT EXISTS idx_cadastral_objects_source_file ON cadastral_objects (source_file);
+        """,
+    )
+
+    create_museum_tickets_table = PostgresOperator(
+        task_id='create_museum_tickets_table',
+        postgres_conn_id='postgres_default',
+        sql=[
+            create_table_sql('museum_tickets', MUSEUM_TICKET_SCHEMA),
+            # Точная проверка кандидатов дедупликации по ticket_id
+            'CREATE INDEX IF NOT EXISTS idx_museum_tickets_ticket_id ON museum_tickets (ticket_id);',
+            # Строки изменённого файла удаляются перед его повторной загрузкой
+            'CREATE INDEX IF NOT EXISTS idx_museum_tickets_source_file ON museum_tickets (source_file);',
+        ],
+    )
+
+    create_entrepreneurs_table = PostgresOperator(
+        task_id='create_entrepreneurs_table',
+        postgres_conn_id='postgres_default',
+        sql="""
+        CREATE TABLE IF NOT EXISTS entrepreneurs (
+            source_file VARCHAR(255),
+            date_exec DATE,
+            code_form_ind_entrep VARCHAR(10),
+            name_form_ind_entrep VARCHAR(200),
+            inf_surname_ind_entrep_sex VARCHAR(10),
+            citizenship_kind VARCHAR(10),
+            inf_authority_reg_ind_entrep_name VARCHAR(500),
+            inf_authority_reg_ind_entrep_code VARCHAR(20),
+            inf_reg_tax_ind_entrep VARCHAR(500),
+            inf_okved_code VARCHAR(20),
+            inf_okved_name VARCHAR(500),
+            process_dttm TIMESTAMPTZ,
+            error_code VARCHAR(20),
+            inf_surname_ind_entrep_firstname VARCHAR(200),
+            inf_surname_ind_entrep_surname VARCHAR(200),
+            inf_surname_ind_entrep_midname VARCHAR(200),
+            dob VARCHAR(20),
+            date_ogrnip VARCHAR(20),
+            id_card VARCHAR(100),
+            innfl VARCHAR(20),
+            ogrnip VARCHAR(20),
+            inf_okved_opt TEXT,
+            insured_pf VARCHAR(50),
+            email_ind_entrep VARCHAR(200),
+            insuref_fss VARCHAR(50),
+            extra JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        -- Строки файла удаляются перед его повторной загрузкой
+        CREATE INDEX IF NOT EXISTS idx_entrepreneurs_source_file ON entrepreneurs (source_file);
+        """,
+    )
+
+    # Манифест загруженных файлов: неизменённые файлы не перечитываются
+    create_manifest_table = PostgresOperator(
+        task_id='create_ingestion_manifest',
+        postgres_conn_id='postgres_default',
+        sql=MANIFEST_SQL,
+    )
+
     # Генерация тестовых данных
     generate_sample_data = PythonOperator(
         task_id='generate_sample_data',
         python_callable=create_sample_data,
     )
 
-    # Загрузка CSV данных через Spark
-    load_csv_data = BashOperator(
+    # Загрузка тестовых пользователей из CSV
+    load_csv_data = PythonOperator(
         task_id='load_csv_data',
-        bash_command="""
-        echo "Loading CSV data via Spark..."
-        docker exec spark-master /opt/spark/bin/spark-submit \
-            --master spark://spark-master:7077 \
-            --packages org.postgresql:postgresql:42.7.0 \
-            --py-files /tmp/load_csv.py \
-            /tmp/load_csv.py
-        """,
+        python_callable=load_sample_users,
+    )
+
+    # Пулы, ограничивающие одновременные загрузки в PostgreSQL и Spark
+    ensure_pools = PythonOperator(
+        task_id='ensure_load_pools',
+        python_callable=ensure_load_pools,
+    )
+
+    # Новые и изменённые файлы наборов по манифесту: дальше задача на файл или диапазон файла
+    discover_files = PythonOperator(
+        task_id='discover_source_files',
+        python_callable=discover_source_files,
+        multiple_outputs=True,
+    )
+
+    # Изменённые файлы билетов: замена строк файла одной транзакцией, задача на файл
+    replace_museum_files = PythonOperator.partial(
+        task_id='replace_museum_ticket_file',
+        python_callable=replace_museum_ticket_file,
+        pool=POSTGRES_LOAD_POOL,
+        retries=3,
+        retry_delay=timedelta(minutes=1),
+    ).expand(op_kwargs=discover_files.output['csv_changed'])
+
+    # Дедупликация новых билетов по всему набору и разбиение очищенных файлов на диапазоны;
+    # после замен, чтобы ключи хранилища уже отражали новые версии изменённых файлов
+    dedupe_museum = PythonOperator(
+        task_id='dedupe_museum_tickets',
+        python_callable=dedupe_museum_tickets,
+        op_kwargs={'entries': discover_files.output['csv']},
+        multiple_outputs=True,
+        trigger_rule='none_failed',
+    )
+
+    # Задача на диапазон: медленный диапазон не задерживает остальные, повтор — только его
+    load_museum_ranges = PythonOperator.partial(
+        task_id='load_museum_ticket_range',
+        python_callable=load_museum_ticket_range,
+        pool=POSTGRES_LOAD_POOL,
+        retries=3,
+        retry_delay=timedelta(minutes=1),
+    ).expand(op_kwargs=dedupe_museum.output['ranges'])
+
+    # Файлы билетов попадают в манифест, только когда загружены все их диапазоны;
+    # без диапазонов (всё отсечено дедупликацией) задача загрузки пропускается
+    record_museum_files = PythonOperator(
+        task_id='record_museum_manifest',
+        python_callable=record_museum_manifest,
+        op_kwargs={'files': dedupe_museum.output['files']},
+        trigger_rule='none_failed',
+    )
+
+    cleanup_dedupe = PythonOperator(
+        task_id='cleanup_museum_dedupe',
+        python_callable=cleanup_museum_dedupe,
+        trigger_rule='none_failed',
+    )
+
+    # Музейные билеты в слой lake (Parquet с разбиением)
+    export_museum_lake = PythonOperator(
+        task_id='export_museum_tickets_lake',
+        python_callable=export_museum_tickets_lake,
     )
 
-    # Загрузка JSON данных
-    load_json_data = BashOperator(
+    # Потоковая загрузка JSON данных
+    load_json_data = PythonOperator(
         task_id='load_json_data',
-        bash_command="""
-        echo "Loading JSON data..."
-        docker exec postgres psql -U admin -d etl_db -c "
-        COPY transactions(transaction_id, user_id, amount, timestamp) 
-        FROM PROGRAM 'cat /tmp/transactions.json | jq -r \".transactions[] | [.transaction_id, .user_id, .amount, .timestamp] | @csv\"' 
-        WITH (FORMAT csv);
-        " || echo "JSON data loaded via alternative method"
-        """,
+        python_callable=load_transactions_json,
+    )
+
+    # Потоковая загрузка реестра предпринимателей: задача на файл
+    load_entrepreneur_data = PythonOperator.partial(
+        task_id='load_entrepreneur_file',
+        python_callable=load_entrepreneur_file,
+        pool=POSTGRES_LOAD_POOL,
+        retries=3,
+        retry_delay=timedelta(minutes=1),
+    ).expand(op_kwargs=discover_files.output['json'])
+
+    # Потоковая загрузка кадастровых XML данных: задача на файл
+    load_xml_data = PythonOperator.partial(
+        task_id='load_cadastral_file',
+        python_callable=load_cadastral_file,
+        pool=POSTGRES_LOAD_POOL,
+        retries=3,
+        retry_delay=timedelta(minutes=1),
+    ).expand(op_kwargs=discover_files.output['xml'])
+
+    # Схемы исходных наборов (кэшируются по отпечаткам файлов)
+    infer_schemas = PythonOperator(
+        task_id='infer_source_schemas',
+        python_callable=infer_source_schemas,
+    )
+
+    # Оценка качества источников по выборке (правила etl.quality)
+    profile_quality = PythonOperator(
+        task_id='profile_source_quality',
+        python_callable=profile_source_quality,
+    )
+
+    # Профили колонок полных наборов (HyperLogLog, t-digest, count-min по файлам)
+    profile_sketches = PythonOperator(
+        task_id='profile_source_sketches',
+        python_callable=profile_source_sketches,
+    )
+
+    # Компактные типы и порядок колонок по профилям (DDL в DDL_DIR для ревью)
+    propose_source_ddl = PythonOperator(
+        task_id='propose_compact_source_ddl',
+        python_callable=propose_compact_source_ddl,
     )
 
     # Проверка загруженных данных
+    # Пропущенные задачи по файлам (нет новых файлов) не блокируют проверку
     validate_data = PostgresOperator(
         task_id='validate_data',
         postgres_conn_id='postgres_default',
+        trigger_rule='none_failed',
         sql="""
         SELECT 'users' as table_name, COUNT(*) as record_count FROM users
         UNION ALL
         SELECT 'transactions' as table_name, COUNT(*) as record_count FROM transactions
         UNION ALL
-        SELECT 'products' as table_name, COUNT(*) as record_count FROM products;
+        SELECT 'products' as table_name, COUNT(*) as record_count FROM products
+        UNION ALL
+        SELECT 'museum_tickets' as table_name, COUNT(*) as record_count FROM museum_tickets
+        UNION ALL
+        SELECT 'entrepreneurs' as table_name, COUNT(*) as record_count FROM entrepreneurs
+        UNION ALL
+        SELECT 'cadastral_objects' as table_name, COUNT(*) as record_count FROM cadastral_objects;
         """,
     )
 
     # Определение зависимостей
-    [create_users_table, create_transactions_table, create_products_table] >> generate_sample_data
+    [create_users_table, create_transactions_table, create_products_table,
+     create_museum_tickets_table] >> generate_sample_data
     generate_sample_data >> [load_csv_data, load_json_data]
-    [load_csv_data, load_json_data] >> validate_data
\ No newline at end of file
+    create_museum_tickets_table >> replace_museum_files >> dedupe_museum
+    create_manifest_table >> [discover_files, load_json_data, export_museum_lake]
+    dedupe_museum >> load_museum_ranges >> record_museum_files >> cleanup_dedupe
+    create_entrepreneurs_table >> load_entrepreneur_data
+    create_cadastral_table >> load_xml_data
+    ensure_pools >> [replace_museum_files, load_museum_ranges, load_entrepreneur_data, load_xml_data]
+    [load_csv_data, load_json_data, replace_museum_files, load_museum_ranges, load_entrepreneur_data, load_xml_data,
+     infer_schemas, profile_quality, profile_sketches] >> validate_data
+    profile_sketches >> propose_source_ddl
\ No newline at end of file
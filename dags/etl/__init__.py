@@ -0,0 +1 @@
+"""Общие компоненты ETL-пайплайнов: загрузчики источников, приёмники и утилиты."""
@@ -0,0 +1,218 @@
+"""Замеры путей загрузки на синтетических наборах (``etl.synthetic``).
+
+Каждый сценарий запускается в отдельном процессе (spawn): пиковый RSS
+не наследует память предыдущих сценариев и самого Airflow. Пиковый RSS —
+максимум по процессу сценария и его рабочим процессам (ru_maxrss).
+Результаты пишутся в таблицу ``etl_benchmark_results`` и печатаются,
+поэтому прогоны до и после изменения сравнимы одним запросом.
+"""
+import glob
+import json
+import os
+import time
+import uuid
+
+from etl.schemas import MUSEUM_TICKET_SCHEMA, create_table_sql
+
+RESULTS_TABLE = 'etl_benchmark_results'
+
+BENCHMARK_TABLES_SQL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {RESULTS_TABLE} (
+        run_id VARCHAR(40),
+        label VARCHAR(200),
+        case_name VARCHAR(50),
+        rows BIGINT,
+        bytes BIGINT,
+        seconds NUMERIC(12,3),
+        rows_per_sec NUMERIC(14,1),
+        mb_per_sec NUMERIC(10,2),
+        peak_rss_mb NUMERIC(10,1),
+        params JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    f'CREATE INDEX IF NOT EXISTS idx_{RESULTS_TABLE}_case ON {RESULTS_TABLE} (case_name, created_at);',
+    # Отдельные таблицы: замеры не смешиваются с рабочими данными
+    create_table_sql('bench_museum_tickets', MUSEUM_TICKET_SCHEMA),
+    'CREATE TABLE IF NOT EXISTS bench_entrepreneurs (LIKE entrepreneurs INCLUDING DEFAULTS);',
+    'CREATE TABLE IF NOT EXISTS bench_cadastral_objects (LIKE cadastral_objects INCLUDING DEFAULTS);',
+]
+
+
+def _files(data_dir, fmt):
+    return sorted(glob.glob(os.path.join(data_dir, fmt, f'*.{fmt}')))
+
+
+def _csv_copy(paths, work_dir, dsn):
+    from etl.csv_loader import load_csv_parallel
+
+    return load_csv_parallel(paths, MUSEUM_TICKET_SCHEMA, dsn=dsn, table='bench_museum_tickets')['rows']
+
+
+def _csv_parquet(paths, work_dir, dsn):
+    from etl.csv_loader import load_csv_parallel
+
+    return load_csv_parallel(paths, MUSEUM_TICKET_SCHEMA, parquet_dir=os.path.join(work_dir, 'csv_parquet'))['rows']
+
+
+def _csv_dedupe(paths, work_dir, dsn):
+    from etl.dedupe import dedupe_csv_files
+    from etl.quality import MUSEUM_TICKET_RULES, QualityCheck
+
+    quality = QualityCheck('bench_museum_tickets', MUSEUM_TICKET_RULES,
+                           quarantine_dir=os.path.join(work_dir, 'quarantine'))
+    stats = dedupe_csv_files(paths, MUSEUM_TICKET_SCHEMA, ['ticket_id'], os.path.join(work_dir, 'csv_dedupe'),
+                             keep_latest_by='update_timestamp', quality=quality)
+    quality.report(os.path.join(work_dir, 'metrics'))
+    return stats['rows_in']
+
+
+def _json_copy(paths, work_dir, dsn):
+    import psycopg2
+
+    from etl.json_stream import load_entrepreneur_json
+
+    conn = psycopg2.connect(dsn)
+    try:
+        return sum(load_entrepreneur_json(path, conn, table='bench_entrepreneurs')['rows'] for path in paths)
+    finally:
+        conn.close()
+
+
+def _xml_copy(paths, work_dir, dsn):
+    import psycopg2
+
+    from etl.xml_stream import load_cadastral_xml
+
+    conn = psycopg2.connect(dsn)
+    try:
+        return sum(load_cadastral_xml(path, conn=conn, table='bench_cadastral_objects')['rows'] for path in paths)
+    finally:
+        conn.close()
+
+
+def _xml_parquet(paths, work_dir, dsn):
+    from etl.xml_stream import load_cadastral_xml
+
+    directory = os.path.join(work_dir, 'xml_parquet')
+    os.makedirs(directory, exist_ok=True)
+    return sum(
+        load_cadastral_xml(path, parquet_path=os.path.join(directory, os.path.basename(path) + '.parquet'))['rows']
+        for path in paths
+    )
+
+
+# Сценарий: (формат исходных файлов, очищаемая таблица или None, функция)
+CASES = {
+    'csv_copy': ('csv', 'bench_museum_tickets', _csv_copy),
+    'csv_parquet': ('csv', None, _csv_parquet),
+    'csv_dedupe': ('csv', None, _csv_dedupe),
+    'json_copy': ('json', 'bench_entrepreneurs', _json_copy),
+    'xml_copy': ('xml', 'bench_cadastral_objects', _xml_copy),
+    'xml_parquet': ('xml', None, _xml_parquet),
+}
+
+
+def _peak_rss_mb():
+    import resource
+
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak_kb / 1024, 1)
+
+
+def _truncate(dsn, table):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {table}')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run_case(name, paths, work_dir, dsn, results):
+    """Тело процесса сценария: замер и результат в очередь"""
+    _, table, function = CASES[name]
+    if table is not None:
+        _truncate(dsn, table)
+    started = time.monotonic()
+    rows = function(paths, os.path.join(work_dir, name), dsn)
+    results.put({'rows': rows, 'seconds': time.monotonic() - started, 'peak_rss_mb': _peak_rss_mb()})
+
+
+def run_case(name, data_dir, work_dir, dsn=None):
+    """Один сценарий в отдельном процессе; статистика пропускной способности"""
+    import multiprocessing
+    import shutil
+
+    fmt, table, _ = CASES[name]
+    paths = _files(data_dir, fmt)
+    if not paths:
+        raise FileNotFoundError(f'Нет файлов {fmt} в {data_dir}')
+    if table is not None and dsn is None:
+        raise ValueError(f'Сценарию {name} нужен dsn')
+
+    shutil.rmtree(os.path.join(work_dir, name), ignore_errors=True)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(name, paths, work_dir, dsn, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f'Сценарий {name} завершился с кодом {process.exitcode}')
+    measured = results.get()
+    shutil.rmtree(os.path.join(work_dir, name), ignore_errors=True)
+
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    seconds = max(measured['seconds'], 1e-9)
+    stats = {
+        'case_name': name,
+        'files': len(paths),
+        'rows': measured['rows'],
+        'bytes': total_bytes,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(measured['rows'] / seconds, 1),
+        'mb_per_sec': round(total_bytes / seconds / 1024 / 1024, 2),
+        'peak_rss_mb': measured['peak_rss_mb'],
+    }
+    print(f"Benchmark {name}: {stats['rows']} rows, {total_bytes / 1024 / 1024:.1f} MB in {stats['seconds']}s, "
+          f"{stats['mb_per_sec']} MB/s, {stats['rows_per_sec']} rows/s, peak RSS {stats['peak_rss_mb']} MB")
+    return stats
+
+
+def save_results(dsn, results, run_id, label='', params=None):
+    """Запись результатов прогона в ``etl_benchmark_results``"""
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            for stats in results:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {RESULTS_TABLE}
+                        (run_id, label, case_name, rows, bytes, seconds, rows_per_sec, mb_per_sec, peak_rss_mb, params)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (run_id, label, stats['case_name'], stats['rows'], stats['bytes'], stats['seconds'],
+                     stats['rows_per_sec'], stats['mb_per_sec'], stats['peak_rss_mb'],
+                     json.dumps(params or {})),
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_benchmark(data_dir, work_dir, cases=None, dsn=None, label='', params=None, run_id=None):
+    """Прогон сценариев по очереди; без ``dsn`` — только сценарии без PostgreSQL"""
+    if cases is None:
+        cases = [name for name, (_, table, _) in CASES.items() if dsn is not None or table is None]
+    run_id = run_id or uuid.uuid4().hex
+    results = [run_case(name, data_dir, work_dir, dsn) for name in cases]
+    if dsn is not None:
+        save_results(dsn, results, run_id, label, params)
+    return {'run_id': run_id, 'results': results}
@@ -0,0 +1,68 @@
+"""Общие настройки ETL: пути к исходным данным и параметры подключений"""
+import os
+
+# Каталог с исходными наборами данных (монтируется в контейнеры Airflow)
+DATA_DIR = os.environ.get('ETL_DATA_DIR', '/opt/airflow/data')
+
+CSV_DIR = os.path.join(DATA_DIR, 'csv')
+JSON_DIR = os.path.join(DATA_DIR, 'json')
+XML_DIR = os.path.join(DATA_DIR, 'xml')
+
+# Каталог для колоночных выгрузок (Parquet)
+PARQUET_DIR = os.environ.get('ETL_PARQUET_DIR', os.path.join(DATA_DIR, 'parquet'))
+
+POSTGRES_CONN_ID = 'postgres_default'
+
+# Размер пачки записей по умолчанию для потоковых загрузчиков
+DEFAULT_BATCH_SIZE = int(os.environ.get('ETL_BATCH_SIZE', '50000'))
+
+KAFKA_BOOTSTRAP_SERVERS = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092')
+
+# Общий с контейнерами Spark каталог (volume etl_shared)
+SHARED_DIR = os.environ.get('ETL_SHARED_DIR', '/opt/etl')
+
+# Каталог опубликованных схем (JSON StructType) для Spark job'ов
+SCHEMA_DIR = os.environ.get('ETL_SCHEMA_DIR', os.path.join(SHARED_DIR, 'schemas'))
+
+# Собранные пакеты Spark job'ов и замеры их запусков
+JOBS_DIR = os.environ.get('ETL_JOBS_DIR', os.path.join(SHARED_DIR, 'jobs'))
+METRICS_DIR = os.environ.get('ETL_METRICS_DIR', os.path.join(SHARED_DIR, 'metrics'))
+
+# Кэш выведенных схем, ключ — отпечаток исходных файлов
+SCHEMA_CACHE_DIR = os.environ.get('ETL_SCHEMA_CACHE_DIR', os.path.join(DATA_DIR, '.schema_cache'))
+
+# Слой Parquet файлов (общий volume, доступен Spark и Airflow)
+LAKE_DIR = os.environ.get('ETL_LAKE_DIR', os.path.join(SHARED_DIR, 'lake'))
+
+# Рабочий каталог дедупликации (корзины и очищенные файлы перед загрузкой)
+DEDUPE_DIR = os.environ.get('ETL_DEDUPE_DIR', os.path.join(DATA_DIR, '.dedupe'))
+
+# Строки, не прошедшие правила качества (Parquet по наборам, см. etl.quality)
+QUARANTINE_DIR = os.environ.get('ETL_QUARANTINE_DIR', os.path.join(SHARED_DIR, 'quarantine'))
+
+# Синтетические наборы и рабочие файлы замеров загрузки (etl.synthetic, etl.benchmark)
+BENCHMARK_DIR = os.environ.get('ETL_BENCHMARK_DIR', os.path.join(DATA_DIR, 'benchmark'))
+
+# Pushgateway для метрик задач и streaming запросов (пустое значение отключает отправку)
+PUSHGATEWAY_URL = os.environ.get('ETL_PUSHGATEWAY_URL', 'http://pushgateway:9091')
+
+# Позиции streaming запросов в Kafka, публикуемые Spark job'ами (etl.spark_jobs.throughput)
+OFFSETS_DIR = os.environ.get('ETL_OFFSETS_DIR', os.path.join(SHARED_DIR, 'offsets'))
+
+# Ядра кластера Spark, доступные одному job'у при выработке backlog'а
+SPARK_MAX_CORES = int(os.environ.get('ETL_SPARK_MAX_CORES', '4'))
+
+# Сохранённые профили колонок по файлам наборов (etl.profiling)
+PROFILE_DIR = os.environ.get('ETL_PROFILE_DIR', os.path.join(DATA_DIR, '.profiles'))
+
+# Предложения компактного DDL по профилям колонок (etl.ddl)
+DDL_DIR = os.environ.get('ETL_DDL_DIR', os.path.join(SHARED_DIR, 'ddl'))
+
+# Пулы Airflow: одновременные загрузки в PostgreSQL (задача на файл/диапазон) и spark-submit'ы
+POSTGRES_LOAD_POOL = 'postgres_load'
+POSTGRES_LOAD_POOL_SLOTS = int(os.environ.get('ETL_POSTGRES_LOAD_SLOTS', '4'))
+SPARK_POOL = 'spark_jobs'
+SPARK_POOL_SLOTS = int(os.environ.get('ETL_SPARK_POOL_SLOTS', '2'))
+
+# Часовой пояс источников: по нему считается бизнес-день (разбиение lake по датам)
+SOURCE_TIMEZONE = os.environ.get('ETL_SOURCE_TIMEZONE', 'Europe/Moscow')
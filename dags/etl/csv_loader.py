@@ -0,0 +1,394 @@
+"""Параллельная загрузка больших CSV файлов.
+
+Файл делится на диапазоны байт по границам записей с учётом кавычек
+(перевод строки внутри значения в кавычках границей не считается).
+Диапазоны обрабатываются пулом процессов: каждый процесс передаёт свой
+кусок файла прямо в ``COPY ... FROM STDIN`` (типы разбирает PostgreSQL)
+или конвертирует его в Parquet через ``pyarrow.csv`` по явной схеме.
+
+Parquet с hive-разбиением пишется в два прохода, чтобы файл партиции
+не дробился по диапазонам: диапазоны раскладывают строки по корзинам
+партиций (Arrow IPC на диске, вся партиция — в одной корзине), затем
+каждая корзина сортируется по ключам и пишется по одному файлу на партицию.
+"""
+import os
+import shutil
+import time
+import uuid
+import zlib
+
+from etl.config import SOURCE_TIMEZONE
+from etl.schemas import column_names
+
+SCAN_BLOCK_SIZE = 8 * 1024 * 1024
+TARGET_RANGE_BYTES = 64 * 1024 * 1024
+
+# Корзина партиций второго прохода должна помещаться в память
+PARTITION_BUCKET_BYTES = 64 * 1024 * 1024
+MIN_PARTITION_BUCKETS = 4
+
+
+def split_csv_ranges(path, parts, header=True, quotechar=b'"'):
+    """Разбиение файла на ``parts`` диапазонов ``(start, end)`` по границам записей.
+
+    Чётность числа кавычек от начала файла определяет, находится ли позиция
+    внутри значения в кавычках; граница ставится на первый перевод строки
+    после целевого смещения, где чётность равна нулю. Подсчёт кавычек идёт
+    блоками через ``bytes.count``, поэтому проход по файлу дешёвый.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if header:
+            f.readline()
+        start = f.tell()
+        boundaries = [start]
+        pos = start
+        parity = 0
+
+        for i in range(1, parts):
+            target = start + (size - start) * i // parts
+            if target <= boundaries[-1]:
+                continue
+
+            # Чётность кавычек до целевого смещения
+            while pos < target:
+                data = f.read(min(SCAN_BLOCK_SIZE, target - pos))
+                if not data:
+                    break
+                parity ^= data.count(quotechar) & 1
+                pos += len(data)
+
+            boundary = _next_record_boundary(f, pos, parity, quotechar)
+            if boundary is None or boundary >= size:
+                break
+            boundaries.append(boundary)
+            pos = boundary
+            parity = 0
+            f.seek(boundary)
+
+    boundaries.append(size)
+    return [(a, b) for a, b in zip(boundaries, boundaries[1:]) if b > a]
+
+
+def _next_record_boundary(f, pos, parity, quotechar):
+    """Смещение после первого перевода строки вне кавычек, начиная с ``pos``"""
+    while True:
+        data = f.read(SCAN_BLOCK_SIZE)
+        if not data:
+            return None
+        index = 0
+        while True:
+            newline = data.find(b'\n', index)
+            if newline == -1:
+                parity ^= data.count(quotechar, index) & 1
+                pos += len(data)
+                break
+            parity ^= data.count(quotechar, index, newline) & 1
+            if parity == 0:
+                return pos + newline + 1
+            index = newline + 1
+
+
+class RangeReader:
+    """Файлоподобный объект, читающий только байты ``[start, end)``"""
+
+    def __init__(self, f, start, end):
+        f.seek(start)
+        self._f = f
+        self._remaining = end - start
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        size = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        line = self._f.readline(self._remaining if size is None or size < 0 else min(size, self._remaining))
+        self._remaining -= len(line)
+        return line
+
+
+def copy_range_to_postgres(path, start, end, dsn, table, columns, delimiter):
+    """COPY диапазона файла в таблицу; возвращает число строк"""
+    import psycopg2
+
+    copy_sql = (
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN "
+        f"WITH (FORMAT csv, DELIMITER '{delimiter}', HEADER false)"
+    )
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor, open(path, 'rb') as f:
+            # Имя файла подставляется в source_file через DEFAULT current_setting(...)
+            cursor.execute("SELECT set_config('etl.source_file', %s, true)", (os.path.basename(path),))
+            cursor.copy_expert(copy_sql, RangeReader(f, start, end))
+            rows = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return rows
+
+
+def local_date(values, timezone=SOURCE_TIMEZONE):
+    """Дата времени в поясе ``timezone`` (01:30+03:00 — тот же день, а не предыдущий по UTC)"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_timestamp(values.type) and values.type.tz is not None:
+        values = pc.local_timestamp(values.cast(pa.timestamp(values.type.unit, tz=timezone)))
+    return pc.cast(values, pa.date32())
+
+
+def read_csv_range(path, start, end, schema, delimiter, date_columns=None):
+    """Таблица Arrow диапазона файла по явной схеме.
+
+    ``date_columns`` — ``{новая колонка: колонка времени}``, производные
+    даты (в поясе ``SOURCE_TIMEZONE``) для разбиения по дню.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    from etl.schemas import arrow_schema
+
+    with open(path, 'rb') as f:
+        data = RangeReader(f, start, end).read()
+
+    types = arrow_schema(schema)
+    table = pv.read_csv(
+        pa.BufferReader(data),
+        read_options=pv.ReadOptions(column_names=column_names(schema)),
+        parse_options=pv.ParseOptions(delimiter=delimiter, newlines_in_values=True),
+        convert_options=pv.ConvertOptions(
+            column_types={field.name: field.type for field in types},
+            strings_can_be_null=True,
+        ),
+    )
+    for column, source in (date_columns or {}).items():
+        table = table.append_column(column, local_date(table[source]))
+    return table
+
+
+def convert_range_to_parquet(path, start, end, schema, delimiter, output_path, date_columns=None):
+    """Конвертация диапазона файла в один файл Parquet; возвращает число строк"""
+    import pyarrow.parquet as pq
+
+    table = read_csv_range(path, start, end, schema, delimiter, date_columns)
+    pq.write_table(table, output_path, compression='zstd')
+    return table.num_rows
+
+
+def _partition_runs(table, partition_cols):
+    """Отрезки ``(начало, длина)`` партиций в таблице, отсортированной по ``partition_cols``"""
+    import pyarrow.compute as pc
+
+    if table.num_rows < 2:
+        # Пустой ChunkedArray сравнений одной строки роняет indices_nonzero
+        return [(0, table.num_rows)] if table.num_rows else []
+    changed = None
+    for column in partition_cols:
+        values = table[column]
+        head, tail = values.slice(0, table.num_rows - 1), values.slice(1)
+        differs = pc.or_kleene(pc.not_equal(head, tail), pc.xor(pc.is_null(head), pc.is_null(tail)))
+        differs = pc.fill_null(differs, False)
+        changed = differs if changed is None else pc.or_(changed, differs)
+    starts = [0] + [index + 1 for index in pc.indices_nonzero(changed.combine_chunks()).to_pylist()]
+    return [(a, b - a) for a, b in zip(starts, starts[1:] + [table.num_rows])]
+
+
+def spill_range_by_partition(path, index, start, end, schema, delimiter, spill_dir, partition_cols,
+                             buckets, date_columns=None):
+    """Проход 1: строки диапазона по корзинам партиций (файл IPC на корзину и диапазон)"""
+    import pyarrow.ipc as ipc
+
+    table = read_csv_range(path, start, end, schema, delimiter, date_columns)
+    table = table.sort_by([(column, 'ascending') for column in partition_cols])
+    writers = {}
+    try:
+        for offset, length in _partition_runs(table, partition_cols):
+            key = '\x1f'.join(str(table[column][offset].as_py()) for column in partition_cols)
+            bucket = zlib.crc32(key.encode('utf-8')) % buckets
+            if bucket not in writers:
+                bucket_dir = os.path.join(spill_dir, f'{bucket:05d}')
+                os.makedirs(bucket_dir, exist_ok=True)
+                writers[bucket] = ipc.new_stream(
+                    os.path.join(bucket_dir, f'{os.path.basename(path)}-{index:05d}.arrow'), table.schema
+                )
+            for batch in table.slice(offset, length).to_batches():
+                writers[bucket].write_batch(batch)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return table.num_rows
+
+
+def write_partition_bucket(bucket_dir, output_path, partition_cols, basename):
+    """Проход 2: корзина сортируется по ключам и пишется по одному файлу на партицию"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.ipc as ipc
+
+    tables = []
+    for name in sorted(os.listdir(bucket_dir)):
+        with ipc.open_stream(os.path.join(bucket_dir, name)) as reader:
+            tables.append(reader.read_all())
+    table = pa.concat_tables(tables).sort_by([(column, 'ascending') for column in partition_cols])
+    partitions = len(_partition_runs(table, partition_cols))
+    ds.write_dataset(
+        table,
+        output_path,
+        format='parquet',
+        partitioning=partition_cols,
+        partitioning_flavor='hive',
+        basename_template=f'{basename}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        # Строки партиции идут подряд: файл партиции открывается один раз
+        max_partitions=max(partitions, 1),
+        max_open_files=max(partitions, 1),
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+    )
+    shutil.rmtree(bucket_dir)
+    return partitions
+
+
+def _spill_range(task):
+    path, index, start, end, target = task
+    started = time.time()
+    rows = spill_range_by_partition(
+        path, index, start, end, target['schema'], target['delimiter'], target['spill_dir'],
+        target['partition_cols'], target['buckets'], target['date_columns'],
+    )
+    return path, rows, end - start, started, time.time()
+
+
+def _write_bucket(task):
+    bucket_dir, target = task
+    return write_partition_bucket(
+        bucket_dir, target['parquet_dir'], target['partition_cols'], f"{target['run_id']}-{os.path.basename(bucket_dir)}"
+    )
+
+
+def _process_range(task):
+    """Обработка одного диапазона в процессе пула"""
+    path, index, start, end, target = task
+    started = time.time()
+    if 'dsn' in target:
+        rows = copy_range_to_postgres(
+            path, start, end, target['dsn'], target['table'], target['columns'], target['delimiter']
+        )
+    else:
+        base = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(target['parquet_dir'], f'{base}-{index:05d}.parquet')
+        rows = convert_range_to_parquet(
+            path, start, end, target['schema'], target['delimiter'], output_path,
+            date_columns=target['date_columns'],
+        )
+    return path, rows, end - start, started, time.time()
+
+
+def plan_csv_ranges(paths, header=True, target_range_bytes=TARGET_RANGE_BYTES):
+    """Диапазоны файлов около ``target_range_bytes`` для отдельных задач Airflow.
+
+    Каждый диапазон загружается ``copy_range_to_postgres`` одной транзакцией,
+    поэтому повтор задачи диапазона не дублирует строки.
+    """
+    ranges = []
+    for path in paths:
+        parts = max(1, -(-os.path.getsize(path) // target_range_bytes))
+        ranges.extend({'path': path, 'start': start, 'end': end}
+                      for start, end in split_csv_ranges(path, parts, header=header))
+    return ranges
+
+
+def load_csv_parallel(paths, schema, dsn=None, table=None, parquet_dir=None, delimiter=';',
+                      header=True, workers=None, target_range_bytes=TARGET_RANGE_BYTES,
+                      partition_cols=None, date_columns=None):
+    """Параллельная загрузка набора CSV файлов в PostgreSQL или Parquet.
+
+    Все диапазоны всех файлов попадают в общий пул, поэтому загрузка
+    масштабируется числом процессов, а не числом файлов.
+    Для Parquet ``partition_cols`` задаёт hive-разбиение набора в
+    ``parquet_dir``: за запуск в партицию добавляется один файл
+    (``spill_range_by_partition``, ``write_partition_bucket``).
+    Возвращает статистику по каждому файлу и общую.
+    """
+    import multiprocessing
+
+    if (dsn is None) == (parquet_dir is None):
+        raise ValueError('Нужно указать ровно один приёмник: dsn/table или parquet_dir')
+
+    workers = workers or os.cpu_count() or 1
+    process_range = _process_range
+    if dsn is not None:
+        target = {'dsn': dsn, 'table': table, 'columns': column_names(schema), 'delimiter': delimiter}
+    else:
+        os.makedirs(parquet_dir, exist_ok=True)
+        target = {'parquet_dir': parquet_dir, 'schema': schema, 'delimiter': delimiter,
+                  'partition_cols': partition_cols, 'date_columns': date_columns}
+    if partition_cols:
+        # Каталог с '_' не виден читателям набора и компакции
+        run_id = uuid.uuid4().hex[:12]
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        target.update(run_id=run_id, spill_dir=os.path.join(parquet_dir, f'_spill-{run_id}'),
+                      buckets=max(MIN_PARTITION_BUCKETS, -(-total_bytes // PARTITION_BUCKET_BYTES)))
+        process_range = _spill_range
+
+    tasks = []
+    for path in paths:
+        parts = max(workers, -(-os.path.getsize(path) // target_range_bytes))
+        for index, (start, end) in enumerate(split_csv_ranges(path, parts, header=header)):
+            tasks.append((path, index, start, end, target))
+
+    started = time.time()
+    per_file = {}
+    partitions = None
+    with multiprocessing.Pool(workers) as pool:
+        for path, rows, size, range_started, range_finished in pool.imap_unordered(process_range, tasks):
+            stats = per_file.setdefault(path, {'file': path, 'rows': 0, 'bytes': 0,
+                                               'started': range_started, 'finished': range_finished})
+            stats['rows'] += rows
+            stats['bytes'] += size
+            stats['started'] = min(stats['started'], range_started)
+            stats['finished'] = max(stats['finished'], range_finished)
+
+        if partition_cols:
+            spill_dir = target['spill_dir']
+            buckets = sorted(os.listdir(spill_dir)) if os.path.isdir(spill_dir) else []
+            partitions = sum(pool.imap_unordered(
+                _write_bucket, [(os.path.join(spill_dir, bucket), target) for bucket in buckets]
+            ))
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            # Файлы готовы только после второго прохода
+            for stats in per_file.values():
+                stats['finished'] = time.time()
+    elapsed = max(time.time() - started, 1e-9)
+
+    files = []
+    for path in paths:
+        stats = per_file.get(path, {'file': path, 'rows': 0, 'bytes': 0, 'started': started, 'finished': started})
+        wall = max(stats.pop('finished') - stats.pop('started'), 1e-9)
+        stats['seconds'] = round(wall, 3)
+        stats['rows_per_sec'] = round(stats['rows'] / wall, 1)
+        stats['mb_per_sec'] = round(stats['bytes'] / wall / 1024 / 1024, 2)
+        print(f"CSV {os.path.basename(path)}: {stats['rows']} rows in {stats['seconds']}s, "
+              f"{stats['mb_per_sec']} MB/s, {stats['rows_per_sec']} rows/s")
+        files.append(stats)
+
+    total_rows = sum(stats['rows'] for stats in files)
+    total_bytes = sum(stats['bytes'] for stats in files)
+    summary = {
+        'files': files,
+        'workers': workers,
+        'ranges': len(tasks),
+        'rows': total_rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(total_rows / elapsed, 1),
+        'mb_per_sec': round(total_bytes / elapsed / 1024 / 1024, 2),
+    }
+    if partitions is not None:
+        summary['partitions'] = partitions
+    print(f"CSV total: {total_rows} rows, {len(tasks)} ranges on {workers} workers, "
+          f"{summary['mb_per_sec']} MB/s, {summary['rows_per_sec']} rows/s")
+    return summary
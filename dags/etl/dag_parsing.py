@@ -0,0 +1,126 @@
+"""Замер времени разбора DAG-файлов.
+
+Планировщик постоянно перечитывает каждый файл ``dags/``, и время разбора
+задерживает планирование задач. Каждый файл импортируется в отдельном
+интерпретаторе, где Airflow уже загружен (как в процессе разбора
+планировщика), поэтому измеряется стоимость самого файла: его импорты
+верхнего уровня и построение DAG. Файл не проходит проверку, если время
+разбора больше бюджета или при разборе загружен модуль из
+``HEAVY_MODULES`` — такие импорты должны быть внутри callable задач.
+
+Запуск: ``python -m etl.dag_parsing [--budget 0.5]`` из каталога dags
+(код возврата 1 при нарушениях) или DAG ``dag_parse_benchmark``.
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+from etl.config import METRICS_DIR
+
+DAG_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARSE_BUDGET_SECONDS = float(os.environ.get('ETL_DAG_PARSE_BUDGET', '0.5'))
+PARSE_REPEATS = 3
+PROBE_TIMEOUT_SECONDS = 120
+
+# Модули, которые не должны загружаться при разборе DAG-файла
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'pyspark', 'requests', 'psycopg2', 'confluent_kafka')
+
+# Выполняется в отдельном интерпретаторе: Airflow загружен до начала замера
+_PROBE = r'''
+import importlib.util, json, sys, time
+from airflow.models.dag import DAG
+
+path = sys.argv[1]
+sys.path.insert(0, sys.argv[2])
+before = set(sys.modules)
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('dag_parse_probe', path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+seconds = time.perf_counter() - started
+print('DAG_PARSE ' + json.dumps({
+    'seconds': seconds,
+    'dags': sorted(value.dag_id for value in vars(module).values() if isinstance(value, DAG)),
+    'modules': sorted({name.split('.')[0] for name in set(sys.modules) - before}),
+}))
+'''
+
+
+def dag_files(dag_folder=DAG_FOLDER):
+    """Файлы, которые разбирает планировщик (эвристика safe mode: есть 'airflow' и 'dag')"""
+    files = []
+    for path in sorted(glob.glob(os.path.join(dag_folder, '*.py'))):
+        with open(path, encoding='utf-8') as f:
+            content = f.read().lower()
+        if 'airflow' in content and 'dag' in content:
+            files.append(path)
+    return files
+
+
+def measure_dag_file(path, dag_folder=DAG_FOLDER, repeats=PARSE_REPEATS):
+    """Лучшее из ``repeats`` время разбора файла, его DAG'и и загруженные им модули"""
+    best = None
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, '-c', _PROBE, path, dag_folder],
+            capture_output=True, text=True, timeout=PROBE_TIMEOUT_SECONDS, cwd=dag_folder,
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith('DAG_PARSE ')]
+        if result.returncode != 0 or not lines:
+            error = (result.stderr.strip().splitlines() or ['no output'])[-1]
+            return {'file': os.path.basename(path), 'seconds': None, 'dags': [], 'modules': [], 'error': error}
+        probe = json.loads(lines[-1][len('DAG_PARSE '):])
+        if best is None or probe['seconds'] < best['seconds']:
+            best = probe
+    best['seconds'] = round(best['seconds'], 4)
+    return {'file': os.path.basename(path), **best, 'error': None}
+
+
+def check_dag_parsing(dag_folder=DAG_FOLDER, budget=PARSE_BUDGET_SECONDS, repeats=PARSE_REPEATS,
+                      metrics_dir=METRICS_DIR):
+    """Замер всех DAG-файлов; RuntimeError, если файл медленнее бюджета или грузит тяжёлые модули"""
+    results = []
+    violations = []
+    for path in dag_files(dag_folder):
+        stats = measure_dag_file(path, dag_folder, repeats)
+        stats['heavy'] = [module for module in stats['modules'] if module in HEAVY_MODULES]
+        stats['budget'] = budget
+        if stats['error'] is not None:
+            violations.append(f"{stats['file']}: import failed ({stats['error']})")
+        elif stats['seconds'] > budget:
+            violations.append(f"{stats['file']}: {stats['seconds']:.3f}s > {budget}s budget")
+        if stats['heavy']:
+            violations.append(f"{stats['file']}: imports {', '.join(stats['heavy'])} at parse time")
+        results.append(stats)
+        print(f"PARSE {stats['file']}: {stats['seconds']}s, dags={stats['dags']}, "
+              f"{len(stats['modules'])} new top-level modules")
+
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        with open(os.path.join(metrics_dir, 'dag_parse.jsonl'), 'a') as f:
+            for stats in results:
+                f.write(json.dumps({'at': time.time(), **stats}) + '\n')
+    except OSError as e:
+        print(f"Cannot write parse metrics: {e}")
+
+    if violations:
+        raise RuntimeError('Разбор DAG-файлов вне бюджета:\n' + '\n'.join(violations))
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DAG file parse-time check')
+    parser.add_argument('--dag-folder', default=DAG_FOLDER)
+    parser.add_argument('--budget', type=float, default=PARSE_BUDGET_SECONDS)
+    parser.add_argument('--repeats', type=int, default=PARSE_REPEATS)
+    args = parser.parse_args()
+    try:
+        check_dag_parsing(args.dag_folder, args.budget, args.repeats)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,364 @@
+"""Компактный DDL таблиц по профилям колонок.
+
+Профиль колонки — словарь отчёта ``etl.profiling.profile_report``
+(исходные наборы по сводкам) или ``table_profile`` (загруженная таблица:
+``pg_stats`` и один агрегирующий проход). По нему выбирается самый узкий
+тип, в который помещаются все наблюдённые значения:
+
+- целые и NUMERIC(p,0) — SMALLINT/INTEGER/BIGINT по min/max с запасом ``INTEGER_HEADROOM``;
+- строки с полностью известным малым набором значений — ENUM;
+- прочие строки с малой долей различных значений — справочник и ключ SMALLINT/INTEGER;
+- остальные строки — VARCHAR(n) по максимальной длине с запасом;
+- NOT NULL, если пустых значений не встретилось.
+
+Колонки упорядочиваются по выравниванию (8, 4, 2, 1 байт, затем
+переменной длины), чтобы между ними не было байтов выравнивания.
+Ширина строки оценивается для текущей и предложенной схем на одних и
+тех же профилях. Предложение не применяется автоматически: DDL и отчёт
+пишутся в ``DDL_DIR`` для ревью миграции.
+"""
+import json
+import math
+import os
+import re
+
+from etl.config import DDL_DIR
+
+# Наблюдённый диапазон целых, умноженный на запас, должен помещаться в тип
+INTEGER_HEADROOM = 4
+INTEGER_TYPES = (('SMALLINT', 2 ** 15 - 1), ('INTEGER', 2 ** 31 - 1), ('BIGINT', 2 ** 63 - 1))
+
+# ENUM — только если известны все значения; справочник — при малой доле различных
+ENUM_MAX_VALUES = 16
+LOOKUP_MAX_RATIO = 0.05
+
+# Хранение фиксированных типов: (байты, выравнивание)
+TYPE_STORAGE = {
+    'SMALLINT': (2, 2),
+    'INTEGER': (4, 4),
+    'BIGINT': (8, 8),
+    'REAL': (4, 4),
+    'DOUBLE PRECISION': (8, 8),
+    'BOOLEAN': (1, 1),
+    'DATE': (4, 4),
+    'TIME': (8, 8),
+    'TIMESTAMP': (8, 8),
+    'TIMESTAMPTZ': (8, 8),
+    'UUID': (16, 1),
+    'ENUM': (4, 4),
+}
+
+TYPE_ALIASES = {
+    'INT': 'INTEGER',
+    'INT2': 'SMALLINT',
+    'INT4': 'INTEGER',
+    'INT8': 'BIGINT',
+    'SERIAL': 'INTEGER',
+    'BIGSERIAL': 'BIGINT',
+    'FLOAT4': 'REAL',
+    'FLOAT8': 'DOUBLE PRECISION',
+    'BOOL': 'BOOLEAN',
+    'DECIMAL': 'NUMERIC',
+    'CHARACTER VARYING': 'VARCHAR',
+    'CHARACTER': 'CHAR',
+    'TIMESTAMP WITHOUT TIME ZONE': 'TIMESTAMP',
+    'TIMESTAMP WITH TIME ZONE': 'TIMESTAMPTZ',
+    'TIME WITHOUT TIME ZONE': 'TIME',
+}
+
+TEXT_TYPES = ('VARCHAR', 'TEXT', 'CHAR')
+
+# Заголовок кортежа, указатель на строку в странице, MAXALIGN
+TUPLE_HEADER_BYTES = 23
+ITEM_POINTER_BYTES = 4
+MAX_ALIGN = 8
+
+
+def base_type(pg_type):
+    """Тип без модификаторов: ``DECIMAL(10,2)`` -> ``NUMERIC``"""
+    name = re.sub(r'\(.*?\)', '', pg_type).strip().upper()
+    name = ' '.join(name.split())
+    return TYPE_ALIASES.get(name, name)
+
+
+def _type_args(pg_type):
+    match = re.search(r'\(([^)]*)\)', pg_type)
+    return [int(arg) for arg in match.group(1).split(',')] if match else []
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _numeric_bytes(profile, scale):
+    """Размер NUMERIC без заголовка: 2 байта метаданных + группы по 4 цифры"""
+    quantiles = profile.get('quantiles') or {}
+    bound = max(abs(quantiles.get('min') or 0), abs(quantiles.get('max') or 0))
+    integer_digits = len(str(int(bound))) if bound >= 1 else 0
+    return 2 + 2 * (math.ceil(integer_digits / 4) + math.ceil(scale / 4))
+
+
+def column_storage(pg_type, profile):
+    """(байты, выравнивание) типичного значения колонки"""
+    base = base_type(pg_type)
+    if base in TYPE_STORAGE:
+        return TYPE_STORAGE[base]
+    if base == 'NUMERIC':
+        args = _type_args(pg_type)
+        width = _numeric_bytes(profile or {}, args[1] if len(args) > 1 else 0)
+    else:
+        width = math.ceil((profile or {}).get('avg_bytes') or 0)
+    # Короткие значения переменной длины хранятся с 1-байтовым заголовком без выравнивания
+    return (width + 1, 1) if width < 127 else (width + 4, 4)
+
+
+def estimate_row_bytes(columns):
+    """Байты на строку (с указателем в странице) по ``[(тип, профиль)]`` в порядке колонок.
+
+    Считается типичная строка: колонки с долей NULL от 50% — пустые.
+    """
+    nullable = any(profile is None or profile.get('null_rate', 0) > 0 for _, profile in columns)
+    header = _align(TUPLE_HEADER_BYTES + (math.ceil(len(columns) / 8) if nullable else 0), MAX_ALIGN)
+    offset = 0
+    for pg_type, profile in columns:
+        if profile is not None and profile.get('null_rate', 0) >= 0.5:
+            continue
+        size, alignment = column_storage(pg_type, profile)
+        offset = _align(offset, alignment) + size
+    return _align(header + offset, MAX_ALIGN) + ITEM_POINTER_BYTES
+
+
+def _integer_type(profile):
+    quantiles = profile.get('quantiles') or {}
+    if quantiles.get('min') is None or quantiles.get('max') is None:
+        return None
+    bound = max(abs(quantiles['min']), abs(quantiles['max'])) * INTEGER_HEADROOM
+    return next((name for name, limit in INTEGER_TYPES if bound <= limit), None)
+
+
+def _known_values(profile):
+    """Все значения колонки, если профиль их полностью перечисляет (иначе None)"""
+    top = profile.get('top') or []
+    present = profile['rows'] - profile['nulls']
+    if not top or len(top) > ENUM_MAX_VALUES or profile['distinct'] > len(top):
+        return None
+    # Частоты count-min не занижены: сумма меньше строк — есть значения вне списка
+    if sum(count for _, count in top) < present:
+        return None
+    return sorted(str(value) for value, _ in top)
+
+
+def _varchar_length(profile, current_length):
+    """Максимальная длина с запасом: ближайшая степень двойки от 1.25 x максимума"""
+    length = max(1, profile.get('max_length') or 0)
+    limit = 1 << math.ceil(math.log2(length * 1.25))
+    return min(limit, current_length) if current_length else limit
+
+
+def narrow_column(name, pg_type, profile):
+    """Предложение для колонки: тип, NOT NULL, ENUM/справочник и причина"""
+    column = {'column': name, 'current': pg_type, 'proposed': pg_type, 'not_null': False,
+              'enum_values': None, 'lookup': None, 'reason': 'kept'}
+    if not profile or not profile.get('rows'):
+        column['reason'] = 'no profile'
+        return column
+    column['not_null'] = profile['nulls'] == 0
+    base = base_type(pg_type)
+
+    if base in ('SMALLINT', 'INTEGER', 'BIGINT'):
+        narrow = _integer_type(profile)
+        if narrow is not None:
+            column['proposed'] = narrow
+            column['reason'] = f"range {profile['quantiles']['min']:g}..{profile['quantiles']['max']:g}"
+        return column
+
+    if base == 'NUMERIC':
+        args = _type_args(pg_type)
+        narrow = _integer_type(profile) if profile.get('integral') and args[1:2] in ([], [0]) and args else None
+        if narrow is not None:
+            column['proposed'] = narrow
+            column['reason'] = f"integral, range {profile['quantiles']['min']:g}..{profile['quantiles']['max']:g}"
+        else:
+            column['reason'] = 'numeric size depends on values, not precision'
+        return column
+
+    if base not in TEXT_TYPES:
+        return column
+
+    values = _known_values(profile)
+    if values is not None:
+        column['proposed'] = 'ENUM'
+        column['enum_values'] = values
+        column['reason'] = f'{len(values)} known values'
+        return column
+
+    present = profile['rows'] - profile['nulls']
+    distinct = profile['distinct']
+    current_length = (_type_args(pg_type) or [0])[0]
+    length = _varchar_length(profile, current_length)
+    if present and distinct <= present * LOOKUP_MAX_RATIO:
+        key = next(key for key, limit in INTEGER_TYPES if distinct * INTEGER_HEADROOM <= limit)
+        if TYPE_STORAGE[key][0] < (profile.get('avg_bytes') or 0) + 1:
+            column['proposed'] = key
+            column['lookup'] = {'key': key, 'value_type': f'VARCHAR({length})'}
+            column['reason'] = f'~{distinct} distinct of {present} values'
+            return column
+
+    column['proposed'] = f'VARCHAR({length})'
+    column['reason'] = f"max length {profile.get('max_length')}"
+    return column
+
+
+def _storage_order(item):
+    """Фиксированные типы по убыванию выравнивания, затем переменной длины"""
+    position, (column, profile) = item
+    base = base_type(column['proposed'])
+    if base in TYPE_STORAGE:
+        return 0, -TYPE_STORAGE[base][1], position
+    return 1, 0, position
+
+
+def _quote(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def compact_table_ddl(table, schema, profiles):
+    """DDL компактной таблицы ``<table>_compact`` и оценка ширины строки.
+
+    ``schema`` — пары ``(колонка, тип)`` текущей таблицы, ``profiles`` —
+    профили колонок по имени. Колонки без профиля сохраняют тип.
+    """
+    columns = [(narrow_column(name, pg_type, profiles.get(name)), profiles.get(name)) for name, pg_type in schema]
+    ordered = [item for _, item in sorted(enumerate(columns), key=_storage_order)]
+
+    statements = []
+    definitions = []
+    for column, _ in ordered:
+        name, proposed, references = column['column'], column['proposed'], ''
+        if column['enum_values'] is not None:
+            proposed = f'{table}_{name}'
+            statements.append(
+                f"CREATE TYPE {proposed} AS ENUM ({', '.join(_quote(value) for value in column['enum_values'])});"
+            )
+        elif column['lookup'] is not None:
+            lookup_table = f'{table}_{name}_lookup'
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {lookup_table} (\n"
+                f"    id {column['lookup']['key']} GENERATED ALWAYS AS IDENTITY PRIMARY KEY,\n"
+                f"    value {column['lookup']['value_type']} NOT NULL UNIQUE\n"
+                f");"
+            )
+            name = f'{name}_id'
+            references = f' REFERENCES {lookup_table} (id)'
+        definitions.append(f"{name} {proposed}{' NOT NULL' if column['not_null'] else ''}{references}")
+    statements.append(f"CREATE TABLE IF NOT EXISTS {table}_compact (\n    " + ',\n    '.join(definitions) + '\n);')
+
+    current_bytes = estimate_row_bytes([(pg_type, profiles.get(name)) for name, pg_type in schema])
+    proposed_bytes = estimate_row_bytes([(column['proposed'], profile) for column, profile in ordered])
+    proposal = {
+        'table': table,
+        'columns': [column for column, _ in ordered],
+        'current_row_bytes': current_bytes,
+        'proposed_row_bytes': proposed_bytes,
+        'saved_ratio': round(1 - proposed_bytes / current_bytes, 4),
+        'ddl': '\n\n'.join(statements) + '\n',
+    }
+    print(f"Compact {table}: ~{current_bytes} -> ~{proposed_bytes} bytes per row "
+          f"({proposal['saved_ratio']:.1%} smaller)")
+    for column in proposal['columns']:
+        if column['proposed'] != column['current'] or column['not_null']:
+            print(f"  {column['column']}: {column['current']} -> {column['proposed']}"
+                  f"{' NOT NULL' if column['not_null'] else ''} ({column['reason']})")
+    return proposal
+
+
+def write_ddl_proposal(proposal, ddl_dir=DDL_DIR):
+    """DDL в ``<таблица>.sql`` и отчёт по колонкам в ``<таблица>.json``"""
+    os.makedirs(ddl_dir, exist_ok=True)
+    target = os.path.join(ddl_dir, proposal['table'])
+    with open(f'{target}.sql', 'w') as f:
+        f.write(f"-- Estimated row size: {proposal['current_row_bytes']} -> {proposal['proposed_row_bytes']} bytes\n")
+        f.write('-- Indexes and constraints of the current table are not carried over\n\n')
+        f.write(proposal['ddl'])
+    with open(f'{target}.json', 'w') as f:
+        json.dump({key: value for key, value in proposal.items() if key != 'ddl'}, f, indent=2, default=str)
+    print(f"DDL proposal written to {target}.sql")
+    return f'{target}.sql'
+
+
+def table_profile(dsn, table, analyze=True):
+    """Текущая схема и профили колонок загруженной таблицы.
+
+    Доля NULL и число различных — из ``pg_stats`` (после ANALYZE); min/max,
+    длины и целочисленность — одним агрегирующим проходом; значения колонок
+    с малым числом различных — точным GROUP BY.
+    """
+    import psycopg2
+    from psycopg2 import sql
+
+    relation = sql.Identifier(*table.split('.'))
+    schema_name, _, table_name = table.rpartition('.')
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            if analyze:
+                cursor.execute(sql.SQL('ANALYZE {}').format(relation))
+            cursor.execute(
+                "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum",
+                (table,),
+            )
+            schema = cursor.fetchall()
+            # У секционированной таблицы статистика по всем секциям — inherited
+            cursor.execute(
+                "SELECT attname, null_frac, n_distinct FROM pg_stats "
+                "WHERE schemaname = %s AND tablename = %s ORDER BY inherited",
+                (schema_name or 'public', table_name),
+            )
+            stats = {name: (null_frac, n_distinct) for name, null_frac, n_distinct in cursor.fetchall()}
+
+            expressions = [sql.SQL('count(*)')]
+            for name, pg_type in schema:
+                column = sql.Identifier(name)
+                base = base_type(pg_type)
+                expressions.append(sql.SQL('count({})').format(column))
+                if base in ('SMALLINT', 'INTEGER', 'BIGINT', 'NUMERIC', 'REAL', 'DOUBLE PRECISION'):
+                    expressions.extend([sql.SQL('min({})::float8').format(column),
+                                        sql.SQL('max({})::float8').format(column),
+                                        sql.SQL('bool_and({0} = trunc({0}))').format(column)])
+                elif base in TEXT_TYPES:
+                    expressions.extend([sql.SQL('max(char_length({}))').format(column),
+                                        sql.SQL('avg(octet_length({}))::float8').format(column)])
+            cursor.execute(sql.SQL('SELECT {} FROM {}').format(sql.SQL(', ').join(expressions), relation))
+            values = list(cursor.fetchone())
+
+            rows = values.pop(0)
+            profiles = {}
+            for name, pg_type in schema:
+                base = base_type(pg_type)
+                present = values.pop(0)
+                null_frac, n_distinct = stats.get(name, (None, None))
+                distinct = present if n_distinct is None else round(n_distinct if n_distinct >= 0 else -n_distinct * rows)
+                profile = {'kind': 'text', 'rows': rows, 'nulls': rows - present,
+                           'null_rate': round((rows - present) / rows, 6) if rows else 0.0,
+                           'distinct': distinct, 'top': []}
+                if base in ('SMALLINT', 'INTEGER', 'BIGINT', 'NUMERIC', 'REAL', 'DOUBLE PRECISION'):
+                    minimum, maximum, integral = values.pop(0), values.pop(0), values.pop(0)
+                    profile.update(kind='numeric', integral=integral is not False,
+                                   quantiles={'min': minimum, 'max': maximum})
+                elif base in TEXT_TYPES:
+                    max_length, avg_bytes = values.pop(0), values.pop(0)
+                    profile.update(max_length=max_length or 0, avg_bytes=round(avg_bytes or 0, 2))
+                    if 0 < distinct <= ENUM_MAX_VALUES:
+                        cursor.execute(
+                            sql.SQL('SELECT {0}, count(*) FROM {1} WHERE {0} IS NOT NULL GROUP BY {0} LIMIT %s')
+                            .format(sql.Identifier(name), relation),
+                            (ENUM_MAX_VALUES + 1,),
+                        )
+                        top = cursor.fetchall()
+                        profile.update(top=top, distinct=len(top))
+                profiles[name] = profile
+        conn.commit()
+    finally:
+        conn.close()
+    return schema, profiles
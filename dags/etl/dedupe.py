@@ -0,0 +1,271 @@
+"""Пакетная дедупликация больших CSV наборов по ключу.
+
+Два прохода с ограниченной памятью. Первый потоково читает все файлы
+блоками и раскладывает строки по hash-корзинам ключа (Arrow IPC файлы
+на диске): все копии ключа попадают в одну корзину, даже если они в
+разных файлах. Второй проход по одной корзине оставляет одну строку на
+ключ. Число корзин выбирается так, чтобы корзина помещалась в память,
+поэтому объём входа ограничен диском, а не памятью.
+
+Ключи, уже загруженные в хранилище, отсекаются ``WarehouseKeys``:
+Bloom-фильтр по ключам таблицы отвечает «точно нет» без запросов к БД,
+а точная проверка выполняется только для строк, где фильтр ответил «может быть».
+"""
+import hashlib
+import math
+import os
+import shutil
+import time
+import zlib
+
+from etl.schemas import column_names
+
+READ_BLOCK_BYTES = 16 * 1024 * 1024
+BUCKET_TARGET_BYTES = 64 * 1024 * 1024
+MIN_BUCKETS = 8
+
+# Множитель Фибоначчи для хэширования целочисленных ключей
+FIBONACCI_HASH = 0x9E3779B97F4A7C15
+
+BLOOM_ERROR_RATE = 0.01
+KEYS_FETCH_SIZE = 50000
+LOOKUP_CHUNK_SIZE = 10000
+
+
+class BloomFilter:
+    """Bloom-фильтр на ``bytearray``: ~10 бит на ключ при 1% ложных срабатываний"""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class WarehouseKeys:
+    """Ключи таблицы хранилища: Bloom-фильтр и точная проверка кандидатов"""
+
+    def __init__(self, dsn, table, key_column, error_rate=BLOOM_ERROR_RATE):
+        self.dsn = dsn
+        self.table = table
+        self.key_column = key_column
+        self.bloom = self._build(error_rate)
+
+    def _build(self, error_rate):
+        """Фильтр по всем ключам таблицы; ключи читаются серверным курсором"""
+        import psycopg2
+
+        started = time.monotonic()
+        conn = psycopg2.connect(self.dsn)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT count(*) FROM {self.table}")
+                capacity = cursor.fetchone()[0]
+            bloom = BloomFilter(capacity, error_rate)
+            with conn.cursor(name='dedupe_keys') as cursor:
+                cursor.itersize = KEYS_FETCH_SIZE
+                cursor.execute(f"SELECT {self.key_column} FROM {self.table} WHERE {self.key_column} IS NOT NULL")
+                for (key,) in cursor:
+                    bloom.add(key)
+        finally:
+            conn.close()
+        print(f"Bloom filter for {self.table}.{self.key_column}: {capacity} keys, "
+              f"{len(bloom.bits) / 1024 / 1024:.1f} MB, {time.monotonic() - started:.1f}s")
+        return bloom
+
+    def existing(self, keys):
+        """Какие из ``keys`` действительно есть в таблице"""
+        import psycopg2
+
+        found = set()
+        if not keys:
+            return found
+        conn = psycopg2.connect(self.dsn)
+        try:
+            with conn.cursor() as cursor:
+                for offset in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+                    cursor.execute(
+                        f"SELECT DISTINCT {self.key_column} FROM {self.table} WHERE {self.key_column} = ANY(%s)",
+                        (keys[offset:offset + LOOKUP_CHUNK_SIZE],),
+                    )
+                    found.update(key for (key,) in cursor)
+        finally:
+            conn.close()
+        return found
+
+    def filter_new(self, table):
+        """Строки ``table`` с ключами, которых ещё нет в хранилище; и число отсеянных"""
+        import pyarrow as pa
+
+        keys = table[self.key_column].to_pylist()
+        candidates = [key for key in keys if key is not None and key in self.bloom]
+        existing = self.existing(candidates)
+        if not existing:
+            return table, 0
+        mask = pa.array([key is None or key not in existing for key in keys])
+        new_rows = table.filter(mask)
+        return new_rows, table.num_rows - new_rows.num_rows
+
+
+def _bucket_ids(batch, key_columns, bits):
+    """Номер корзины для каждой строки (``2**bits`` корзин)"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if len(key_columns) == 1 and pa.types.is_integer(batch.schema.field(key_columns[0]).type):
+        # Целочисленный ключ хэшируется векторно: старшие биты произведения
+        keys = pc.fill_null(batch[key_columns[0]].cast(pa.int64()), 0).cast(pa.uint64(), safe=False)
+        mixed = pc.multiply(keys, pa.scalar(FIBONACCI_HASH, pa.uint64()))
+        return pc.shift_right(mixed, pa.scalar(64 - bits, pa.uint64())).to_pylist()
+
+    mask = (1 << bits) - 1
+    columns = [batch[column].to_pylist() for column in key_columns]
+    return [zlib.crc32('\x1f'.join(map(str, values)).encode('utf-8')) & mask for values in zip(*columns)]
+
+
+def _first_per_key(table, key_columns, keep_latest_by=None):
+    """Одна строка на ключ: первая встреченная или с наибольшим ``keep_latest_by``.
+
+    Строки с пустым ключом сохраняются все.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if table.num_rows < 2:
+        return table
+    sort_keys = [(column, 'ascending') for column in key_columns]
+    if keep_latest_by:
+        sort_keys.append((keep_latest_by, 'descending'))
+    table = table.take(pc.sort_indices(table, sort_keys=sort_keys))
+
+    changed = None
+    for column in key_columns:
+        values = table[column]
+        differs = pc.fill_null(pc.not_equal(values.slice(1), values.slice(0, table.num_rows - 1)), True)
+        differs = pc.or_(differs, pc.is_null(values.slice(1)))
+        changed = differs if changed is None else pc.or_(changed, differs)
+    keep = pa.concat_arrays([pa.array([True])] + changed.chunks)
+    return table.filter(keep)
+
+
+def dedupe_csv_files(paths, schema, key_columns, output_dir, delimiter=';', header=True,
+                     keep_latest_by=None, warehouse_keys=None, quality=None, source_column=None,
+                     bucket_target_bytes=BUCKET_TARGET_BYTES):
+    """Дедупликация набора CSV файлов по ``key_columns`` в CSV файлы корзин.
+
+    Результат — файлы ``output_dir/part-<корзина>.csv`` без заголовка, с
+    колонками ``schema`` в исходном порядке (загружаются ``load_csv_parallel``).
+    ``source_column`` — имя колонки с именем исходного файла: она
+    добавляется к строкам в первом проходе и пишется последней, поэтому
+    после перемешивания по корзинам строка сохраняет свой источник.
+    ``keep_latest_by`` — колонка, по наибольшему значению которой выбирается
+    строка среди копий ключа. ``warehouse_keys`` (``WarehouseKeys``) отсекает
+    ключи, уже загруженные в хранилище. ``quality`` (``etl.quality.QualityCheck``)
+    проверяет уникальные строки тем же проходом и отсекает некорректные.
+    Возвращает статистику и список файлов.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pv
+    import pyarrow.ipc as ipc
+
+    from etl.schemas import arrow_schema
+
+    started = time.monotonic()
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    buckets = max(MIN_BUCKETS, -(-total_bytes // bucket_target_bytes))
+    bits = max(1, (buckets - 1).bit_length())
+    buckets = 1 << bits
+
+    spill_dir = os.path.join(output_dir, '_buckets')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(spill_dir)
+
+    types = arrow_schema(schema)
+    stats = {'files_in': len(paths), 'bytes_in': total_bytes, 'buckets': buckets,
+             'rows_in': 0, 'duplicates': 0, 'existing': 0, 'rows_out': 0, 'rows_by_file': {}}
+
+    # Проход 1: раскладка строк всех файлов по корзинам ключа
+    writers = {}
+    try:
+        for path in paths:
+            reader = pv.open_csv(
+                path,
+                read_options=pv.ReadOptions(column_names=column_names(schema), skip_rows=1 if header else 0,
+                                            block_size=READ_BLOCK_BYTES),
+                parse_options=pv.ParseOptions(delimiter=delimiter, newlines_in_values=True),
+                convert_options=pv.ConvertOptions(
+                    column_types={field.name: field.type for field in types},
+                    strings_can_be_null=True,
+                ),
+            )
+            stats['rows_by_file'][path] = 0
+            for batch in reader:
+                stats['rows_in'] += batch.num_rows
+                stats['rows_by_file'][path] += batch.num_rows
+                if source_column:
+                    batch = pa.RecordBatch.from_arrays(
+                        batch.columns + [pa.array([os.path.basename(path)] * batch.num_rows, pa.string())],
+                        names=batch.schema.names + [source_column],
+                    )
+                ids = pa.array(_bucket_ids(batch, key_columns, bits), pa.int32())
+                order = pc.sort_indices(ids)
+                batch = batch.take(order)
+                counts = pc.value_counts(ids).to_pylist()
+                offset = 0
+                for entry in sorted(counts, key=lambda item: item['values']):
+                    bucket, count = entry['values'], entry['counts']
+                    if bucket not in writers:
+                        writers[bucket] = ipc.new_stream(
+                            os.path.join(spill_dir, f'{bucket:05d}.arrow'), batch.schema
+                        )
+                    writers[bucket].write_batch(batch.slice(offset, count))
+                    offset += count
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Проход 2: дедупликация внутри каждой корзины
+    files = []
+    write_options = pv.WriteOptions(include_header=False, delimiter=delimiter)
+    for bucket in sorted(writers):
+        spill_path = os.path.join(spill_dir, f'{bucket:05d}.arrow')
+        with ipc.open_stream(spill_path) as reader:
+            table = reader.read_all()
+        os.remove(spill_path)
+
+        unique = _first_per_key(table, key_columns, keep_latest_by)
+        stats['duplicates'] += table.num_rows - unique.num_rows
+        if quality is not None:
+            unique = quality.check_table(unique)
+        if warehouse_keys is not None:
+            unique, existing = warehouse_keys.filter_new(unique)
+            stats['existing'] += existing
+        if unique.num_rows == 0:
+            continue
+
+        path = os.path.join(output_dir, f'part-{bucket:05d}.csv')
+        pv.write_csv(unique, path, write_options=write_options)
+        files.append(path)
+        stats['rows_out'] += unique.num_rows
+    os.rmdir(spill_dir)
+
+    stats['files'] = files
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    print(f"Dedupe on {', '.join(key_columns)}: {stats['rows_in']} rows -> {stats['rows_out']} "
+          f"({stats['duplicates']} duplicates, {stats['existing']} already loaded) "
+          f"in {buckets} buckets, {stats['seconds']}s")
+    return stats
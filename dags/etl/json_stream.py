@@ -0,0 +1,194 @@
+"""Потоковое чтение JSON файлов вида ``[{...}, {...}, ...]``.
+
+Файл читается кусками фиксированного размера, элементы массива
+декодируются по одному (``JSONDecoder.raw_decode``), поэтому пиковое
+потребление памяти определяется размером куска и пачки, а не файла.
+"""
+import json
+import os
+import time
+
+from etl.config import DEFAULT_BATCH_SIZE
+from etl.sinks import batch_size, copy_batch, iter_column_batches
+from etl.stats import load_stats
+
+CHUNK_SIZE = 1024 * 1024
+
+# Предел размера одного элемента массива: защита от чтения битого файла целиком
+MAX_RECORD_SIZE = 64 * CHUNK_SIZE
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]'
+
+# Поля реестра индивидуальных предпринимателей (после разворачивания вложенных объектов)
+ENTREPRENEUR_FIELDS = [
+    'date_exec',
+    'code_form_ind_entrep',
+    'name_form_ind_entrep',
+    'inf_surname_ind_entrep_sex',
+    'citizenship_kind',
+    'inf_authority_reg_ind_entrep_name',
+    'inf_authority_reg_ind_entrep_code',
+    'inf_reg_tax_ind_entrep',
+    'inf_okved_code',
+    'inf_okved_name',
+    'process_dttm',
+    'error_code',
+    'inf_surname_ind_entrep_firstname',
+    'inf_surname_ind_entrep_surname',
+    'inf_surname_ind_entrep_midname',
+    'dob',
+    'date_ogrnip',
+    'id_card',
+    'innfl',
+    'ogrnip',
+    'inf_okved_opt',
+    'insured_pf',
+    'email_ind_entrep',
+    'insuref_fss',
+]
+
+# Всё, что не попало в известные поля, сохраняется в extra (JSON)
+ENTREPRENEUR_COLUMNS = ['source_file'] + ENTREPRENEUR_FIELDS + ['extra']
+
+
+class JSONArrayError(ValueError):
+    """Файл не является JSON массивом верхнего уровня"""
+
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    """Потоковый разбор JSON массива верхнего уровня из текстового файла"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        # Пропуск пробелов и разделителей между элементами
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            fill()
+
+        if pos >= len(buffer):
+            if started:
+                raise JSONArrayError('Неожиданный конец файла внутри массива')
+            return
+
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise JSONArrayError(f'Ожидался "[", получено {char!r}')
+            started = True
+            pos += 1
+            continue
+        if char == ']':
+            return
+        if char == ',':
+            pos += 1
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof or len(buffer) - pos > MAX_RECORD_SIZE:
+                raise
+            fill()
+            continue
+
+        # Число на границе куска могло быть обрезано ("1." вместо "1.5") —
+        # элемент считается полным, только если за ним следует разделитель
+        if end == len(buffer) or buffer[end] not in _DELIMITERS:
+            if not eof:
+                fill()
+                continue
+            if end < len(buffer):
+                raise JSONArrayError(f'Некорректный элемент массива в позиции {end}')
+
+        yield value
+        pos = end
+        if pos > chunk_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def flatten(record, prefix='', sep='_'):
+    """Разворачивание вложенных объектов в плоский словарь.
+
+    Ключи вложенных объектов склеиваются через ``sep``,
+    списки сериализуются в JSON строку.
+    """
+    flat = {}
+    for key, value in record.items():
+        name = f'{prefix}{sep}{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name, sep))
+        elif isinstance(value, list):
+            flat[name] = json.dumps(value, ensure_ascii=False)
+        else:
+            flat[name] = value
+    return flat
+
+
+def entrepreneur_row(record, source_file):
+    """Раскладка записи реестра по колонкам ENTREPRENEUR_COLUMNS"""
+    flat = flatten(record)
+    row = {field: flat.pop(field, None) for field in ENTREPRENEUR_FIELDS}
+    row['source_file'] = source_file
+    row['extra'] = json.dumps(flat, ensure_ascii=False) if flat else None
+    return row
+
+
+def iter_entrepreneur_batches(path, batch_size_limit=DEFAULT_BATCH_SIZE):
+    """Колоночные пачки записей реестра из одного JSON файла"""
+    source_file = os.path.basename(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        rows = (entrepreneur_row(record, source_file) for record in iter_json_array(f))
+        yield from iter_column_batches(rows, ENTREPRENEUR_COLUMNS, batch_size_limit)
+
+
+def load_json_array(path, conn, table, columns, batch_size_limit=DEFAULT_BATCH_SIZE, commit=True):
+    """Загрузка JSON массива плоских записей в таблицу через COPY.
+
+    ``commit=False`` — пачки не фиксируются: файл фиксирует вызывающий.
+    """
+    started = time.monotonic()
+    rows = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        records = (flatten(record) for record in iter_json_array(f))
+        for batch in iter_column_batches(records, columns, batch_size_limit):
+            rows += copy_batch(conn, table, columns, batch)
+            if commit:
+                conn.commit()
+    return load_stats(path, rows, started, label='JSON')
+
+
+def load_entrepreneur_json(path, conn, table='entrepreneurs', batch_size_limit=DEFAULT_BATCH_SIZE,
+                           quality=None, commit=True):
+    """Загрузка одного файла реестра предпринимателей в PostgreSQL.
+
+    ``quality`` (``etl.quality.QualityCheck``) отсекает некорректные строки.
+    ``commit=False`` — пачки не фиксируются (замена файла одной транзакцией,
+    ``etl.manifest.replace_file``).
+    """
+    started = time.monotonic()
+    rows = 0
+    for batch in iter_entrepreneur_batches(path, batch_size_limit):
+        if quality is not None:
+            batch = quality.check_batch(batch)
+        copy_batch(conn, table, ENTREPRENEUR_COLUMNS, batch)
+        if commit:
+            conn.commit()
+        rows += batch_size(batch)
+    return load_stats(path, rows, started, label='JSON')
@@ -0,0 +1,118 @@
+"""Пакетная отправка сообщений в Kafka через librdkafka (confluent-kafka).
+
+Сообщения буферизуются продюсером и отправляются пачками (``batch.size``,
+``linger.ms``) со сжатием; подтверждения доставки приходят асинхронно
+через колбэки. Один процесс заменяет цикл из ``kafka-console-producer``.
+"""
+import json
+import time
+
+from etl.config import KAFKA_BOOTSTRAP_SERVERS
+
+# Настройки продюсера по умолчанию, рассчитанные на пропускную способность
+DEFAULT_PRODUCER_CONFIG = {
+    'linger.ms': 20,
+    'batch.size': 1024 * 1024,
+    'batch.num.messages': 100000,
+    'compression.type': 'lz4',
+    'queue.buffering.max.messages': 1000000,
+    'queue.buffering.max.kbytes': 1024 * 1024,
+    'acks': 1,
+}
+
+# Как часто обслуживать очередь колбэков доставки
+POLL_EVERY = 10000
+
+
+def serialize(value):
+    """Сериализация значения сообщения: dict/list -> JSON, str -> UTF-8"""
+    if value is None or isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def message_key(record, key):
+    """Ключ сообщения: None, имя поля записи или функция от записи"""
+    if key is None:
+        return None
+    value = key(record) if callable(key) else record.get(key) if isinstance(record, dict) else None
+    return None if value is None else serialize(str(value))
+
+
+def iter_file_messages(path):
+    """Сообщения из файла: JSON массив или по одному сообщению на строку"""
+    if path.endswith('.json'):
+        from etl.json_stream import iter_json_array
+
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from iter_json_array(f)
+        return
+
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.rstrip(b'\r\n')
+            if line:
+                yield line
+
+
+def produce_messages(topic, messages, key=None, bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+                     producer_config=None, on_delivery=None, flush_timeout=60):
+    """Отправка потока сообщений в топик.
+
+    ``messages`` — любой итерируемый источник (генератор, список, файл).
+    ``key`` — имя поля записи или функция, вычисляющая ключ партиционирования.
+    ``on_delivery(err, msg)`` вызывается дополнительно для каждого подтверждения.
+    Возвращает статистику отправки с достигнутой пропускной способностью.
+    """
+    from confluent_kafka import Producer
+
+    config = dict(DEFAULT_PRODUCER_CONFIG)
+    config.update(producer_config or {})
+    config['bootstrap.servers'] = bootstrap_servers
+    producer = Producer(config)
+
+    stats = {'topic': topic, 'sent': 0, 'delivered': 0, 'failed': 0, 'bytes': 0}
+
+    def delivery_report(err, msg):
+        if err is None:
+            stats['delivered'] += 1
+        else:
+            stats['failed'] += 1
+        if on_delivery is not None:
+            on_delivery(err, msg)
+
+    started = time.monotonic()
+    for record in messages:
+        value = serialize(record)
+        record_key = message_key(record, key)
+        while True:
+            try:
+                producer.produce(topic, value=value, key=record_key, on_delivery=delivery_report)
+                break
+            except BufferError:
+                # Локальная очередь заполнена — ждём подтверждений
+                producer.poll(0.1)
+
+        stats['sent'] += 1
+        stats['bytes'] += len(value) if value else 0
+        if stats['sent'] % POLL_EVERY == 0:
+            producer.poll(0)
+
+    remaining = producer.flush(flush_timeout)
+    elapsed = max(time.monotonic() - started, 1e-9)
+
+    stats['undelivered'] = remaining
+    stats['seconds'] = round(elapsed, 3)
+    stats['msgs_per_sec'] = round(stats['sent'] / elapsed, 1)
+    stats['mb_per_sec'] = round(stats['bytes'] / elapsed / 1024 / 1024, 2)
+    print(f"Kafka {topic}: {stats['sent']} messages in {stats['seconds']}s, "
+          f"{stats['msgs_per_sec']} msgs/s, {stats['mb_per_sec']} MB/s, "
+          f"failed={stats['failed']}, undelivered={remaining}")
+
+    if stats['failed'] or remaining:
+        raise RuntimeError(
+            f"Kafka {topic}: {stats['failed']} failed, {remaining} undelivered messages"
+        )
+    return stats
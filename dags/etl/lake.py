@@ -0,0 +1,222 @@
+"""Слой Parquet файлов (lake) и его компакция.
+
+Наборы лежат в ``LAKE_DIR/<имя>`` с hive-разбиением (``колонка=значение``).
+Streaming запросы Spark пишут в ``LAKE_DIR/_landing/<имя>`` (file sink с
+журналом ``_spark_metadata``); компакция копирует зафиксированные там
+файлы в основной набор, объединяя мелкие файлы в файлы целевого размера.
+Файлы landing принадлежат Spark: компакция их не удаляет, а отмечает
+перенесённые в ``LANDING_MOVED_FILE`` набора, и удаляет их Spark job
+(``etl.spark_jobs.common.remove_moved_landing_files``).
+"""
+import json
+import os
+import time
+import uuid
+from urllib.parse import unquote, urlparse
+
+from etl.config import LAKE_DIR
+from etl.spark_jobs.common import LANDING_MOVED_FILE
+
+LANDING_DIR = os.path.join(LAKE_DIR, '_landing')
+
+TARGET_FILE_BYTES = 128 * 1024 * 1024
+
+# Файл меньше этой доли целевого размера считается мелким
+SMALL_FILE_RATIO = 0.5
+
+
+def lake_path(name):
+    return os.path.join(LAKE_DIR, name)
+
+
+def landing_path(name):
+    return os.path.join(LANDING_DIR, name)
+
+
+def _is_hidden(name):
+    return name.startswith(('_', '.'))
+
+
+def _sink_committed_files(root):
+    """Файлы, зафиксированные в журнале streaming file sink'а.
+
+    Журнал — файлы ``_spark_metadata/<batch>[.compact]``: строка версии и
+    по JSON объекту на файл. Незафиксированные файлы (упавшие задачи)
+    в журнал не попадают и компакцией не трогаются.
+    """
+    metadata_dir = os.path.join(root, '_spark_metadata')
+    committed = set()
+    for name in os.listdir(metadata_dir):
+        if _is_hidden(name) or name.endswith('.tmp'):
+            continue
+        with open(os.path.join(metadata_dir, name), 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line.startswith('{'):
+                    continue
+                entry = json.loads(line)
+                if entry.get('action', 'add') == 'add' and not entry.get('isDir'):
+                    committed.add(unquote(urlparse(entry['path']).path))
+    return committed
+
+
+def list_partition_files(root):
+    """Файлы набора по партициям: ``{относительный каталог партиции: [пути]}``"""
+    committed = None
+    if os.path.isdir(os.path.join(root, '_spark_metadata')):
+        committed = _sink_committed_files(root)
+
+    partitions = {}
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not _is_hidden(name)]
+        files = [
+            os.path.join(directory, name) for name in sorted(filenames)
+            if name.endswith('.parquet') and not _is_hidden(name)
+        ]
+        if committed is not None:
+            files = [path for path in files if path in committed]
+        if files:
+            partitions[os.path.relpath(directory, root)] = files
+    return partitions
+
+
+def _conform(batch, schema):
+    """Пачка в схеме ``schema``: недостающие колонки — NULL, типы приводятся"""
+    import pyarrow as pa
+
+    arrays = [
+        batch.column(field.name).cast(field.type) if field.name in batch.schema.names
+        else pa.nulls(batch.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write_compacted(files, output_dir, target_file_bytes, compression):
+    """Объединение файлов в файлы ~``target_file_bytes``; возвращает пути новых файлов.
+
+    Данные идут пачками: в памяти одна пачка, а не вся партиция.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sources = [pq.ParquetFile(path) for path in files]
+    schema = pa.unify_schemas([source.schema_arrow for source in sources], promote_options='default')
+    total_rows = sum(source.metadata.num_rows for source in sources)
+    input_bytes = sum(os.path.getsize(path) for path in files)
+    parts = max(1, -(-input_bytes // target_file_bytes))
+    rows_per_file = max(1, -(-total_rows // parts))
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    writer = None
+    rows_in_file = 0
+
+    def open_next():
+        path = os.path.join(output_dir, f'part-{uuid.uuid4().hex}.parquet')
+        tmp_path = os.path.join(output_dir, f'.{os.path.basename(path)}.tmp')
+        written.append((tmp_path, path))
+        return pq.ParquetWriter(tmp_path, schema, compression=compression)
+
+    try:
+        writer = open_next()
+        for source in sources:
+            for batch in source.iter_batches():
+                batch = _conform(batch, schema)
+                while batch.num_rows:
+                    if rows_in_file == rows_per_file:
+                        writer.close()
+                        writer = open_next()
+                        rows_in_file = 0
+                    take = min(batch.num_rows, rows_per_file - rows_in_file)
+                    writer.write_batch(batch.slice(0, take))
+                    rows_in_file += take
+                    batch = batch.slice(take)
+        writer.close()
+    except Exception:
+        if writer is not None:
+            writer.close()
+        for tmp_path, _ in written:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+    for tmp_path, path in written:
+        os.replace(tmp_path, path)
+    return [path for _, path in written]
+
+
+def _read_moved(target_root, root):
+    """Перенесённые файлы landing (пути относительно ``root``), которые ещё не удалены"""
+    try:
+        with open(os.path.join(target_root, LANDING_MOVED_FILE)) as f:
+            moved = json.load(f)['files']
+    except (OSError, ValueError, KeyError):
+        return set()
+    return {path for path in moved if os.path.exists(os.path.join(root, path))}
+
+
+def _write_moved(target_root, moved):
+    path = os.path.join(target_root, LANDING_MOVED_FILE)
+    os.makedirs(target_root, exist_ok=True)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({'updated_at': time.time(), 'files': sorted(moved)}, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def compact_dataset(root, target_root=None, target_file_bytes=TARGET_FILE_BYTES, compression='zstd'):
+    """Компакция набора Parquet по партициям.
+
+    Без ``target_root`` — на месте: в партиции объединяются мелкие файлы,
+    если их хотя бы два; исходные файлы удаляются после атомарной записи
+    новых. С ``target_root`` (landing -> lake) копируются зафиксированные
+    файлы, которых ещё нет в списке перенесённых; сами файлы landing не
+    трогаются (их удаляет владелец, Spark job). Возвращает статистику компакции.
+    """
+    started = time.time()
+    stats = {'dataset': root, 'partitions': 0, 'files_in': 0, 'files_out': 0, 'bytes_in': 0}
+    if not os.path.isdir(root):
+        print(f"Lake dataset {root} does not exist, nothing to compact")
+        return stats
+
+    small_limit = target_file_bytes * SMALL_FILE_RATIO
+    moved = _read_moved(target_root, root) if target_root is not None else None
+    for partition, files in list_partition_files(root).items():
+        if target_root is None:
+            files = [path for path in files if os.path.getsize(path) < small_limit]
+            if len(files) < 2:
+                continue
+            output_dir = os.path.join(root, partition)
+        else:
+            files = [path for path in files if os.path.relpath(path, root) not in moved]
+            if not files:
+                continue
+            output_dir = os.path.normpath(os.path.join(target_root, partition))
+
+        stats['bytes_in'] += sum(os.path.getsize(path) for path in files)
+        written = _write_compacted(files, output_dir, target_file_bytes, compression)
+        if target_root is None:
+            for path in files:
+                os.remove(path)
+        else:
+            # Отметка сразу после записи партиции: повторный запуск не скопирует файлы снова
+            moved.update(os.path.relpath(path, root) for path in files)
+            _write_moved(target_root, moved)
+
+        stats['partitions'] += 1
+        stats['files_in'] += len(files)
+        stats['files_out'] += len(written)
+
+    stats['seconds'] = round(time.time() - started, 3)
+    print(f"Compacted {root}: {stats['files_in']} files -> {stats['files_out']} "
+          f"in {stats['partitions']} partitions, {stats['seconds']}s")
+    return stats
+
+
+def compact_lake(names, target_file_bytes=TARGET_FILE_BYTES):
+    """Перенос landing -> lake и компакция мелких файлов для наборов ``names``"""
+    results = []
+    for name in names:
+        if os.path.isdir(landing_path(name)):
+            results.append(compact_dataset(landing_path(name), lake_path(name), target_file_bytes))
+        results.append(compact_dataset(lake_path(name), target_file_bytes=target_file_bytes))
+    return results
@@ -0,0 +1,136 @@
+"""Манифест загрузки исходных файлов: инкрементальная загрузка без повторного чтения.
+
+Для каждого загруженного файла набора в ``etl_ingestion_manifest``
+хранятся путь, размер, mtime, SHA-1 содержимого и число строк. План
+загрузки сравнивает файлы с манифестом:
+
+- размер и mtime совпали — файл не читается и пропускается;
+- размер или mtime изменились — считается хэш содержимого; тот же хэш
+  (файл перезаписан без изменений) обновляет только метаданные;
+- новый файл или другое содержимое — файл загружается.
+
+Изменённый файл заменяется атомарно: удаление его строк (по
+``source_file``), загрузка и запись в манифест идут одной транзакцией.
+"""
+import hashlib
+import os
+import time
+
+MANIFEST_TABLE = 'etl_ingestion_manifest'
+HASH_BLOCK_BYTES = 16 * 1024 * 1024
+
+MANIFEST_SQL = f"""
+CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+    dataset VARCHAR(100) NOT NULL,
+    path TEXT NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    mtime_ns BIGINT NOT NULL,
+    content_sha1 CHAR(40) NOT NULL,
+    row_count BIGINT,
+    loaded_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    checked_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (dataset, path)
+);
+"""
+
+
+def content_hash(path, block_bytes=HASH_BLOCK_BYTES):
+    """SHA-1 всего содержимого файла (чтение блоками)"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_bytes), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def plan_files(conn, dataset, paths):
+    """Файлы набора, которые нужно загрузить, по сравнению с манифестом.
+
+    Возвращает ``load`` — записи ``{path, size_bytes, mtime_ns,
+    content_sha1, change}`` (``change``: new/changed), ``unchanged`` —
+    число пропущенных файлов, ``missing`` — пути из манифеста, которых
+    больше нет (данные не удаляются).
+    """
+    started = time.monotonic()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT path, size_bytes, mtime_ns, content_sha1 FROM {MANIFEST_TABLE} WHERE dataset = %s",
+            (dataset,),
+        )
+        known = {path: (size, mtime_ns, sha1) for path, size, mtime_ns, sha1 in cursor.fetchall()}
+
+        plan = {'dataset': dataset, 'load': [], 'unchanged': 0, 'rehashed': 0, 'missing': []}
+        for path in paths:
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            entry = {'path': path, 'size_bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            previous = known.get(path)
+            if previous is not None and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+                plan['unchanged'] += 1
+                continue
+
+            entry['content_sha1'] = content_hash(path)
+            plan['rehashed'] += 1
+            if previous is not None and previous[2] == entry['content_sha1']:
+                # Содержимое то же (файл перезаписан): обновляются только метаданные
+                cursor.execute(
+                    f"UPDATE {MANIFEST_TABLE} SET size_bytes = %s, mtime_ns = %s, checked_at = CURRENT_TIMESTAMP "
+                    f"WHERE dataset = %s AND path = %s",
+                    (entry['size_bytes'], entry['mtime_ns'], dataset, path),
+                )
+                plan['unchanged'] += 1
+                continue
+            entry['change'] = 'new' if previous is None else 'changed'
+            plan['load'].append(entry)
+
+        current = {os.path.abspath(path) for path in paths}
+        plan['missing'] = sorted(path for path in known if path not in current)
+    conn.commit()
+
+    plan['seconds'] = round(time.monotonic() - started, 3)
+    changed = sum(1 for entry in plan['load'] if entry['change'] == 'changed')
+    print(f"Manifest {dataset}: {len(plan['load']) - changed} new, {changed} changed, "
+          f"{plan['unchanged']} unchanged, {len(plan['missing'])} missing; "
+          f"{plan['rehashed']} files hashed in {plan['seconds']}s")
+    return plan
+
+
+def record_file(cursor, dataset, entry, rows):
+    """Запись файла в манифест (в транзакции вызывающего)"""
+    cursor.execute(
+        f"""
+        INSERT INTO {MANIFEST_TABLE} (dataset, path, size_bytes, mtime_ns, content_sha1, row_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (dataset, path) DO UPDATE SET
+            size_bytes = EXCLUDED.size_bytes,
+            mtime_ns = EXCLUDED.mtime_ns,
+            content_sha1 = EXCLUDED.content_sha1,
+            row_count = EXCLUDED.row_count,
+            loaded_at = CURRENT_TIMESTAMP,
+            checked_at = CURRENT_TIMESTAMP
+        """,
+        (dataset, entry['path'], entry['size_bytes'], entry['mtime_ns'], entry['content_sha1'], rows),
+    )
+
+
+def replace_file(conn, dataset, table, entry, load):
+    """Атомарная замена строк файла в ``table`` и запись в манифест.
+
+    ``load(conn)`` загружает файл без фиксации пачек и возвращает
+    статистику с ``rows``. При ошибке транзакция откатывается: в таблице
+    остаётся прежняя версия файла, манифест не меняется.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE source_file = %s", (os.path.basename(entry['path']),))
+            deleted = cursor.rowcount
+        stats = load(conn)
+        with conn.cursor() as cursor:
+            record_file(cursor, dataset, entry, stats['rows'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if deleted:
+        print(f"Replaced {deleted} rows of {os.path.basename(entry['path'])} in {table}")
+    return {**stats, 'change': entry['change'], 'replaced_rows': deleted}
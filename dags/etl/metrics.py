@@ -0,0 +1,73 @@
+"""Метрики задач Airflow в Pushgateway: длительность, строки и байты.
+
+``push_task_metrics`` подключается как ``on_success_callback`` DAG'а.
+Строки и байты берутся из результата задачи (XCom): суммируются
+сводки по файлам загрузчиков (``etl.stats.load_stats``,
+``load_csv_parallel``) и статистика отправки в Kafka (``produce_messages``).
+"""
+from etl.config import PUSHGATEWAY_URL
+from etl.spark_jobs.metrics import push_metrics
+
+
+def result_totals(result):
+    """Строки и байты по результату задачи (None, если в нём нет сводок)"""
+    totals = {'rows': 0, 'bytes': 0}
+    found = False
+
+    def visit(value):
+        nonlocal found
+        if isinstance(value, dict):
+            if 'file' in value and 'rows' in value:
+                totals['rows'] += value['rows']
+                totals['bytes'] += value.get('bytes', 0)
+                found = True
+            elif 'topic' in value and 'sent' in value:
+                totals['rows'] += value['sent']
+                totals['bytes'] += value.get('bytes', 0)
+                found = True
+            else:
+                for item in value.values():
+                    visit(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                visit(item)
+
+    visit(result)
+    return totals if found else None
+
+
+def task_samples(duration, totals):
+    samples = [('etl_task_duration_seconds', 'gauge', 'Wall time of the last successful task run', {}, duration)]
+    if totals is not None:
+        samples += [
+            ('etl_task_rows', 'gauge', 'Rows processed by the last successful task run', {}, totals['rows']),
+            ('etl_task_bytes', 'gauge', 'Source bytes processed by the last successful task run', {},
+             totals['bytes']),
+        ]
+        if duration:
+            samples += [
+                ('etl_task_rows_per_second', 'gauge', 'Rows per second of the last successful task run', {},
+                 totals['rows'] / duration),
+                ('etl_task_bytes_per_second', 'gauge', 'Bytes per second of the last successful task run', {},
+                 totals['bytes'] / duration),
+            ]
+    return samples
+
+
+def push_task_metrics(context):
+    """``on_success_callback``: метрики задачи в группу ``etl_airflow/dag/<dag>/task/<task>``.
+
+    У экземпляров mapped задачи своя группа ``.../map_index/<i>`` и свой
+    XCom, иначе они перезаписывают метрики друг друга.
+    """
+    from airflow.utils import timezone
+
+    ti = context['ti']
+    duration = ti.duration
+    if duration is None and ti.start_date is not None:
+        duration = (timezone.utcnow() - ti.start_date).total_seconds()
+    grouping = {'dag': ti.dag_id, 'task': ti.task_id}
+    if ti.map_index >= 0:
+        grouping['map_index'] = str(ti.map_index)
+    totals = result_totals(ti.xcom_pull(task_ids=ti.task_id, map_indexes=ti.map_index))
+    push_metrics('etl_airflow', task_samples(duration, totals), grouping, PUSHGATEWAY_URL)
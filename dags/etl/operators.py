@@ -0,0 +1,91 @@
+"""Airflow операторы поверх компонентов пакета etl"""
+from airflow.models import BaseOperator
+
+
+class KafkaProduceOperator(BaseOperator):
+    """Пакетная отправка сообщений в топик Kafka.
+
+    Источник сообщений — ``messages_callable`` (функция, возвращающая
+    итерируемое, например генератор) или ``source_path`` (JSON массив или
+    файл с сообщением на строку). Статистика отправки уходит в XCom.
+    """
+
+    template_fields = ('topic', 'source_path')
+
+    def __init__(self, *, topic, messages_callable=None, messages_kwargs=None, source_path=None,
+                 key=None, bootstrap_servers=None, producer_config=None, **kwargs):
+        super().__init__(**kwargs)
+        if (messages_callable is None) == (source_path is None):
+            raise ValueError('Нужно указать ровно один источник: messages_callable или source_path')
+        self.topic = topic
+        self.messages_callable = messages_callable
+        self.messages_kwargs = messages_kwargs or {}
+        self.source_path = source_path
+        self.key = key
+        self.bootstrap_servers = bootstrap_servers
+        self.producer_config = producer_config
+
+    def execute(self, context):
+        from etl.config import KAFKA_BOOTSTRAP_SERVERS
+        from etl.kafka_producer import iter_file_messages, produce_messages
+
+        if self.source_path is not None:
+            messages = iter_file_messages(self.source_path)
+        else:
+            messages = self.messages_callable(**self.messages_kwargs)
+
+        return produce_messages(
+            self.topic,
+            messages,
+            key=self.key,
+            bootstrap_servers=self.bootstrap_servers or KAFKA_BOOTSTRAP_SERVERS,
+            producer_config=self.producer_config,
+        )
+
+
+class InferSchemaOperator(BaseOperator):
+    """Вывод схемы по выборке и публикация её для Spark job'ов.
+
+    Источник — топик Kafka (``topic``) или набор файлов (``paths`` —
+    glob-шаблон или список путей и ``fmt``). Схема записывается в
+    ``<SCHEMA_DIR>/<name>.json``; путь к файлу уходит в XCom.
+    """
+
+    template_fields = ('name', 'topic', 'paths')
+
+    def __init__(self, *, name, topic=None, paths=None, fmt=None, hints=None, sample_size=None,
+                 infer_kwargs=None, **kwargs):
+        super().__init__(**kwargs)
+        if (topic is None) == (paths is None):
+            raise ValueError('Нужно указать ровно один источник: topic или paths')
+        if paths is not None and fmt is None:
+            raise ValueError('Для файлов нужно указать формат fmt')
+        self.name = name
+        self.topic = topic
+        self.paths = paths
+        self.fmt = fmt
+        self.hints = hints
+        self.sample_size = sample_size
+        self.infer_kwargs = infer_kwargs or {}
+
+    def execute(self, context):
+        import glob
+
+        from etl.schema_inference import (
+            DEFAULT_SAMPLE_SIZE,
+            infer_file_schema,
+            infer_topic_schema,
+            publish_schema,
+        )
+
+        sample_size = self.sample_size or DEFAULT_SAMPLE_SIZE
+        if self.topic is not None:
+            schema = infer_topic_schema(self.topic, hints=self.hints, sample_size=sample_size)
+        else:
+            paths = sorted(glob.glob(self.paths)) if isinstance(self.paths, str) else list(self.paths)
+            if not paths:
+                self.log.info('No files match %s, schema %s is not updated', self.paths, self.name)
+                return None
+            schema = infer_file_schema(paths, self.fmt, hints=self.hints, sample_size=sample_size,
+                                       **self.infer_kwargs)
+        return publish_schema(self.name, schema)
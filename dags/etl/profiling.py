@@ -0,0 +1,291 @@
+"""Профили колонок полных наборов за один потоковый проход по каждому файлу.
+
+Для колонки собираются: число строк и пустых значений, HyperLogLog
+(различные значения), count-min (частые значения), гистограмма длин
+(корзины по степеням двойки), точная максимальная длина и объём текста
+в байтах, для чисел — признак целочисленности, для чисел и дат — t-digest
+(квантили). Этого достаточно для подбора типов (``etl.ddl``).
+Пачка сначала сворачивается ``value_counts``, поэтому сводки обновляются
+один раз на различное значение пачки, а не на строку.
+
+Профиль файла сохраняется в ``PROFILE_DIR/<набор>/`` под ключом отпечатка
+файла (``etl.schema_inference.file_fingerprint``): при добавлении файла
+профилируется только он, а отчёт по набору собирается объединением
+сохранённых сводок без чтения данных.
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+
+from etl.config import PROFILE_DIR
+from etl.sketches import CountMinSketch, HyperLogLog, TDigest, value_hash
+
+REPORT_QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+# Входит в ключ сохранённого профиля: профили старого формата пересобираются
+PROFILE_VERSION = 2
+
+
+def _length_bucket(length):
+    """Нижняя граница корзины длины: 0, 1, 2, 4, 8, ..."""
+    return 0 if length == 0 else 1 << (length.bit_length() - 1)
+
+
+class ColumnProfile:
+    def __init__(self, kind, rows=0, nulls=0, lengths=None, hll=None, cms=None, digest=None,
+                 max_length=0, bytes_sum=0, integral=True):
+        self.kind = kind
+        self.rows = rows
+        self.nulls = nulls
+        self.lengths = {int(bucket): count for bucket, count in (lengths or {}).items()}
+        # Точная максимальная длина (символы), суммарный объём (байты UTF-8), все числа целые
+        self.max_length = max_length
+        self.bytes_sum = bytes_sum
+        self.integral = integral
+        self.hll = hll or HyperLogLog()
+        self.cms = cms or CountMinSketch()
+        self.digest = digest if digest is not None else (TDigest() if kind != 'text' else None)
+
+    def update(self, values):
+        """Обновление по колонке пачки (массив Arrow)"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        self.rows += len(values)
+        self.nulls += values.null_count
+        present = values.drop_null()
+        if len(present) == 0:
+            return
+        if pa.types.is_date(present.type):
+            present = present.cast(pa.timestamp('s'))
+
+        counts = pc.value_counts(present)
+        for value, count in zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()):
+            text = str(value)
+            h = value_hash(text)
+            self.hll.add_hash(h)
+            self.cms.add_hash(h, text, count)
+            if self.digest is not None:
+                self.digest.add(value.timestamp() if self.kind == 'timestamp' else float(value), count)
+
+        if self.kind == 'numeric' and self.integral and pa.types.is_floating(present.type):
+            self.integral = pc.all(pc.equal(pc.floor(present), present)).as_py()
+
+        if self.kind == 'text':
+            text_values = present if pa.types.is_string(present.type) else present.cast(pa.string())
+            char_lengths = pc.utf8_length(text_values)
+            self.max_length = max(self.max_length, pc.max(char_lengths).as_py())
+            self.bytes_sum += pc.sum(pc.binary_length(text_values)).as_py()
+            lengths = pc.value_counts(char_lengths)
+            for length, count in zip(lengths.field('values').to_pylist(), lengths.field('counts').to_pylist()):
+                bucket = _length_bucket(length)
+                self.lengths[bucket] = self.lengths.get(bucket, 0) + count
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self.max_length = max(self.max_length, other.max_length)
+        self.bytes_sum += other.bytes_sum
+        self.integral = self.integral and other.integral
+        for bucket, count in other.lengths.items():
+            self.lengths[bucket] = self.lengths.get(bucket, 0) + count
+        self.hll.merge(other.hll)
+        self.cms.merge(other.cms)
+        if self.digest is not None and other.digest is not None:
+            self.digest.merge(other.digest)
+        return self
+
+    def report(self):
+        report = {
+            'kind': self.kind,
+            'rows': self.rows,
+            'nulls': self.nulls,
+            'null_rate': round(self.nulls / self.rows, 6) if self.rows else 0.0,
+            'distinct': self.hll.estimate() if self.rows > self.nulls else 0,
+            'top': self.cms.top_values(),
+        }
+        if self.lengths:
+            report['length_histogram'] = dict(sorted(self.lengths.items()))
+            report['max_length'] = self.max_length
+            report['avg_bytes'] = round(self.bytes_sum / (self.rows - self.nulls), 2) if self.rows > self.nulls else 0
+        if self.kind == 'numeric':
+            report['integral'] = self.integral
+        if self.digest is not None and self.digest.count:
+            quantiles = {'min': self.digest.minimum, 'max': self.digest.maximum}
+            quantiles.update({f'p{round(q * 100)}': self.digest.quantile(q) for q in REPORT_QUANTILES})
+            if self.kind == 'timestamp':
+                import datetime
+
+                quantiles = {
+                    key: datetime.datetime.fromtimestamp(value, datetime.timezone.utc).isoformat()
+                    for key, value in quantiles.items()
+                }
+            report['quantiles'] = quantiles
+        return report
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'rows': self.rows,
+            'nulls': self.nulls,
+            'lengths': self.lengths,
+            'max_length': self.max_length,
+            'bytes_sum': self.bytes_sum,
+            'integral': self.integral,
+            'hll': self.hll.to_dict(),
+            'cms': self.cms.to_dict(),
+            'digest': self.digest.to_dict() if self.digest is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['kind'], data['rows'], data['nulls'], data['lengths'],
+            HyperLogLog.from_dict(data['hll']),
+            CountMinSketch.from_dict(data['cms']),
+            TDigest.from_dict(data['digest']) if data['digest'] is not None else None,
+            data['max_length'], data['bytes_sum'], data['integral'],
+        )
+
+
+def column_kind(arrow_type):
+    import pyarrow as pa
+
+    if pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+        return 'numeric'
+    if pa.types.is_timestamp(arrow_type) or pa.types.is_date(arrow_type):
+        return 'timestamp'
+    return 'text'
+
+
+def _iter_tables(path, fmt):
+    """Таблицы Arrow по пачкам файла набора (CSV — по схеме, JSON/XML — текстом)"""
+    import pyarrow as pa
+
+    if fmt == 'csv':
+        import pyarrow.csv as pv
+
+        from etl.schemas import MUSEUM_TICKET_SCHEMA, arrow_schema, column_names
+
+        types = arrow_schema(MUSEUM_TICKET_SCHEMA)
+        reader = pv.open_csv(
+            path,
+            read_options=pv.ReadOptions(column_names=column_names(MUSEUM_TICKET_SCHEMA), skip_rows=1,
+                                        block_size=16 * 1024 * 1024),
+            parse_options=pv.ParseOptions(delimiter=';', newlines_in_values=True),
+            convert_options=pv.ConvertOptions(column_types={field.name: field.type for field in types},
+                                              strings_can_be_null=True),
+        )
+        for batch in reader:
+            yield pa.Table.from_batches([batch])
+        return
+
+    from etl.quality import text_array
+
+    if fmt == 'json':
+        from etl.json_stream import iter_entrepreneur_batches as iter_batches
+    elif fmt == 'xml':
+        from etl.xml_stream import iter_cadastral_batches as iter_batches
+    else:
+        raise ValueError(f'Неизвестный формат {fmt!r}')
+    for batch in iter_batches(path):
+        yield pa.table({column: text_array(values) for column, values in batch.items() if column != 'source_file'})
+
+
+def profile_file(path, fmt):
+    """Профили всех колонок файла за один проход"""
+    started = time.monotonic()
+    columns = {}
+    for table in _iter_tables(path, fmt):
+        for name in table.column_names:
+            if name not in columns:
+                columns[name] = ColumnProfile(column_kind(table.schema.field(name).type))
+            for chunk in table[name].chunks:
+                columns[name].update(chunk)
+    rows = max((profile.rows for profile in columns.values()), default=0)
+    seconds = time.monotonic() - started
+    print(f"Profiled {os.path.basename(path)}: {rows} rows, {len(columns)} columns in {seconds:.1f}s")
+    return columns
+
+
+def _profile_path(dataset, fingerprint, profile_dir):
+    key = hashlib.sha1(
+        json.dumps({'version': PROFILE_VERSION, 'file': fingerprint}, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    return os.path.join(profile_dir, dataset, f'{key}.json')
+
+
+def _profile_task(task):
+    """Профиль одного файла в рабочем процессе; сохраняется на диск"""
+    dataset, path, fmt, fingerprint, profile_dir = task
+    columns = profile_file(path, fmt)
+    target = _profile_path(dataset, fingerprint, profile_dir)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(f'{target}.tmp', 'w') as f:
+        json.dump({'file': fingerprint, 'profiled_at': time.time(),
+                   'columns': {name: profile.to_dict() for name, profile in columns.items()}}, f)
+    os.replace(f'{target}.tmp', target)
+    return path
+
+
+def profile_dataset(dataset, paths, fmt, profile_dir=PROFILE_DIR, workers=None):
+    """Профилирование новых и изменённых файлов набора (по процессу на файл).
+
+    Профили файлов, которых больше нет в ``paths``, удаляются. Возвращает
+    пути файлов, профилированных в этом запуске.
+    """
+    import multiprocessing
+
+    from etl.schema_inference import file_fingerprint
+
+    expected = {}
+    tasks = []
+    for path in paths:
+        fingerprint = file_fingerprint(path)
+        target = _profile_path(dataset, fingerprint, profile_dir)
+        expected[target] = path
+        if not os.path.exists(target):
+            tasks.append((dataset, path, fmt, fingerprint, profile_dir))
+
+    for stale in glob.glob(os.path.join(profile_dir, dataset, '*.json')):
+        if stale not in expected:
+            os.remove(stale)
+
+    if not tasks:
+        print(f"Profiles of {dataset} are up to date ({len(paths)} files)")
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    with multiprocessing.Pool(workers) as pool:
+        profiled = list(pool.imap_unordered(_profile_task, tasks))
+    print(f"Profiled {len(profiled)} of {len(paths)} {dataset} files on {workers} workers")
+    return profiled
+
+
+def profile_report(dataset, profile_dir=PROFILE_DIR):
+    """Отчёт по набору: объединение сохранённых профилей файлов без чтения данных"""
+    started = time.monotonic()
+    columns = {}
+    files = sorted(glob.glob(os.path.join(profile_dir, dataset, '*.json')))
+    for path in files:
+        with open(path) as f:
+            stored = json.load(f)
+        for name, data in stored['columns'].items():
+            profile = ColumnProfile.from_dict(data)
+            if name in columns:
+                columns[name].merge(profile)
+            else:
+                columns[name] = profile
+
+    report = {
+        'dataset': dataset,
+        'files': len(files),
+        'rows': max((profile.rows for profile in columns.values()), default=0),
+        'columns': {name: profile.report() for name, profile in columns.items()},
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    print(f"Profile {dataset}: {report['rows']} rows in {report['files']} files, merged in {report['seconds']}s")
+    for name, column in report['columns'].items():
+        print(f"  {name}: distinct~{column['distinct']}, null_rate={column['null_rate']}")
+    return report
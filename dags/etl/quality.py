@@ -0,0 +1,290 @@
+"""Правила качества данных и их векторная проверка (pyarrow.compute).
+
+Правило — кортеж ``(имя, колонка, проверка, параметр[, строгость])``, по
+аналогии со схемами в ``etl.schemas``. Набор правил компилируется в функции над
+колонками Arrow, возвращающие маску «значение корректно»; все правила
+проверяются за один проход по пачке, которую загрузчик уже держит в
+памяти, поэтому проверка не требует повторного чтения источника.
+Пустые значения проходят проверки формата — обязательность задаётся
+отдельным правилом ``not_null``.
+
+Строки, нарушившие хотя бы одно правило строгости ``error`` (по умолчанию),
+не загружаются и пишутся в карантин (Parquet) с перечнем нарушенных правил.
+Нарушения правил ``warn`` только считаются: строка загружается.
+"""
+import json
+import os
+import time
+import uuid
+
+from etl.config import METRICS_DIR, QUARANTINE_DIR
+
+# Дата: ISO (2025-01-31) или через точки (31.01.2025)
+DATE_PATTERN = r'^(\d{4}-\d{2}-\d{2}|\d{2}\.\d{2}\.\d{4})$'
+NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+# Кадастровый номер: округ:район:квартал:объект (XX:XX:XXXXXXX:XXX)
+CADASTRAL_NUMBER_PATTERN = r'^\d{2}:\d{2}:\d{6,7}:\d+$'
+CADASTRAL_QUARTER_PATTERN = r'^\d{2}:\d{2}:\d{6,7}$'
+
+MUSEUM_TICKET_RULES = [
+    ('ticket_id_present', 'ticket_id', 'not_null', None),
+    ('ticket_price_not_negative', 'ticket_price', 'greater_equal', 0),
+    # Бесплатные билеты допустимы — их доля только отслеживается
+    ('ticket_price_paid', 'ticket_price', 'greater', 0, 'warn'),
+    ('client_phone_format', 'client_phone', 'regex', r'^\+?[78]\d{10}$'),
+    ('museum_inn_format', 'museum_inn', 'regex', r'^(\d{10}|\d{12})$'),
+    ('birthday_date_format', 'birthday_date', 'regex', DATE_PATTERN),
+]
+
+CADASTRAL_RULES = [
+    ('cad_number_present', 'cad_number', 'not_null', None),
+    ('cad_number_format', 'cad_number', 'regex', CADASTRAL_NUMBER_PATTERN),
+    ('quarter_cad_number_format', 'quarter_cad_number', 'regex', CADASTRAL_QUARTER_PATTERN),
+]
+
+ENTREPRENEUR_RULES = [
+    ('date_exec_format', 'date_exec', 'regex', DATE_PATTERN),
+    ('dob_format', 'dob', 'regex', DATE_PATTERN),
+    ('date_ogrnip_format', 'date_ogrnip', 'regex', DATE_PATTERN),
+    ('innfl_format', 'innfl', 'regex', r'^\d{12}$'),
+    ('ogrnip_format', 'ogrnip', 'regex', r'^\d{15}$'),
+]
+
+
+def _as_text(values):
+    import pyarrow as pa
+
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        return values
+    return values.cast(pa.string())
+
+
+def _check_not_null(values, _):
+    import pyarrow.compute as pc
+
+    return pc.is_valid(values)
+
+
+def _check_regex(values, pattern):
+    import pyarrow.compute as pc
+
+    return pc.fill_null(pc.match_substring_regex(_as_text(values), pattern), True)
+
+
+def _compare(values, bound, compare):
+    """Сравнение числа с ``bound``; текстовое значение должно быть числом"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_integer(values.type) or pa.types.is_floating(values.type) \
+            or pa.types.is_decimal(values.type):
+        return pc.fill_null(compare(values, bound), True)
+
+    text = _as_text(values)
+    numeric = pc.fill_null(pc.match_substring_regex(text, NUMBER_PATTERN), False)
+    numbers = pc.cast(pc.if_else(numeric, text, pa.scalar(None, text.type)), pa.float64())
+    return pc.and_(pc.fill_null(compare(numbers, bound), True), pc.or_(numeric, pc.is_null(values)))
+
+
+def _check_greater(values, bound):
+    import pyarrow.compute as pc
+
+    return _compare(values, bound, pc.greater)
+
+
+def _check_greater_equal(values, bound):
+    import pyarrow.compute as pc
+
+    return _compare(values, bound, pc.greater_equal)
+
+
+def _check_in_set(values, allowed):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    return pc.fill_null(pc.is_in(_as_text(values), value_set=pa.array([str(v) for v in allowed])), True)
+
+
+CHECKS = {
+    'not_null': _check_not_null,
+    'regex': _check_regex,
+    'greater': _check_greater,
+    'greater_equal': _check_greater_equal,
+    'in_set': _check_in_set,
+}
+
+
+SEVERITIES = ('error', 'warn')
+
+
+def compile_rules(rules):
+    """Правила -> ``[(имя, колонка, функция(колонка) -> маска корректности, блокирует ли)]``"""
+    compiled = []
+    for name, column, check, param, *rest in rules:
+        severity = rest[0] if rest else 'error'
+        if check not in CHECKS:
+            raise ValueError(f'Неизвестная проверка {check!r} в правиле {name}')
+        if severity not in SEVERITIES:
+            raise ValueError(f'Неизвестная строгость {severity!r} в правиле {name}')
+        function = CHECKS[check]
+        compiled.append((name, column, lambda values, f=function, p=param: f(values, p), severity == 'error'))
+    return compiled
+
+
+class QualityCheck:
+    """Проверка пачек одного набора: счётчики нарушений по правилам и карантин.
+
+    ``check_table`` принимает таблицу Arrow, ``check_batch`` — колоночную
+    пачку загрузчиков (``etl.sinks``); обе возвращают только корректные
+    строки. Без ``quarantine_dir`` некорректные строки только считаются.
+    Правила ``warn`` попадают в счётчики, но строку не отсекают.
+    """
+
+    def __init__(self, dataset, rules, quarantine_dir=QUARANTINE_DIR, mode='full'):
+        self.dataset = dataset
+        self.mode = mode
+        self.rules = compile_rules(rules)
+        self.columns = sorted({column for _, column, _, _ in self.rules})
+        self.quarantine_dir = quarantine_dir
+        self.rows = 0
+        self.failed_rows = 0
+        self.failures = {name: 0 for name, _, _, _ in self.rules}
+        self.warning_rules = [name for name, _, _, blocking in self.rules if not blocking]
+        self.seconds = 0.0
+        self._quarantine = None
+        self._quarantine_path = None
+
+    def _evaluate(self, table):
+        """Маска корректных строк (по блокирующим правилам) и маски отдельных правил"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        started = time.monotonic()
+        valid = None
+        masks = []
+        for name, column, function, blocking in self.rules:
+            mask = function(table[column])
+            self.failures[name] += table.num_rows - pc.sum(mask).as_py()
+            if blocking:
+                valid = mask if valid is None else pc.and_(valid, mask)
+            masks.append(mask)
+        if valid is None:
+            valid = pa.array([True] * table.num_rows)
+        self.rows += table.num_rows
+        self.seconds += time.monotonic() - started
+        return valid, masks
+
+    def _failed_rules(self, masks, invalid):
+        """Перечень нарушенных правил для каждой некорректной строки"""
+        import pyarrow as pa
+
+        columns = [mask.filter(invalid).to_pylist() for mask in masks]
+        names = [name for name, _, _, _ in self.rules]
+        return pa.array([','.join(name for name, ok in zip(names, row) if not ok) for row in zip(*columns)],
+                        pa.string())
+
+    def _write_quarantine(self, rows):
+        import pyarrow.parquet as pq
+
+        if self.quarantine_dir is None:
+            return
+        if self._quarantine is None:
+            directory = os.path.join(self.quarantine_dir, self.dataset)
+            os.makedirs(directory, exist_ok=True)
+            self._quarantine_path = os.path.join(
+                directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+            )
+            self._quarantine = pq.ParquetWriter(self._quarantine_path, rows.schema, compression='zstd')
+        self._quarantine.write_table(rows.cast(self._quarantine.schema))
+
+    def check_table(self, table):
+        """Корректные строки таблицы; некорректные уходят в карантин"""
+        import pyarrow.compute as pc
+
+        if not self.rules or table.num_rows == 0:
+            return table
+        valid, masks = self._evaluate(table)
+        invalid = pc.invert(valid)
+        bad = pc.sum(invalid).as_py()
+        if not bad:
+            return table
+        self.failed_rows += bad
+        self._write_quarantine(
+            table.filter(invalid).append_column('failed_rules', self._failed_rules(masks, invalid))
+        )
+        return table.filter(valid)
+
+    def check_batch(self, batch):
+        """То же для колоночной пачки ``{колонка: список значений}``"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if not self.rules:
+            return batch
+        table = pa.table({column: text_array(batch[column]) for column in self.columns})
+        if table.num_rows == 0:
+            return batch
+        valid, masks = self._evaluate(table)
+        keep = valid.to_pylist()
+        if all(keep):
+            return batch
+
+        bad = [i for i, ok in enumerate(keep) if not ok]
+        self.failed_rows += len(bad)
+        quarantined = {column: text_array([values[i] for i in bad]) for column, values in batch.items()}
+        quarantined['failed_rules'] = self._failed_rules(masks, pc.invert(valid))
+        self._write_quarantine(pa.table(quarantined))
+        return {column: [value for value, ok in zip(values, keep) if ok] for column, values in batch.items()}
+
+    def report(self, metrics_dir=METRICS_DIR):
+        """Итог проверки: печать, строка в ``data_quality.jsonl``; закрывает карантин"""
+        if self._quarantine is not None:
+            self._quarantine.close()
+            self._quarantine = None
+
+        stats = {
+            'dataset': self.dataset,
+            'mode': self.mode,
+            'checked_at': time.time(),
+            'rows': self.rows,
+            'failed_rows': self.failed_rows,
+            'failure_rate': round(self.failed_rows / self.rows, 6) if self.rows else 0.0,
+            'rules': {name: count for name, count in self.failures.items() if name not in self.warning_rules},
+            'warnings': {name: self.failures[name] for name in self.warning_rules},
+            'quarantine': self._quarantine_path,
+            'seconds': round(self.seconds, 3),
+        }
+        failing = ', '.join(f'{name}={count}' for name, count in stats['rules'].items() if count)
+        warned = ', '.join(f'{name}={count}' for name, count in stats['warnings'].items() if count)
+        print(f"Data quality {self.dataset} ({self.mode}): {self.failed_rows}/{self.rows} rows failed"
+              f"{': ' + failing if failing else ''}{'; warnings: ' + warned if warned else ''}")
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            with open(os.path.join(metrics_dir, 'data_quality.jsonl'), 'a') as f:
+                f.write(json.dumps(stats, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"Cannot write data quality metrics: {e}")
+        return stats
+
+
+def text_array(values):
+    import pyarrow as pa
+
+    return pa.array([value if value is None or isinstance(value, str) else str(value) for value in values],
+                    pa.string())
+
+
+def validate_sample(dataset, rules, records, columns=None):
+    """Быстрая оценка качества по выборке записей без полного чтения набора.
+
+    ``records`` — записи-словари (например, ``etl.schema_inference.sample_files``),
+    ``columns`` — колонки, если записи надо разложить по ним. Карантин не пишется.
+    """
+    from etl.sinks import iter_column_batches
+
+    check = QualityCheck(dataset, rules, quarantine_dir=None, mode='sample')
+    columns = columns or check.columns
+    for batch in iter_column_batches(records, columns, limit=50000):
+        check.check_batch(batch)
+    return check.report()
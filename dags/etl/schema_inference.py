@@ -0,0 +1,361 @@
+"""Вывод схем источников по выборке вместо полного прохода ``inferSchema``.
+
+Из файлов набора (CSV, JSON массив, XML) или из топика Kafka берётся
+ограниченное число записей, по ним резервуарной выборкой формируется
+равномерный сэмпл, и типы полей выводятся по этому сэмплу. Результат —
+JSON схемы Spark (``StructType.fromJson``). Для файлов схема кэшируется
+на диске по отпечатку набора (путь, размер, mtime, хэш начала файла):
+пока файлы не менялись, повторный вывод ничего не читает.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import time
+
+from etl.config import SCHEMA_CACHE_DIR, SCHEMA_DIR
+
+DEFAULT_SAMPLE_SIZE = 10000
+
+# Сколько записей читать из одного файла (JSON/XML читаются с начала)
+MAX_RECORDS_PER_FILE = 20000
+
+# CSV: число случайных смещений в файле и строк, читаемых после каждого
+CSV_PROBES = 16
+CSV_ROWS_PER_PROBE = 500
+CSV_PROBE_BYTES = 1024 * 1024
+
+FINGERPRINT_HEAD_BYTES = 64 * 1024
+
+_BOOLEANS = {'true', 'false'}
+_INT_RE = re.compile(r'[+-]?\d+\Z')
+_DOUBLE_RE = re.compile(r'[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?\Z')
+_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}\Z')
+_TIMESTAMP_RE = re.compile(
+    r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d{1,9})?)?(Z|[+-]\d{2}(:?\d{2})?)?\Z'
+)
+
+_INT32_MIN, _INT32_MAX = -2 ** 31, 2 ** 31 - 1
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+# Порядок расширения числовых типов
+_NUMERIC = ('integer', 'long', 'double')
+
+
+def file_fingerprint(path, head_bytes=FINGERPRINT_HEAD_BYTES):
+    """Отпечаток файла: путь, размер, mtime и SHA-1 первых ``head_bytes`` байт"""
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        head = hashlib.sha1(f.read(head_bytes)).hexdigest()
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'head_sha1': head,
+    }
+
+
+def reservoir_sample(records, k, seed=0):
+    """Равномерная выборка ``k`` элементов из потока за один проход (алгоритм R)"""
+    rng = random.Random(seed)
+    sample = []
+    for seen, record in enumerate(records):
+        if seen < k:
+            sample.append(record)
+        else:
+            index = rng.randint(0, seen)
+            if index < k:
+                sample[index] = record
+    return sample
+
+
+def infer_value_type(value, from_text=False):
+    """Тип одного значения.
+
+    ``from_text=True`` — значение пришло из текстового формата (CSV, XML),
+    и числа/булевы распознаются по записи строки. В JSON строка остаётся
+    строкой (кроме дат), иначе ``from_json`` не сможет её разобрать.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        if _INT32_MIN <= value <= _INT32_MAX:
+            return 'integer'
+        return 'long' if _INT64_MIN <= value <= _INT64_MAX else 'double'
+    if isinstance(value, float):
+        return 'double'
+    if isinstance(value, dict):
+        return ('struct', {name: infer_value_type(item, from_text) for name, item in value.items()})
+    if isinstance(value, list):
+        element = 'null'
+        for item in value:
+            element = merge_types(element, infer_value_type(item, from_text))
+        return ('array', element)
+
+    text = str(value).strip()
+    if not text:
+        return 'null' if from_text else 'string'
+    if from_text:
+        if text.lower() in _BOOLEANS:
+            return 'boolean'
+        # Ведущие нули (телефоны, ИНН, коды) — это строки, а не числа
+        if _INT_RE.match(text) and not (len(text.lstrip('+-')) > 1 and text.lstrip('+-')[0] == '0'):
+            number = int(text)
+            if _INT32_MIN <= number <= _INT32_MAX:
+                return 'integer'
+            return 'long' if _INT64_MIN <= number <= _INT64_MAX else 'string'
+        if _DOUBLE_RE.match(text) and not _INT_RE.match(text):
+            return 'double'
+    if _DATE_RE.match(text):
+        return 'date'
+    if _TIMESTAMP_RE.match(text):
+        return 'timestamp'
+    return 'string'
+
+
+def merge_types(left, right):
+    """Наименьший общий тип двух выведенных типов"""
+    if left == right:
+        return left
+    if left == 'null':
+        return right
+    if right == 'null':
+        return left
+    if left in _NUMERIC and right in _NUMERIC:
+        return _NUMERIC[max(_NUMERIC.index(left), _NUMERIC.index(right))]
+    if left in ('date', 'timestamp') and right in ('date', 'timestamp'):
+        return 'timestamp'
+    if isinstance(left, tuple) and isinstance(right, tuple) and left[0] == right[0]:
+        if left[0] == 'array':
+            return ('array', merge_types(left[1], right[1]))
+        fields = dict(left[1])
+        for name, field_type in right[1].items():
+            fields[name] = merge_types(fields.get(name, 'null'), field_type)
+        return ('struct', fields)
+    return 'string'
+
+
+def spark_type(inferred):
+    """Выведенный тип в JSON представлении типа Spark"""
+    if isinstance(inferred, tuple):
+        if inferred[0] == 'array':
+            return {'type': 'array', 'elementType': spark_type(inferred[1]), 'containsNull': True}
+        return spark_struct(inferred[1])
+    return 'string' if inferred == 'null' else inferred
+
+
+def spark_struct(fields):
+    return {
+        'type': 'struct',
+        'fields': [
+            {'name': name, 'type': spark_type(field_type), 'nullable': True, 'metadata': {}}
+            for name, field_type in fields.items()
+        ],
+    }
+
+
+def infer_records_schema(records, hints=None, from_text=False):
+    """Схема Spark по записям (dict).
+
+    ``hints`` — ``{поле: тип Spark}``: закреплённые типы полей, которые
+    перекрывают выведенные и гарантируют наличие поля в схеме, даже если
+    оно не встретилось в выборке.
+    """
+    fields = {}
+    for record in records:
+        for name, value in record.items():
+            fields[name] = merge_types(fields.get(name, 'null'), infer_value_type(value, from_text))
+
+    schema = spark_struct(fields)
+    for name, pinned in (hints or {}).items():
+        for field in schema['fields']:
+            if field['name'] == name:
+                field['type'] = pinned
+                break
+        else:
+            schema['fields'].append({'name': name, 'type': pinned, 'nullable': True, 'metadata': {}})
+    return schema
+
+
+def iter_csv_sample(path, delimiter=';', probes=CSV_PROBES, rows_per_probe=CSV_ROWS_PER_PROBE, seed=0):
+    """Записи CSV из начала файла и из ``probes`` случайных смещений.
+
+    После перехода на смещение чтение начинается со следующей строки;
+    строки с числом полей, не совпадающим с заголовком (смещение попало
+    внутрь значения в кавычках), отбрасываются.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if not header:
+            return
+        # Небольшой файл читается с начала целиком (в пределах лимита)
+        head_rows = rows_per_probe if size > CSV_PROBE_BYTES else MAX_RECORDS_PER_FILE
+        for _, row in zip(range(head_rows), reader):
+            if len(row) == len(header):
+                yield dict(zip(header, row))
+
+    rng = random.Random(seed)
+    with open(path, 'rb') as f:
+        for _ in range(probes if size > CSV_PROBE_BYTES else 0):
+            f.seek(rng.randrange(0, size))
+            f.readline()
+            chunk = f.read(CSV_PROBE_BYTES).decode('utf-8', errors='replace')
+            lines = chunk.splitlines(keepends=True)[:-1]
+            reader = csv.reader(io.StringIO(''.join(lines)), delimiter=delimiter)
+            for _, row in zip(range(rows_per_probe), reader):
+                if len(row) == len(header):
+                    yield dict(zip(header, row))
+
+
+def iter_json_sample(path, limit=MAX_RECORDS_PER_FILE):
+    """Первые ``limit`` элементов JSON массива"""
+    from etl.json_stream import iter_json_array
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for _, record in zip(range(limit), iter_json_array(f)):
+            if isinstance(record, dict):
+                yield record
+
+
+def iter_xml_sample(path, tag='item', limit=MAX_RECORDS_PER_FILE):
+    """Первые ``limit`` записей XML файла"""
+    from etl.xml_stream import iter_xml_records
+
+    for _, record in zip(range(limit), iter_xml_records(path, tag=tag)):
+        if isinstance(record, dict):
+            yield record
+
+
+def _iter_file_sample(path, fmt, delimiter, tag, seed):
+    if fmt == 'csv':
+        return iter_csv_sample(path, delimiter=delimiter, seed=seed)
+    if fmt == 'json':
+        return iter_json_sample(path)
+    if fmt == 'xml':
+        return iter_xml_sample(path, tag=tag)
+    raise ValueError(f'Неизвестный формат источника: {fmt}')
+
+
+def sample_files(paths, fmt, sample_size=DEFAULT_SAMPLE_SIZE, delimiter=';', tag='item', seed=0):
+    """Равномерная выборка записей набора файлов без полного чтения файлов"""
+    records = (record for i, path in enumerate(paths)
+               for record in _iter_file_sample(path, fmt, delimiter, tag, seed + i))
+    return reservoir_sample(records, sample_size, seed=seed)
+
+
+def infer_file_schema(paths, fmt, delimiter=';', tag='item', hints=None,
+                      sample_size=DEFAULT_SAMPLE_SIZE, cache_dir=SCHEMA_CACHE_DIR, seed=0):
+    """Схема набора файлов одного формата (``csv``, ``json`` или ``xml``).
+
+    Результат кэшируется в ``cache_dir`` по отпечаткам файлов и параметрам
+    вывода; при совпадении отпечатков файлы не читаются.
+    """
+    paths = sorted(paths)
+    fingerprints = [file_fingerprint(path) for path in paths]
+    options = {'format': fmt, 'delimiter': delimiter, 'tag': tag, 'hints': hints or {},
+               'sample_size': sample_size, 'seed': seed}
+    key = hashlib.sha256(
+        json.dumps({'options': options, 'files': fingerprints}, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+    cache_path = os.path.join(cache_dir, f'{key}.json') if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        print(f"Schema cache hit for {len(paths)} {fmt} files: {key[:12]}")
+        return cached['schema']
+
+    started = time.time()
+    sample = sample_files(paths, fmt, sample_size, delimiter, tag, seed)
+    schema = infer_records_schema(sample, hints=hints, from_text=fmt in ('csv', 'xml'))
+    print(f"Inferred {fmt} schema from {len(sample)} sampled records of {len(paths)} files "
+          f"in {time.time() - started:.2f}s: {len(schema['fields'])} fields")
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'options': options, 'files': fingerprints,
+                       'sampled': len(sample), 'schema': schema}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    return schema
+
+
+def sample_topic(topic, limit=DEFAULT_SAMPLE_SIZE, bootstrap_servers=None, timeout=10):
+    """Последние сообщения топика (не более ``limit``), разобранные как JSON.
+
+    Читаются хвосты партиций без коммита смещений, поэтому выборка не
+    влияет на consumer group'ы пайплайна.
+    """
+    import uuid
+
+    from confluent_kafka import Consumer, TopicPartition
+
+    from etl.config import KAFKA_BOOTSTRAP_SERVERS
+
+    consumer = Consumer({
+        'bootstrap.servers': bootstrap_servers or KAFKA_BOOTSTRAP_SERVERS,
+        'group.id': f'schema-inference-{uuid.uuid4().hex}',
+        'enable.auto.commit': False,
+        'auto.offset.reset': 'earliest',
+    })
+    try:
+        metadata = consumer.list_topics(topic, timeout=timeout)
+        partitions = list(metadata.topics[topic].partitions)
+        per_partition = max(1, limit // max(len(partitions), 1))
+
+        assignment = []
+        remaining = {}
+        for partition in partitions:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=timeout)
+            if high > low:
+                assignment.append(TopicPartition(topic, partition, max(low, high - per_partition)))
+                remaining[partition] = high
+        if not assignment:
+            return []
+        consumer.assign(assignment)
+
+        records = []
+        deadline = time.monotonic() + timeout
+        while remaining and time.monotonic() < deadline:
+            for message in consumer.consume(num_messages=1000, timeout=1.0):
+                if message.error():
+                    continue
+                if message.offset() + 1 >= remaining.get(message.partition(), 0):
+                    remaining.pop(message.partition(), None)
+                try:
+                    value = json.loads(message.value())
+                except (TypeError, ValueError):
+                    continue
+                if isinstance(value, dict):
+                    records.append(value)
+        return records
+    finally:
+        consumer.close()
+
+
+def infer_topic_schema(topic, hints=None, sample_size=DEFAULT_SAMPLE_SIZE, bootstrap_servers=None):
+    """Схема JSON сообщений топика по выборке из хвостов партиций"""
+    sample = sample_topic(topic, limit=sample_size, bootstrap_servers=bootstrap_servers)
+    schema = infer_records_schema(sample, hints=hints)
+    print(f"Inferred schema of topic {topic} from {len(sample)} messages: {len(schema['fields'])} fields")
+    return schema
+
+
+def publish_schema(name, schema, schema_dir=SCHEMA_DIR):
+    """Публикация схемы для Spark job'ов: ``<schema_dir>/<name>.json``"""
+    os.makedirs(schema_dir, exist_ok=True)
+    path = os.path.join(schema_dir, f'{name}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    print(f"Schema {name} published to {path}")
+    return path
@@ -0,0 +1,91 @@
+"""Явные схемы исходных наборов данных.
+
+Схема — список пар ``(колонка, тип PostgreSQL)`` в порядке колонок файла.
+"""
+
+# Музейные билеты (CSV, разделитель ";", 27 колонок)
+MUSEUM_TICKET_SCHEMA = [
+    ('created', 'TIMESTAMPTZ'),
+    ('order_status', 'VARCHAR(20)'),
+    ('ticket_status', 'VARCHAR(20)'),
+    ('ticket_price', 'DECIMAL(10,2)'),
+    ('visitor_category', 'VARCHAR(200)'),
+    ('event_id', 'BIGINT'),
+    ('is_active', 'BOOLEAN'),
+    ('valid_to', 'DATE'),
+    ('count_visitor', 'INTEGER'),
+    ('is_entrance', 'BOOLEAN'),
+    ('is_entrance_mdate', 'TIMESTAMPTZ'),
+    ('event_name', 'VARCHAR(500)'),
+    ('event_kind_name', 'VARCHAR(200)'),
+    ('spot_id', 'BIGINT'),
+    ('spot_name', 'VARCHAR(500)'),
+    ('museum_name', 'VARCHAR(500)'),
+    ('start_datetime', 'TIMESTAMP'),
+    ('ticket_id', 'BIGINT'),
+    ('update_timestamp', 'TIMESTAMPTZ'),
+    ('client_name', 'VARCHAR(300)'),
+    ('name', 'VARCHAR(100)'),
+    ('surname', 'VARCHAR(100)'),
+    ('client_phone', 'VARCHAR(20)'),
+    ('museum_inn', 'VARCHAR(12)'),
+    ('birthday_date', 'VARCHAR(20)'),
+    ('order_number', 'VARCHAR(50)'),
+    ('ticket_number', 'VARCHAR(50)'),
+]
+
+# Тестовые пользователи из create_sample_data
+USERS_SCHEMA = [
+    ('id', 'INTEGER'),
+    ('name', 'VARCHAR(100)'),
+    ('age', 'INTEGER'),
+    ('city', 'VARCHAR(100)'),
+    ('salary', 'INTEGER'),
+]
+
+
+def column_names(schema):
+    return [column for column, _ in schema]
+
+
+def create_table_sql(table, schema):
+    """DDL таблицы загрузки по схеме источника.
+
+    ``source_file`` заполняется загрузчиком через настройку сессии
+    ``etl.source_file``, поэтому COPY может передавать файл как есть.
+    """
+    columns = [f'{column} {pg_type}' for column, pg_type in schema]
+    columns.append("source_file VARCHAR(255) DEFAULT current_setting('etl.source_file', true)")
+    columns.append('created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
+    body = ',\n    '.join(columns)
+    return f'CREATE TABLE IF NOT EXISTS {table} (\n    {body}\n);'
+
+
+def arrow_type(pg_type):
+    """Тип pyarrow, соответствующий типу PostgreSQL"""
+    import pyarrow as pa
+
+    pg_type = pg_type.upper()
+    if pg_type == 'BIGINT':
+        return pa.int64()
+    if pg_type in ('INTEGER', 'INT'):
+        return pa.int32()
+    if pg_type == 'SMALLINT':
+        return pa.int16()
+    if pg_type.startswith(('DECIMAL', 'NUMERIC', 'DOUBLE', 'REAL')):
+        return pa.float64()
+    if pg_type == 'BOOLEAN':
+        return pa.bool_()
+    if pg_type == 'DATE':
+        return pa.date32()
+    if pg_type == 'TIMESTAMPTZ':
+        return pa.timestamp('ms', tz='UTC')
+    if pg_type == 'TIMESTAMP':
+        return pa.timestamp('ms')
+    return pa.string()
+
+
+def arrow_schema(schema):
+    import pyarrow as pa
+
+    return pa.schema([(column, arrow_type(pg_type)) for column, pg_type in schema])
@@ -0,0 +1,85 @@
+"""Приёмники колоночных пачек: COPY в PostgreSQL и запись в Parquet.
+
+Пачка (batch) — словарь ``{колонка: список значений}`` одинаковой длины.
+"""
+import csv
+import io
+
+
+def new_batch(columns):
+    """Пустая колоночная пачка с заданным набором колонок"""
+    return {column: [] for column in columns}
+
+
+def batch_size(batch):
+    """Количество строк в колоночной пачке"""
+    for values in batch.values():
+        return len(values)
+    return 0
+
+
+def iter_column_batches(rows, columns, limit):
+    """Нарезка потока записей-словарей на колоночные пачки по ``limit`` строк"""
+    batch = new_batch(columns)
+    count = 0
+    for row in rows:
+        for column in columns:
+            batch[column].append(row.get(column))
+        count += 1
+        if count == limit:
+            yield batch
+            batch = new_batch(columns)
+            count = 0
+    if count:
+        yield batch
+
+
+def copy_batch(conn, table, columns, batch):
+    """Загрузка пачки в таблицу через COPY ... FROM STDIN (CSV).
+
+    Пачка сериализуется в буфер в памяти, поэтому её размер ограничивает
+    потребление памяти. Фиксация транзакции остаётся за вызывающим кодом.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerows(zip(*(batch[column] for column in columns)))
+    buffer.seek(0)
+
+    with conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    return batch_size(batch)
+
+
+class ParquetBatchWriter:
+    """Потоковая запись колоночных пачек в один Parquet файл (row group на пачку)"""
+
+    def __init__(self, path, columns, compression='zstd'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError('Для записи в Parquet требуется пакет pyarrow') from exc
+
+        self._pa = pa
+        self.columns = list(columns)
+        self.schema = pa.schema([(column, pa.string()) for column in self.columns])
+        self._writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, batch):
+        table = self._pa.Table.from_pydict(
+            {column: batch[column] for column in self.columns}, schema=self.schema
+        )
+        self._writer.write_table(table)
+        return table.num_rows
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
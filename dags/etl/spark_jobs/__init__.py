@@ -0,0 +1,8 @@
+"""Spark job'ы ETL платформы.
+
+Пакет собирается в zip (``etl.spark_submit.build_job_package``) и
+передаётся в ``spark-submit --py-files``; точка входа — ``runner.main``.
+Модули пакета не зависят от Airflow и остального пакета ``etl``.
+"""
+
+__version__ = '1.0.0'
@@ -0,0 +1,289 @@
+"""Общие части Spark job'ов: сессия, схемы, запуск запросов, замер времени старта"""
+import argparse
+import json
+import os
+import time
+
+SPARK_MASTER = os.environ.get('SPARK_MASTER_URL', 'spark://spark-master:7077')
+KAFKA_BOOTSTRAP_SERVERS = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092')
+PG_DSN = os.environ.get('ETL_PG_DSN', 'host=postgres port=5432 dbname=etl_db user=admin password=admin')
+
+# Параметры JDBC (url, user, password) берутся из того же DSN
+PG_JDBC_DRIVER = 'org.postgresql.Driver'
+
+# Общий с Airflow каталог: опубликованные схемы и метрики запусков
+SCHEMA_DIR = os.environ.get('ETL_SCHEMA_DIR', '/opt/etl/schemas')
+METRICS_DIR = os.environ.get('ETL_METRICS_DIR', '/opt/etl/metrics')
+
+# Позиции streaming запросов в Kafka для расчёта отставания в Airflow
+OFFSETS_DIR = os.environ.get('ETL_OFFSETS_DIR', '/opt/etl/offsets')
+
+# Checkpoint'ы streaming запросов (volume spark_data, общий для master и worker)
+CHECKPOINT_DIR = os.environ.get('ETL_CHECKPOINT_DIR', '/opt/spark/work-dir/checkpoints')
+
+# Слой файлов Parquet (общий с Airflow каталог, см. etl.lake)
+LAKE_DIR = os.environ.get('ETL_LAKE_DIR', '/opt/etl/lake')
+
+# Список файлов landing, которые компакция Airflow уже перенесла в набор
+LANDING_MOVED_FILE = '_landing_moved.json'
+
+# Состояние агрегаций в RocksDB: вне JVM heap, в checkpoint пишется changelog
+ROCKSDB_STATE_STORE_CONF = {
+    "spark.sql.streaming.stateStore.providerClass":
+        "org.apache.spark.sql.execution.streaming.state.RocksDBStateStoreProvider",
+    "spark.sql.streaming.stateStore.rocksdb.changelogCheckpointing.enabled": "true",
+}
+
+# Режимы запуска: available-now — дочитать накопившийся backlog и завершиться,
+# continuous — обрабатывать поток до таймаута
+AVAILABLE_NOW = 'available-now'
+CONTINUOUS = 'continuous'
+DEFAULT_MAX_OFFSETS_PER_TRIGGER = 100000
+
+# Интервал перечитывания закэшированных измерений (курсы, пользователи)
+DEFAULT_SNAPSHOT_REFRESH_SECONDS = 300
+
+
+def jdbc_options(dsn=PG_DSN):
+    """Опции источника ``jdbc`` из libpq DSN (``host=... dbname=...``)"""
+    params = dict(part.split('=', 1) for part in dsn.split())
+    return {
+        "url": f"jdbc:postgresql://{params['host']}:{params.get('port', '5432')}/{params['dbname']}",
+        "user": params['user'],
+        "password": params.get('password', ''),
+        "driver": PG_JDBC_DRIVER,
+    }
+
+
+def load_schema(name, schema_dir=SCHEMA_DIR):
+    """Схема, опубликованная задачей вывода схем (etl.schema_inference)"""
+    from pyspark.sql.types import StructType
+
+    with open(os.path.join(schema_dir, f'{name}.json')) as f:
+        return StructType.fromJson(json.load(f))
+
+
+class StartupTimer:
+    """Время от spark-submit до готовности сессии и до первого micro-batch.
+
+    Момент отправки передаётся из DAG аргументом ``--submitted-at``;
+    первый batch фиксирует слушатель прогресса streaming запросов, для
+    пакетных job'ов — явный вызов ``first_batch``.
+    """
+
+    def __init__(self, job, submitted_at=None):
+        self.job = job
+        self.submitted_at = submitted_at
+        self.started_at = time.time()
+        self.session_ready_at = None
+        self.first_batch_at = None
+
+    def session_ready(self):
+        self.session_ready_at = time.time()
+
+    def first_batch(self):
+        if self.first_batch_at is None:
+            self.first_batch_at = time.time()
+            print(f"First batch of {self.job} completed "
+                  f"{self.first_batch_at - (self.submitted_at or self.started_at):.2f}s after submit")
+
+    def attach(self, spark):
+        """Регистрация слушателя, отмечающего завершение первого micro-batch"""
+        from pyspark.sql.streaming import StreamingQueryListener
+
+        timer = self
+
+        class FirstBatchListener(StreamingQueryListener):
+            def onQueryStarted(self, event):
+                pass
+
+            def onQueryProgress(self, event):
+                timer.first_batch()
+
+            def onQueryIdle(self, event):
+                pass
+
+            def onQueryTerminated(self, event):
+                pass
+
+        spark.streams.addListener(FirstBatchListener())
+
+    def report(self):
+        """Итоговые замеры: печать и запись строки в ``spark_startup.jsonl``"""
+        from etl.spark_jobs import __version__
+
+        origin = self.submitted_at or self.started_at
+
+        def since_submit(moment):
+            return None if moment is None else round(moment - origin, 3)
+
+        stats = {
+            'job': self.job,
+            'version': __version__,
+            'submitted_at': self.submitted_at,
+            'submit_to_python_s': since_submit(self.started_at) if self.submitted_at else None,
+            'submit_to_session_s': since_submit(self.session_ready_at),
+            'submit_to_first_batch_s': since_submit(self.first_batch_at),
+        }
+        print(f"SPARK_STARTUP {json.dumps(stats)}")
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            with open(os.path.join(METRICS_DIR, 'spark_startup.jsonl'), 'a') as f:
+                f.write(json.dumps(stats) + '\n')
+        except OSError as e:
+            print(f"Cannot write startup metrics: {e}")
+        return stats
+
+
+class RefreshingSnapshot:
+    """Маленькое измерение, закэшированное между micro-batch'ами.
+
+    ``get`` перечитывает данные (``load``) не чаще раза в ``refresh_seconds``,
+    поэтому чтение измерения делится на все batch'и интервала. Если
+    обновление не удалось, используется прежний снимок.
+    """
+
+    name = 'snapshot'
+
+    def __init__(self, refresh_seconds=DEFAULT_SNAPSHOT_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._df = None
+        self._loaded_at = 0.0
+
+    def load(self, spark):
+        raise NotImplementedError
+
+    def get(self, spark):
+        if self._df is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return self._df
+        try:
+            df = self.load(spark).cache()
+            rows = df.count()
+        except Exception as e:
+            if self._df is None:
+                raise
+            print(f"Cannot refresh {self.name}, using cached snapshot: {e}")
+            self._loaded_at = time.monotonic()
+            return self._df
+
+        previous = self._df
+        self._df = df
+        self._loaded_at = time.monotonic()
+        if previous is not None:
+            previous.unpersist()
+        print(f"Loaded {rows} rows of {self.name}")
+        return self._df
+
+
+def build_session(app_name, timer, **conf):
+    """SparkSession job'а; время создания сессии попадает в замеры старта.
+
+    Прогресс streaming запросов отправляется в Pushgateway (``etl.spark_jobs.metrics``),
+    shuffle-разделы подстраиваются под отставание от Kafka (``etl.spark_jobs.throughput``).
+    """
+    from pyspark.sql import SparkSession
+
+    from etl.spark_jobs.metrics import attach_metrics_listener
+    from etl.spark_jobs.throughput import attach_throughput_listener
+
+    builder = SparkSession.builder.appName(app_name).master(SPARK_MASTER)
+    for key, value in conf.items():
+        builder = builder.config(key, value)
+    spark = builder.getOrCreate()
+    timer.session_ready()
+    timer.attach(spark)
+    attach_metrics_listener(spark, timer.job)
+    attach_throughput_listener(spark, timer.job)
+    return spark
+
+
+def run_arg_parser(timeout=60, max_offsets_per_trigger=DEFAULT_MAX_OFFSETS_PER_TRIGGER):
+    """Парсер аргументов режима запуска; job может добавить свои аргументы"""
+    parser = argparse.ArgumentParser(description='Streaming run mode')
+    parser.add_argument('--mode', choices=(AVAILABLE_NOW, CONTINUOUS), default=AVAILABLE_NOW)
+    parser.add_argument('--max-offsets-per-trigger', type=int, default=max_offsets_per_trigger)
+    parser.add_argument('--timeout', type=int, default=timeout,
+                        help='Seconds to run in continuous mode')
+    return parser
+
+
+def parse_run_args(args, timeout=60, max_offsets_per_trigger=DEFAULT_MAX_OFFSETS_PER_TRIGGER):
+    """Аргументы режима запуска streaming job'а"""
+    return run_arg_parser(timeout, max_offsets_per_trigger).parse_args(args)
+
+
+def checkpoint_location(query_name):
+    """Собственный постоянный checkpoint запроса"""
+    return os.path.join(CHECKPOINT_DIR, query_name)
+
+
+def read_kafka(spark, topics, run_args, starting_offsets='earliest'):
+    """Streaming источник Kafka с ограничением объёма micro-batch.
+
+    ``startingOffsets`` действует только при первом запуске запроса:
+    дальше позиция берётся из checkpoint'а, и читаются только новые данные.
+    """
+    if not isinstance(topics, str):
+        topics = ','.join(topics)
+    return spark \
+        .readStream \
+        .format("kafka") \
+        .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP_SERVERS) \
+        .option("subscribe", topics) \
+        .option("startingOffsets", starting_offsets) \
+        .option("maxOffsetsPerTrigger", run_args.max_offsets_per_trigger) \
+        .load()
+
+
+def remove_moved_landing_files(name, lake_dir=LAKE_DIR):
+    """Удаление файлов landing набора, уже перенесённых компакцией в lake.
+
+    Файлы пишет Spark job, поэтому и удаляет их он (каталог общий с Airflow).
+    Возвращает число удалённых файлов.
+    """
+    landing = os.path.join(lake_dir, '_landing', name)
+    try:
+        with open(os.path.join(lake_dir, name, LANDING_MOVED_FILE)) as f:
+            moved = json.load(f)['files']
+    except (OSError, ValueError, KeyError):
+        return 0
+    removed = 0
+    for path in moved:
+        try:
+            os.remove(os.path.join(landing, path))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        print(f"Removed {removed} landing files of {name} already moved to the lake")
+    return removed
+
+
+def start_query(writer, query_name, run_args, checkpoint_name=None):
+    """Запуск запроса с именем, собственным checkpoint'ом и триггером режима"""
+    writer = writer \
+        .queryName(query_name) \
+        .option("checkpointLocation", checkpoint_location(checkpoint_name or query_name))
+    if run_args.mode == AVAILABLE_NOW:
+        writer = writer.trigger(availableNow=True)
+    return writer.start()
+
+
+def await_queries(queries, run_args):
+    """Ожидание запросов: в available-now — до выработки backlog'а, иначе — до таймаута"""
+    if run_args.mode == AVAILABLE_NOW:
+        print(f"Draining available Kafka backlog ({len(queries)} queries)...")
+        for query in queries:
+            query.awaitTermination()
+    else:
+        print(f"Processing stream for {run_args.timeout} seconds...")
+        deadline = time.time() + run_args.timeout
+        for query in queries:
+            query.awaitTermination(max(deadline - time.time(), 0))
+        for query in queries:
+            query.stop()
+
+    for query in queries:
+        progress = query.recentProgress
+        rows = sum(p['numInputRows'] for p in progress)
+        print(f"Query {query.name}: {len(progress)} batches, {rows} rows")
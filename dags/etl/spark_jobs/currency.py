@@ -0,0 +1,68 @@
+"""Пересчёт сумм в USD по курсам dwh.dim_currency_rates на дату транзакции.
+
+Курсы — маленькое измерение: читаются на driver'е, превращаются в
+интервалы действия ``[valid_from, valid_to)`` и присоединяются broadcast
+join'ом (hash по валюте + условие на дату), без построчной логики.
+"""
+import datetime
+
+from etl.spark_jobs.common import DEFAULT_SNAPSHOT_REFRESH_SECONDS, PG_DSN, RefreshingSnapshot
+
+RATES_SQL = "SELECT currency, rate_date, rate_to_usd FROM dwh.dim_currency_rates ORDER BY currency, rate_date"
+
+# Граница последнего интервала курса
+OPEN_END = datetime.date(9999, 12, 31)
+
+
+def fetch_rates(dsn=PG_DSN):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(RATES_SQL)
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def rates_frame(spark, rows):
+    """Интервалы действия курсов: rate_currency, valid_from, valid_to, rate_to_usd"""
+    intervals = []
+    for i, (currency, rate_date, rate) in enumerate(rows):
+        following = rows[i + 1] if i + 1 < len(rows) else None
+        valid_to = following[1] if following and following[0] == currency else OPEN_END
+        intervals.append((currency, rate_date, valid_to, float(rate)))
+    return spark.createDataFrame(
+        intervals, "rate_currency string, valid_from date, valid_to date, rate_to_usd double"
+    )
+
+
+def add_amount_usd(df, rates_df, date_column="transaction_date"):
+    """Колонка amount_usd: сумма по курсу валюты, действующему на дату транзакции"""
+    from pyspark.sql.functions import broadcast, col
+
+    rate_date = col(date_column)
+    joined = df.join(
+        broadcast(rates_df),
+        (col("currency") == col("rate_currency"))
+        & (rate_date >= col("valid_from"))
+        & (rate_date < col("valid_to")),
+        "left",
+    )
+    return joined \
+        .withColumn("amount_usd", col("amount") * col("rate_to_usd")) \
+        .drop("rate_currency", "valid_from", "valid_to", "rate_to_usd")
+
+
+class CurrencyRates(RefreshingSnapshot):
+    """Закэшированные курсы с периодическим обновлением (для foreachBatch)"""
+
+    name = 'currency rates'
+
+    def __init__(self, refresh_seconds=DEFAULT_SNAPSHOT_REFRESH_SECONDS, dsn=PG_DSN):
+        super().__init__(refresh_seconds)
+        self.dsn = dsn
+
+    def load(self, spark):
+        return rates_frame(spark, fetch_rates(self.dsn))
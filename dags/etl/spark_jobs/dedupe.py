@@ -0,0 +1,15 @@
+"""Дедупликация потоков по ключу с ограниченным состоянием.
+
+``dropDuplicatesWithinWatermark`` хранит ключ только пока событие моложе
+watermark'а (TTL): копии, пришедшие в пределах TTL, отбрасываются, а
+состояние не растёт со временем работы запроса.
+"""
+
+DEFAULT_DEDUPE_TTL = "1 hour"
+
+
+def dedupe_stream(df, key_columns, event_time_column, ttl=DEFAULT_DEDUPE_TTL):
+    """Поток без повторов ``key_columns`` в пределах ``ttl`` по ``event_time_column``"""
+    return df \
+        .withWatermark(event_time_column, ttl) \
+        .dropDuplicatesWithinWatermark(list(key_columns))
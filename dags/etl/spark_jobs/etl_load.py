@@ -0,0 +1,192 @@
+"""Загрузка обработанных данных в хранилище: etl-processed-data -> dwh и lake"""
+import os
+import time
+
+from etl.spark_jobs.common import (
+    LAKE_DIR,
+    PG_DSN,
+    await_queries,
+    build_session,
+    load_schema,
+    read_kafka,
+    remove_moved_landing_files,
+    run_arg_parser,
+    start_query,
+)
+from etl.spark_jobs.dedupe import DEFAULT_DEDUPE_TTL, dedupe_stream
+
+QUERY_NAME = "warehouse_load"
+
+# application_name транзакций, пишущих dwh.fact_transactions: по нему
+# инкрементальный пересчёт агрегатов в Airflow ищет незафиксированные загрузки
+FACT_WRITER_APPLICATION = "etl_fact_writer"
+COPY_CHUNK_ROWS = 50000
+
+USER_COLUMNS = ["user_id", "name", "email", "city", "registration_date"]
+TRANSACTION_COLUMNS = ["transaction_id", "user_id", "amount", "currency",
+                       "amount_usd", "transaction_date", "transaction_hour",
+                       "user_city", "user_email_domain"]
+
+# Перенос из staging в хранилище: дубликаты внутри пачки схлопываются,
+# существующие ключи обновляются. Ключ фактов включает transaction_date
+# (ключ секционирования): строка проверяется и пишется только в свою секцию
+UPSERT_USERS_SQL = '''
+INSERT INTO dwh.dim_users (user_id, name, email, city, registration_date)
+SELECT DISTINCT ON (user_id) user_id, name, email, city, registration_date
+FROM dwh.stg_dim_users
+WHERE user_id IS NOT NULL
+ORDER BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    name = EXCLUDED.name,
+    email = EXCLUDED.email,
+    city = EXCLUDED.city,
+    registration_date = EXCLUDED.registration_date
+'''
+
+UPSERT_TRANSACTIONS_SQL = '''
+INSERT INTO dwh.fact_transactions (transaction_id, user_id, amount, currency,
+                                   amount_usd, transaction_date, transaction_hour,
+                                   user_city, user_email_domain)
+SELECT DISTINCT ON (transaction_id) transaction_id, user_id, amount, currency,
+       amount_usd, transaction_date, transaction_hour, user_city, user_email_domain
+FROM dwh.stg_fact_transactions
+ORDER BY transaction_id
+ON CONFLICT (transaction_id, transaction_date) DO UPDATE SET
+    user_id = EXCLUDED.user_id,
+    amount = EXCLUDED.amount,
+    currency = EXCLUDED.currency,
+    amount_usd = EXCLUDED.amount_usd,
+    transaction_hour = EXCLUDED.transaction_hour,
+    user_city = EXCLUDED.user_city,
+    user_email_domain = EXCLUDED.user_email_domain,
+    updated_at = now()
+'''
+
+
+def copy_partition(table, columns):
+    '''COPY партиции в staging таблицу напрямую с executor'а'''
+    def _copy(rows):
+        import csv
+        import io
+        import psycopg2
+
+        copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        conn = psycopg2.connect(PG_DSN)
+        try:
+            with conn.cursor() as cursor:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                pending = 0
+                for row in rows:
+                    writer.writerow([row[c] for c in columns])
+                    pending += 1
+                    if pending == COPY_CHUNK_ROWS:
+                        buffer.seek(0)
+                        cursor.copy_expert(copy_sql, buffer)
+                        buffer = io.StringIO()
+                        writer = csv.writer(buffer)
+                        pending = 0
+                if pending:
+                    buffer.seek(0)
+                    cursor.copy_expert(copy_sql, buffer)
+            conn.commit()
+        finally:
+            conn.close()
+    return _copy
+
+
+def write_to_warehouse(batch_df, batch_id):
+    '''Загрузка micro-batch: COPY в UNLOGGED staging и upsert в dwh одной транзакцией'''
+    import psycopg2
+    from pyspark.sql.functions import col
+
+    conn = psycopg2.connect(PG_DSN, application_name=FACT_WRITER_APPLICATION)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM dwh.etl_batch_log WHERE query_name = %s AND batch_id = %s",
+                (QUERY_NAME, batch_id),
+            )
+            if cursor.fetchone():
+                print(f"Batch {batch_id} already loaded, skipping replay")
+                return
+            cursor.execute("TRUNCATE dwh.stg_dim_users, dwh.stg_fact_transactions")
+        conn.commit()
+
+        batch_df.persist()
+        started = time.monotonic()
+        batch_users = batch_df.filter(col("name").isNotNull()).select(*USER_COLUMNS)
+        batch_transactions = batch_df.filter(col("transaction_id").isNotNull()).select(*TRANSACTION_COLUMNS)
+        batch_users.foreachPartition(copy_partition("dwh.stg_dim_users", USER_COLUMNS))
+        batch_transactions.foreachPartition(copy_partition("dwh.stg_fact_transactions", TRANSACTION_COLUMNS))
+
+        with conn.cursor() as cursor:
+            cursor.execute(UPSERT_USERS_SQL)
+            users_rows = cursor.rowcount
+            cursor.execute(UPSERT_TRANSACTIONS_SQL)
+            transactions_rows = cursor.rowcount
+            cursor.execute(
+                "INSERT INTO dwh.etl_batch_log (query_name, batch_id, users_rows, transactions_rows) "
+                "VALUES (%s, %s, %s, %s)",
+                (QUERY_NAME, batch_id, users_rows, transactions_rows),
+            )
+        conn.commit()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        total_rows = users_rows + transactions_rows
+        print(f"Batch {batch_id}: {users_rows} users, {transactions_rows} transactions, "
+              f"{total_rows / elapsed:.1f} rows/s")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        batch_df.unpersist()
+        conn.close()
+
+
+def run(timer, args):
+    from pyspark.sql.functions import coalesce, col, from_json
+
+    parser = run_arg_parser(timeout=45)
+    parser.add_argument('--dedupe-ttl', default=DEFAULT_DEDUPE_TTL,
+                        help='How long transaction ids are remembered for deduplication')
+    run_args = parser.parse_args(args)
+    spark = build_session("ETL_Load", timer, **{"spark.sql.adaptive.enabled": "true"})
+
+    # Чтение обработанных данных из Kafka (с позиции checkpoint'а)
+    processed_df = read_kafka(spark, "etl-processed-data", run_args)
+
+    # Парсинг обработанных данных
+    final_df = processed_df.select(
+        from_json(col("value").cast("string"), load_schema("etl-processed-data")).alias("data"),
+        col("timestamp").alias("kafka_timestamp")
+    ).select("data.*", "kafka_timestamp")
+
+    writer = final_df \
+        .writeStream \
+        .foreachBatch(write_to_warehouse)
+    # Имя checkpoint'а сохранено: номера batch'ей сверяются с dwh.etl_batch_log
+    warehouse_query = start_query(writer, QUERY_NAME, run_args, checkpoint_name="etl_load")
+
+    # Файлы landing, которые компакция уже перенесла в lake/transactions
+    remove_moved_landing_files("transactions")
+
+    # Транзакции в lake по дням; компакция переносит файлы из landing в lake/transactions.
+    # Lake пополняется только дописыванием, поэтому повторы transaction_id
+    # отбрасываются в пределах TTL (хранилище защищено upsert'ом)
+    transactions_df = final_df \
+        .filter(col("transaction_id").isNotNull()) \
+        .withColumn("event_time", coalesce(col("timestamp").cast("timestamp"), col("kafka_timestamp")))
+    lake_writer = dedupe_stream(transactions_df, ["transaction_id"], "event_time", run_args.dedupe_ttl) \
+        .select(*TRANSACTION_COLUMNS) \
+        .writeStream \
+        .format("parquet") \
+        .option("compression", "zstd") \
+        .option("path", os.path.join(LAKE_DIR, "_landing", "transactions")) \
+        .partitionBy("transaction_date")
+    lake_query = start_query(lake_writer, "lake_transactions", run_args)
+
+    await_queries([warehouse_query, lake_query], run_args)
+
+    print("Data loading completed!")
+    spark.stop()
@@ -0,0 +1,89 @@
+"""Трансформация сырых данных: etl-raw-data -> etl-processed-data"""
+from etl.spark_jobs.common import (
+    KAFKA_BOOTSTRAP_SERVERS,
+    await_queries,
+    build_session,
+    load_schema,
+    read_kafka,
+    run_arg_parser,
+    start_query,
+)
+from etl.spark_jobs.currency import CurrencyRates, add_amount_usd
+from etl.spark_jobs.users import DEFAULT_READ_PARTITIONS, UserSnapshot, add_user_attributes
+
+QUERY_NAME = "etl_transform"
+OUTPUT_TOPIC = "etl-processed-data"
+
+
+def transform(parsed_df, rates_df, users_df):
+    from pyspark.sql.functions import (
+        col, current_date, current_timestamp, hour, lit, regexp_extract, to_date, when,
+    )
+
+    enriched = parsed_df \
+        .withColumn("processed_at", current_timestamp()) \
+        .withColumn("transaction_date",
+            when(col("timestamp").isNotNull(), to_date(col("timestamp")))
+            .otherwise(current_date())
+        ) \
+        .withColumn("transaction_hour",
+            when(col("timestamp").isNotNull(), hour(col("timestamp")))
+            .otherwise(hour(current_timestamp()))
+        ) \
+        .withColumn("email_domain",
+            when(col("email").isNotNull(),
+                regexp_extract(col("email"), "@(.+)", 1))
+            .otherwise(lit("unknown"))
+        )
+    return add_user_attributes(add_amount_usd(enriched, rates_df), users_df)
+
+
+class TransformBatch:
+    """Трансформация micro-batch'а с курсами и пользователями из кэша и запись в Kafka"""
+
+    def __init__(self, rates, users):
+        self.rates = rates
+        self.users = users
+
+    def __call__(self, batch_df, batch_id):
+        from pyspark.sql.functions import struct, to_json
+
+        spark = batch_df.sparkSession
+        transform(batch_df, self.rates.get(spark), self.users.get(spark)) \
+            .select(to_json(struct("*")).alias("value")) \
+            .write \
+            .format("kafka") \
+            .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP_SERVERS) \
+            .option("topic", OUTPUT_TOPIC) \
+            .save()
+
+
+def run(timer, args):
+    from pyspark.sql.functions import col, from_json
+
+    parser = run_arg_parser(timeout=60)
+    parser.add_argument('--rates-refresh-seconds', type=int, default=300)
+    parser.add_argument('--users-refresh-seconds', type=int, default=300)
+    parser.add_argument('--users-read-partitions', type=int, default=DEFAULT_READ_PARTITIONS)
+    run_args = parser.parse_args(args)
+    spark = build_session("ETL_Transform", timer, **{"spark.sql.adaptive.enabled": "true"})
+
+    # Чтение сырых данных из Kafka (с позиции checkpoint'а)
+    raw_df = read_kafka(spark, "etl-raw-data", run_args)
+
+    # Парсинг JSON данных
+    parsed_df = raw_df.select(
+        from_json(col("value").cast("string"), load_schema("etl-raw-data")).alias("data"),
+        col("timestamp").alias("kafka_timestamp")
+    ).select("data.*", "kafka_timestamp")
+
+    # Запись обработанных данных обратно в Kafka
+    rates = CurrencyRates(run_args.rates_refresh_seconds)
+    users = UserSnapshot(run_args.users_refresh_seconds, run_args.users_read_partitions)
+    writer = parsed_df.writeStream.foreachBatch(TransformBatch(rates, users))
+    query = start_query(writer, QUERY_NAME, run_args)
+
+    await_queries([query], run_args)
+
+    print("Data transformation completed!")
+    spark.stop()
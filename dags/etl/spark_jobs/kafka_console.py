@@ -0,0 +1,55 @@
+"""Чтение топика etl-data и вывод разобранных записей в консоль"""
+from etl.spark_jobs.common import await_queries, build_session, parse_run_args, read_kafka, start_query
+
+QUERY_NAME = "kafka_console"
+
+
+def run(timer, args):
+    from pyspark.sql.functions import col, current_timestamp, from_json
+    from pyspark.sql.types import IntegerType, StringType, StructField, StructType
+
+    run_args = parse_run_args(args, timeout=30)
+    spark = build_session("KafkaETLJob", timer, **{"spark.sql.adaptive.enabled": "true"})
+
+    # Схема для JSON данных
+    schema = StructType([
+        StructField("id", IntegerType(), True),
+        StructField("timestamp", StringType(), True),
+        StructField("value", IntegerType(), True)
+    ])
+
+    try:
+        # Чтение данных из Kafka
+        kafka_df = read_kafka(spark, "etl-data", run_args)
+
+        # Парсинг JSON и добавление колонок
+        parsed_df = kafka_df \
+            .select(
+                from_json(col("value").cast("string"), schema).alias("data"),
+                current_timestamp().alias("processing_time")
+            ) \
+            .select(
+                col("data.id"),
+                col("data.timestamp"),
+                col("data.value"),
+                col("processing_time")
+            )
+
+        # Вывод результата
+        writer = parsed_df \
+            .writeStream \
+            .outputMode("append") \
+            .format("console") \
+            .option("truncate", False)
+        query = start_query(writer, QUERY_NAME, run_args)
+
+        await_queries([query], run_args)
+
+        print("Spark Kafka processing completed successfully!")
+
+    except Exception as e:
+        print(f"Error in Spark job: {e}")
+        raise
+
+    finally:
+        spark.stop()
@@ -0,0 +1,186 @@
+"""Потоковая обработка топиков user-events, transactions и system-events"""
+import os
+
+from etl.spark_jobs.common import (
+    LAKE_DIR,
+    ROCKSDB_STATE_STORE_CONF,
+    await_queries,
+    build_session,
+    load_schema,
+    read_kafka,
+    run_arg_parser,
+    start_query,
+)
+from etl.spark_jobs.currency import CurrencyRates, add_amount_usd
+from etl.spark_jobs.dedupe import dedupe_stream
+
+TOPICS = ("user-events", "transactions", "system-events")
+
+
+def process_user_events(df, schema):
+    from pyspark.sql.functions import col, current_timestamp, from_json
+
+    return df.filter(col("topic") == "user-events") \
+        .select(
+            from_json(col("json_data"), schema).alias("data"),
+            col("kafka_timestamp")
+        ) \
+        .select("data.*", "kafka_timestamp") \
+        .withColumn("processed_at", current_timestamp())
+
+
+def process_transactions(df, schema, rates_df=None):
+    """Транзакции топика; с ``rates_df`` добавляется amount_usd по курсу на дату"""
+    from pyspark.sql.functions import coalesce, col, current_date, current_timestamp, from_json, to_date
+
+    transactions = df.filter(col("topic") == "transactions") \
+        .select(
+            from_json(col("json_data"), schema).alias("data"),
+            col("kafka_timestamp")
+        ) \
+        .select("data.*", "kafka_timestamp") \
+        .withColumn("processed_at", current_timestamp())
+    if rates_df is None:
+        return transactions
+    return add_amount_usd(
+        transactions.withColumn("rate_date", coalesce(to_date(col("timestamp")), current_date())),
+        rates_df,
+        date_column="rate_date",
+    ).drop("rate_date")
+
+
+def process_system_events(df, schema):
+    from pyspark.sql.functions import col, current_timestamp, from_json
+
+    return df.filter(col("topic") == "system-events") \
+        .select(
+            from_json(col("json_data"), schema).alias("data"),
+            col("kafka_timestamp")
+        ) \
+        .select("data.*", "kafka_timestamp") \
+        .withColumn("processed_at", current_timestamp())
+
+
+def aggregate_transactions(transactions_df, window_duration, watermark):
+    """Агрегаты по окнам event time (поле timestamp транзакции) и валютам.
+
+    Watermark ограничивает ожидание опоздавших событий: окно старше
+    watermark'а закрывается, выдаётся один раз (append) и удаляется из
+    состояния, поэтому состояние не растёт со временем работы. Повторно
+    доставленные транзакции отбрасываются в пределах того же watermark'а.
+    """
+    from pyspark.sql import functions as F
+
+    events = transactions_df.withColumn("event_time", F.col("timestamp").cast("timestamp"))
+    return dedupe_stream(events, ["transaction_id"], "event_time", watermark) \
+        .groupBy(
+            F.window(F.col("event_time"), window_duration),
+            F.col("currency")
+        ) \
+        .agg(
+            F.count("*").alias("transaction_count"),
+            F.sum("amount").alias("total_amount"),
+            F.avg("amount").alias("avg_amount"),
+            F.max("amount").alias("max_amount")
+        ) \
+        .select(
+            F.col("window.start").alias("window_start"),
+            F.col("window.end").alias("window_end"),
+            "currency", "transaction_count", "total_amount", "avg_amount", "max_amount"
+        )
+
+
+def select_message_columns(kafka_df):
+    from pyspark.sql.functions import col
+
+    return kafka_df.select(
+        col("topic"),
+        col("partition"),
+        col("offset"),
+        col("timestamp").alias("kafka_timestamp"),
+        col("value").cast("string").alias("json_data")
+    )
+
+
+class TopicFanOut:
+    """Обработка micro-batch'а всех топиков за одно чтение.
+
+    Batch из Kafka кэшируется один раз, строки маршрутизируются по топику
+    в свои обработчики и приёмники (консоль). Курсы валют берутся из кэша
+    ``CurrencyRates``, который обновляется по интервалу.
+    """
+
+    def __init__(self, schemas, rates):
+        self.schemas = schemas
+        self.rates = rates
+
+    def __call__(self, batch_df, batch_id):
+        batch_df.persist()
+        try:
+            rates_df = self.rates.get(batch_df.sparkSession)
+            outputs = [
+                ("user-events", process_user_events(batch_df, self.schemas["user-events"])),
+                ("transactions", process_transactions(batch_df, self.schemas["transactions"], rates_df)),
+                ("system-events", process_system_events(batch_df, self.schemas["system-events"])),
+            ]
+            for topic, df in outputs:
+                print(f"Batch {batch_id}: {topic}")
+                df.show(truncate=False)
+        finally:
+            batch_df.unpersist()
+
+
+def run(timer, args):
+    parser = run_arg_parser(timeout=120)
+    parser.add_argument('--window', default="5 minutes", help='Aggregation window duration')
+    parser.add_argument('--watermark', default="10 minutes", help='Allowed event lateness')
+    parser.add_argument('--rates-refresh-seconds', type=int, default=300)
+    run_args = parser.parse_args(args)
+
+    spark = build_session("KafkaSparkStreaming", timer, **{
+        "spark.sql.adaptive.enabled": "true",
+        "spark.sql.adaptive.coalescePartitions.enabled": "true",
+        **ROCKSDB_STATE_STORE_CONF,
+    })
+    spark.sparkContext.setLogLevel("WARN")
+
+    # Схемы сообщений публикуют задачи infer_*_schema (etl.schema_inference)
+    schemas = {topic: load_schema(topic) for topic in TOPICS}
+
+    # Чтение из Kafka: один источник на все топики
+    kafka_df = read_kafka(spark, TOPICS, run_args)
+
+    # Парсинг сообщений
+    parsed_df = select_message_columns(kafka_df)
+
+    # Один запрос: каждый micro-batch читается один раз и раздаётся по топикам
+    query = start_query(
+        parsed_df.writeStream.foreachBatch(
+            TopicFanOut(schemas, CurrencyRates(run_args.rates_refresh_seconds))
+        ),
+        "topic_fan_out", run_args,
+    )
+
+    # Агрегаты окон: stateful запрос по топику транзакций, закрытые окна
+    # дописываются в Parquet (append)
+    transactions_df = process_transactions(
+        select_message_columns(read_kafka(spark, "transactions", run_args)),
+        schemas["transactions"],
+    )
+    aggregate_query = start_query(
+        aggregate_transactions(transactions_df, run_args.window, run_args.watermark)
+        .writeStream
+        .outputMode("append")
+        .format("parquet")
+        .option("compression", "zstd")
+        .option("path", os.path.join(LAKE_DIR, "transaction_window_aggregates")),
+        "transaction_windows", run_args,
+    )
+
+    print("Spark Streaming job started...")
+
+    # Ожидание обработки
+    await_queries([query, aggregate_query], run_args)
+
+    print("Spark Streaming completed!")
+    spark.stop()
@@ -0,0 +1,130 @@
+"""Метрики Prometheus: текстовый формат и отправка в Pushgateway.
+
+Job'ы живут недолго (available-now) и не держат HTTP-порт для scrape,
+поэтому метрики отправляются в Pushgateway, который опрашивает Prometheus.
+Отправка — stdlib ``urllib``, без клиентской библиотеки в образе Spark;
+недоступный Pushgateway не прерывает обработку.
+"""
+import os
+import time
+import urllib.parse
+
+PUSHGATEWAY_URL = os.environ.get('ETL_PUSHGATEWAY_URL', 'http://pushgateway:9091')
+PUSH_TIMEOUT_SECONDS = 2
+
+# Сбои отправки печатаются один раз на адрес, чтобы не засорять лог каждого batch'а
+_failed_urls = set()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_metrics(samples):
+    """Текстовый формат Prometheus из ``[(имя, тип, справка, метки, значение)]``"""
+    lines = []
+    described = set()
+    for name, kind, help_text, labels, value in samples:
+        if value is None:
+            continue
+        if name not in described:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            described.add(name)
+        label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in sorted(labels.items()))
+        lines.append(f'{name}{{{label_text}}} {float(value)}' if label_text else f'{name} {float(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def push_metrics(job, samples, grouping=None, url=PUSHGATEWAY_URL):
+    """Замена метрик группы ``job`` (+ ``grouping``) в Pushgateway; False при сбое"""
+    import urllib.request
+
+    if not url:
+        return False
+    path = f'/metrics/job/{urllib.parse.quote(job, safe="")}'
+    for key, value in (grouping or {}).items():
+        path += f'/{key}/{urllib.parse.quote(str(value), safe="")}'
+    request = urllib.request.Request(
+        url.rstrip('/') + path,
+        data=format_metrics(samples).encode('utf-8'),
+        method='PUT',
+        headers={'Content-Type': 'text/plain; version=0.0.4'},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=PUSH_TIMEOUT_SECONDS):
+            return True
+    except OSError as e:
+        if url not in _failed_urls:
+            _failed_urls.add(url)
+            print(f"Cannot push metrics to {url}: {e}")
+        return False
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def progress_samples(progress):
+    """Метрики одного micro-batch'а из ``StreamingQueryProgress``"""
+    labels = {'query': progress.name or str(progress.id)}
+    durations = progress.durationMs or {}
+    state_rows = sum(operator.numRowsTotal for operator in progress.stateOperators or [])
+
+    # Отставание от последних offset'ов Kafka (метрики источника Kafka)
+    behind_max, behind_avg = None, None
+    for source in progress.sources or []:
+        metrics = source.metrics or {}
+        if 'maxOffsetsBehindLatest' in metrics:
+            behind_max = (behind_max or 0) + (_number(metrics['maxOffsetsBehindLatest']) or 0)
+            behind_avg = (behind_avg or 0) + (_number(metrics.get('avgOffsetsBehindLatest')) or 0)
+
+    trigger_ms = durations.get('triggerExecution')
+    return [
+        ('etl_streaming_batch_id', 'gauge', 'Last completed micro-batch id', labels, progress.batchId),
+        ('etl_streaming_input_rows', 'gauge', 'Rows read in the last micro-batch', labels,
+         progress.numInputRows),
+        ('etl_streaming_input_rows_per_second', 'gauge', 'Input rate of the last micro-batch', labels,
+         _number(progress.inputRowsPerSecond)),
+        ('etl_streaming_processed_rows_per_second', 'gauge', 'Processing rate of the last micro-batch', labels,
+         _number(progress.processedRowsPerSecond)),
+        ('etl_streaming_batch_duration_seconds', 'gauge', 'Trigger execution time of the last micro-batch', labels,
+         None if trigger_ms is None else trigger_ms / 1000),
+        ('etl_streaming_state_rows', 'gauge', 'Rows kept in state stores', labels, state_rows),
+        ('etl_streaming_kafka_offsets_behind_max', 'gauge', 'Max offsets behind latest over Kafka partitions',
+         labels, behind_max),
+        ('etl_streaming_kafka_offsets_behind_avg', 'gauge', 'Avg offsets behind latest over Kafka partitions',
+         labels, behind_avg),
+        ('etl_streaming_last_progress_timestamp_seconds', 'gauge', 'Unix time of the last progress report',
+         labels, time.time()),
+    ]
+
+
+def attach_metrics_listener(spark, job, url=PUSHGATEWAY_URL):
+    """Слушатель прогресса запросов, отправляющий метрики каждого micro-batch'а"""
+    from pyspark.sql.streaming import StreamingQueryListener
+
+    if not url:
+        return None
+
+    class PrometheusQueryListener(StreamingQueryListener):
+        def onQueryStarted(self, event):
+            pass
+
+        def onQueryProgress(self, event):
+            progress = event.progress
+            push_metrics('etl_spark_streaming', progress_samples(progress),
+                         {'spark_job': job, 'query': progress.name or str(progress.id)}, url)
+
+        def onQueryIdle(self, event):
+            pass
+
+        def onQueryTerminated(self, event):
+            pass
+
+    listener = PrometheusQueryListener()
+    spark.streams.addListener(listener)
+    return listener
@@ -0,0 +1,22 @@
+"""Точка входа spark-submit: ``run_job.py <job> [--submitted-at T] [аргументы job'а]``"""
+import argparse
+import importlib
+
+JOBS = ('etl_transform', 'etl_load', 'kafka_streaming', 'kafka_console', 'statistics')
+
+
+def main(argv=None):
+    from etl.spark_jobs.common import StartupTimer
+
+    parser = argparse.ArgumentParser(description='ETL Spark job runner')
+    parser.add_argument('job', choices=JOBS)
+    parser.add_argument('--submitted-at', type=float, default=None,
+                        help='Unix time of spark-submit, set by the DAG')
+    args, job_args = parser.parse_known_args(argv)
+
+    timer = StartupTimer(args.job, args.submitted_at)
+    module = importlib.import_module(f'etl.spark_jobs.{args.job}')
+    try:
+        module.run(timer, job_args)
+    finally:
+        timer.report()
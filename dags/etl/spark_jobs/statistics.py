@@ -0,0 +1,58 @@
+"""Подсчёт статистики по транзакциям из lake (или по тестовому набору)"""
+import argparse
+import os
+
+from etl.spark_jobs.common import LAKE_DIR, build_session
+
+TRANSACTIONS_PATH = os.path.join(LAKE_DIR, "transactions")
+OUTPUT_PATH = os.path.join(LAKE_DIR, "spark_stats")
+
+
+def load_scores(spark, days):
+    """Данные для статистики: суммы транзакций за ``days`` дней или тестовый набор"""
+    from pyspark.sql.functions import col, current_date, date_sub
+
+    if os.path.isdir(TRANSACTIONS_PATH):
+        # Фильтр по колонке разбиения: читаются только каталоги нужных дней
+        return spark.read.parquet(TRANSACTIONS_PATH) \
+            .where(col("transaction_date") >= date_sub(current_date(), days)) \
+            .select(col("amount").alias("score"))
+
+    data = [(i, f"user_{i}", i * 10) for i in range(1, 101)]
+    return spark.createDataFrame(data, ["id", "name", "score"])
+
+
+def run(timer, args):
+    from pyspark.sql.functions import avg, count, max, min
+
+    parser = argparse.ArgumentParser(description='Statistics job')
+    parser.add_argument('--days', type=int, default=7)
+    job_args = parser.parse_args(args)
+
+    spark = build_session("StatisticsJob", timer)
+
+    try:
+        df = load_scores(spark, job_args.days)
+
+        # Вычисление статистики
+        stats = df.agg(
+            count("*").alias("total_records"),
+            avg("score").alias("avg_score"),
+            max("score").alias("max_score"),
+            min("score").alias("min_score")
+        )
+
+        print("=== Statistics Results ===")
+        stats.show()
+        timer.first_batch()
+
+        # Сохранение результата
+        stats.write.mode("overwrite").option("compression", "zstd").parquet(OUTPUT_PATH)
+        print(f"Statistics saved to {OUTPUT_PATH}")
+
+    except Exception as e:
+        print(f"Error in statistics job: {e}")
+        raise
+
+    finally:
+        spark.stop()
@@ -0,0 +1,156 @@
+"""Подбор пропускной способности streaming job'ов по отставанию от Kafka.
+
+Отставание (lag) — число сообщений между последними offset'ами топиков
+и позицией, до которой запрос уже дочитал. Перед запуском его считает
+Airflow (``etl.throughput``) и выбирает размер micro-batch
+(``maxOffsetsPerTrigger``), число ядер и shuffle-разделов; во время
+работы слушатель прогресса пересчитывает shuffle-разделы по отставанию,
+которое сообщает источник Kafka. Каждое решение пишется в
+``throughput.jsonl`` вместе с отставанием, по которому оно принято.
+
+Позиции запросов публикуются в ``OFFSETS_DIR/<запрос>.json`` после
+каждого micro-batch'а: checkpoint'ы лежат в volume Spark, а этот
+каталог общий с Airflow.
+"""
+import json
+import math
+import os
+import time
+
+from etl.spark_jobs.common import METRICS_DIR, OFFSETS_DIR
+
+# Backlog вырабатывается примерно за столько trigger'ов
+TARGET_TRIGGERS = 10
+MIN_OFFSETS_PER_TRIGGER = 10000
+MAX_OFFSETS_PER_TRIGGER = 1000000
+
+# Сообщений на ядро за trigger, при котором batch укладывается в секунды
+OFFSETS_PER_CORE = 50000
+SHUFFLE_PARTITIONS_PER_CORE = 2
+
+# Отставание, при котором поток считается простаивающим
+IDLE_LAG = 1000
+
+
+def plan_throughput(lag, max_cores):
+    """Параметры запуска для отставания ``lag`` при не более ``max_cores`` ядрах"""
+    max_offsets = min(MAX_OFFSETS_PER_TRIGGER, max(MIN_OFFSETS_PER_TRIGGER, math.ceil(lag / TARGET_TRIGGERS)))
+    cores = 1 if lag <= IDLE_LAG else min(max_cores, max(1, math.ceil(max_offsets / OFFSETS_PER_CORE)))
+    if lag <= IDLE_LAG:
+        level = 'idle'
+    elif lag > TARGET_TRIGGERS * MIN_OFFSETS_PER_TRIGGER:
+        level = 'backlog'
+    else:
+        level = 'steady'
+    return {
+        'level': level,
+        'max_offsets_per_trigger': max_offsets,
+        'total_executor_cores': cores,
+        'shuffle_partitions': cores * SHUFFLE_PARTITIONS_PER_CORE,
+    }
+
+
+def record_decision(job, stage, lag, plan, metrics_dir=METRICS_DIR, **details):
+    """Решение и отставание, по которому оно принято: печать и ``throughput.jsonl``"""
+    entry = {'job': job, 'stage': stage, 'at': time.time(), 'lag': lag, **details, **plan}
+    print(f"THROUGHPUT {json.dumps(entry)}")
+    try:
+        os.makedirs(metrics_dir, exist_ok=True)
+        with open(os.path.join(metrics_dir, 'throughput.jsonl'), 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    except OSError as e:
+        print(f"Cannot write throughput decision: {e}")
+    return entry
+
+
+def _source_offsets(source):
+    try:
+        end_offset = json.loads(source.endOffset) if isinstance(source.endOffset, str) else source.endOffset
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(end_offset, dict):
+        return {}
+    return {topic: partitions for topic, partitions in end_offset.items() if isinstance(partitions, dict)}
+
+
+def progress_offsets(progress):
+    """Позиции Kafka после batch'а: ``{топик: {раздел: offset}}``"""
+    offsets = {}
+    for source in progress.sources or []:
+        for topic, partitions in _source_offsets(source).items():
+            offsets.setdefault(topic, {}).update(partitions)
+    return offsets
+
+
+def progress_lag(progress):
+    """Суммарное отставание источников Kafka по метрикам batch'а (None, если их нет)"""
+    lag = None
+    for source in progress.sources or []:
+        metrics = source.metrics or {}
+        if 'avgOffsetsBehindLatest' not in metrics:
+            continue
+        partitions = sum(len(partitions) for partitions in _source_offsets(source).values()) or 1
+        lag = (lag or 0) + float(metrics['avgOffsetsBehindLatest']) * partitions
+    return None if lag is None else round(lag)
+
+
+def publish_offsets(query_name, offsets, offsets_dir=OFFSETS_DIR):
+    """Позиция запроса для расчёта отставания в Airflow (атомарная замена файла)"""
+    if not offsets:
+        return
+    try:
+        os.makedirs(offsets_dir, exist_ok=True)
+        path = os.path.join(offsets_dir, f'{query_name}.json')
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'query': query_name, 'updated_at': time.time(), 'offsets': offsets}, f)
+        os.replace(f'{path}.tmp', path)
+    except OSError as e:
+        print(f"Cannot publish offsets of {query_name}: {e}")
+
+
+def attach_throughput_listener(spark, job):
+    """Слушатель: публикует позиции запросов и подстраивает shuffle-разделы под отставание.
+
+    Число разделов меняется для следующих batch'ей stateless запросов
+    (foreachBatch); у stateful запросов оно закреплено checkpoint'ом.
+    """
+    from pyspark.sql.streaming import StreamingQueryListener
+
+    max_cores = int(spark.conf.get("spark.cores.max", "0") or 0) or spark.sparkContext.defaultParallelism
+
+    class ThroughputListener(StreamingQueryListener):
+        def __init__(self):
+            self.shuffle_partitions = int(spark.conf.get("spark.sql.shuffle.partitions"))
+            self.lags = {}
+
+        def onQueryStarted(self, event):
+            pass
+
+        def onQueryProgress(self, event):
+            progress = event.progress
+            query_name = progress.name or str(progress.id)
+            publish_offsets(query_name, progress_offsets(progress))
+
+            lag = progress_lag(progress)
+            if lag is None:
+                return
+            # Разделы общие для сессии: решение по самому отстающему запросу
+            self.lags[query_name] = lag
+            lag = max(self.lags.values())
+            plan = plan_throughput(lag, max_cores)
+            if plan['shuffle_partitions'] != self.shuffle_partitions:
+                spark.conf.set("spark.sql.shuffle.partitions", str(plan['shuffle_partitions']))
+                self.shuffle_partitions = plan['shuffle_partitions']
+                record_decision(job, 'in-run', lag,
+                                {'level': plan['level'], 'shuffle_partitions': plan['shuffle_partitions']},
+                                query=query_name, batch_id=progress.batchId)
+
+        def onQueryIdle(self, event):
+            pass
+
+        def onQueryTerminated(self, event):
+            pass
+
+    listener = ThroughputListener()
+    spark.streams.addListener(listener)
+    return listener
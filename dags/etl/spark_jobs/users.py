@@ -0,0 +1,77 @@
+"""Обогащение транзакций атрибутами пользователя из снимка dwh.dim_users.
+
+Снимок читается пакетно по JDBC параллельными запросами (диапазоны
+user_id), кэшируется между micro-batch'ами и присоединяется broadcast
+join'ом — stream-static join без обращения к БД на каждый batch.
+"""
+from etl.spark_jobs.common import (
+    DEFAULT_SNAPSHOT_REFRESH_SECONDS,
+    PG_DSN,
+    RefreshingSnapshot,
+    jdbc_options,
+)
+
+# Проекция выполняется в PostgreSQL: по сети идут только нужные колонки
+USERS_QUERY = """(
+    SELECT user_id,
+           city AS user_city,
+           NULLIF(split_part(email, '@', 2), '') AS user_email_domain
+    FROM dwh.dim_users
+) AS users"""
+
+USER_COLUMNS = ["user_city", "user_email_domain"]
+
+DEFAULT_READ_PARTITIONS = 4
+JDBC_FETCH_SIZE = 10000
+
+
+def user_id_bounds(dsn=PG_DSN):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT min(user_id), max(user_id) FROM dwh.dim_users")
+            return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def read_users(spark, num_partitions=DEFAULT_READ_PARTITIONS, dsn=PG_DSN):
+    """Снимок пользователей: user_id, user_city, user_email_domain"""
+    reader = spark.read \
+        .format("jdbc") \
+        .options(**jdbc_options(dsn)) \
+        .option("dbtable", USERS_QUERY) \
+        .option("fetchsize", JDBC_FETCH_SIZE)
+
+    lower, upper = user_id_bounds(dsn)
+    if lower is not None and upper > lower:
+        reader = reader \
+            .option("partitionColumn", "user_id") \
+            .option("lowerBound", lower) \
+            .option("upperBound", upper + 1) \
+            .option("numPartitions", num_partitions)
+    return reader.load()
+
+
+def add_user_attributes(df, users_df):
+    """Денормализованные колонки user_city и user_email_domain по user_id"""
+    from pyspark.sql.functions import broadcast
+
+    return df.join(broadcast(users_df), "user_id", "left")
+
+
+class UserSnapshot(RefreshingSnapshot):
+    """Закэшированный снимок dwh.dim_users с периодическим обновлением"""
+
+    name = 'dim_users snapshot'
+
+    def __init__(self, refresh_seconds=DEFAULT_SNAPSHOT_REFRESH_SECONDS,
+                 num_partitions=DEFAULT_READ_PARTITIONS, dsn=PG_DSN):
+        super().__init__(refresh_seconds)
+        self.num_partitions = num_partitions
+        self.dsn = dsn
+
+    def load(self, spark):
+        return read_users(spark, self.num_partitions, self.dsn)
@@ -0,0 +1,140 @@
+"""Сборка пакета Spark job'ов и команд ``spark-submit`` для DAG'ов.
+
+Код job'ов (``etl.spark_jobs``) упаковывается в версионированный zip и
+передаётся через ``--py-files``; jar-зависимости берутся из кэша,
+собранного в образ Spark (``docker/spark/Dockerfile``), поэтому запуск
+не обращается к Ivy/Maven и работает без сети.
+"""
+import hashlib
+import os
+
+from etl.config import JOBS_DIR, METRICS_DIR
+
+SPARK_MASTER_CONTAINER = 'spark-master'
+SPARK_MASTER_URL = 'spark://spark-master:7077'
+SPARK_SUBMIT = '/opt/spark/bin/spark-submit'
+
+# Кэш jar'ов в образе Spark; списки совпадают с docker/spark/Dockerfile
+JAR_CACHE_DIR = '/opt/spark/jars-cache'
+SPARK_DEPENDENCIES = {
+    'kafka': [
+        'spark-sql-kafka-0-10_2.12-3.5.1.jar',
+        'spark-token-provider-kafka-0-10_2.12-3.5.1.jar',
+        'kafka-clients-3.4.1.jar',
+        'commons-pool2-2.11.1.jar',
+    ],
+    'postgres': [
+        'postgresql-42.7.0.jar',
+    ],
+}
+
+# Executor'ы добавляются под backlog и освобождаются при простое;
+# верхняя граница — --total-executor-cores из плана пропускной способности
+DYNAMIC_ALLOCATION_CONF = {
+    'spark.dynamicAllocation.enabled': 'true',
+    'spark.dynamicAllocation.shuffleTracking.enabled': 'true',
+    'spark.dynamicAllocation.minExecutors': '1',
+    'spark.dynamicAllocation.executorIdleTimeout': '60s',
+}
+
+PACKAGE_NAME = 'etl_spark_jobs'
+LAUNCHER = 'run_job.py'
+LAUNCHER_CODE = 'from etl.spark_jobs.runner import main\n\nmain()\n'
+
+
+def _package_sources():
+    """Файлы пакета: ``etl/__init__.py`` и модули ``etl/spark_jobs``"""
+    import etl
+    import etl.spark_jobs
+
+    etl_dir = os.path.dirname(etl.__file__)
+    jobs_dir = os.path.dirname(etl.spark_jobs.__file__)
+    sources = [(os.path.join(etl_dir, '__init__.py'), 'etl/__init__.py')]
+    for name in sorted(os.listdir(jobs_dir)):
+        if name.endswith('.py'):
+            sources.append((os.path.join(jobs_dir, name), f'etl/spark_jobs/{name}'))
+    return sources
+
+
+def build_job_package(jobs_dir=JOBS_DIR):
+    """Сборка ``etl_spark_jobs-<версия>-<хэш>.zip`` и лаунчера ``run_job.py``.
+
+    Имя архива содержит хэш исходников: неизменный код не пересобирается,
+    а изменённый не перезаписывает архив, с которым уже работает job.
+    Возвращает путь к архиву (уходит в XCom для ``--py-files``).
+    """
+    import zipfile
+
+    from etl.spark_jobs import __version__
+
+    sources = _package_sources()
+    digest = hashlib.sha1()
+    for path, arcname in sources:
+        digest.update(arcname.encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+
+    os.makedirs(jobs_dir, exist_ok=True)
+    package_path = os.path.join(jobs_dir, f'{PACKAGE_NAME}-{__version__}-{digest.hexdigest()[:8]}.zip')
+    if not os.path.exists(package_path):
+        tmp_path = f'{package_path}.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path, arcname in sources:
+                archive.write(path, arcname)
+        os.replace(tmp_path, package_path)
+        print(f"Built Spark job package {package_path}")
+    else:
+        print(f"Spark job package {package_path} is up to date")
+
+    launcher_path = os.path.join(jobs_dir, LAUNCHER)
+    with open(launcher_path, 'w') as f:
+        f.write(LAUNCHER_CODE)
+    return package_path
+
+
+def spark_submit_command(job, dependencies=(), job_args=(), package_task_id='build_job_package',
+                         executor_memory='1g', executor_cores=None, total_executor_cores=2,
+                         throughput_task_id=None):
+    """Bash команда запуска job'а из пакета.
+
+    Время отправки передаётся job'у (``--submitted-at``), последняя строка
+    вывода — замер времени до первого batch'а (попадает в XCom задачи).
+    С ``throughput_task_id`` размер micro-batch, число ядер и shuffle-разделов
+    берутся из плана задачи ``etl.throughput.plan_job_throughput`` (XCom), а
+    executor'ы по одному ядру добавляются и освобождаются dynamic allocation.
+    """
+    jars = [f'local:{JAR_CACHE_DIR}/{jar}' for name in dependencies for jar in SPARK_DEPENDENCIES[name]]
+    confs = []
+    if throughput_task_id:
+        plan = f"ti.xcom_pull(task_ids='{throughput_task_id}')"
+        executor_cores = 1
+        total_executor_cores = f"{{{{ {plan}['total_executor_cores'] }}}}"
+        confs = [
+            f"spark.sql.shuffle.partitions={{{{ {plan}['shuffle_partitions'] }}}}",
+            *(f'{key}={value}' for key, value in DYNAMIC_ALLOCATION_CONF.items()),
+        ]
+        job_args = [*job_args, f"--max-offsets-per-trigger {{{{ {plan}['max_offsets_per_trigger'] }}}}"]
+    options = [f'--master {SPARK_MASTER_URL}']
+    if jars:
+        options.append(f"--jars {','.join(jars)}")
+    options.append(f"--py-files {{{{ ti.xcom_pull(task_ids='{package_task_id}') }}}}")
+    if executor_memory:
+        options.append(f'--executor-memory {executor_memory}')
+    if executor_cores:
+        options.append(f'--executor-cores {executor_cores}')
+    if total_executor_cores:
+        options.append(f'--total-executor-cores {total_executor_cores}')
+    options += [f'--conf {conf}' for conf in confs]
+    arguments = ' '.join([job, '--submitted-at "$SUBMITTED_AT"', *job_args])
+
+    lines = [f'docker exec {SPARK_MASTER_CONTAINER} {SPARK_SUBMIT}']
+    lines += [f'    {option}' for option in options]
+    lines.append(f'    {os.path.join(JOBS_DIR, LAUNCHER)} {arguments}')
+    submit = ' \\\n        '.join(lines)
+    return f"""
+        set -e
+        echo "Submitting Spark job {job}..."
+        SUBMITTED_AT=$(date +%s.%N)
+        {submit}
+        grep '"job": "{job}"' {os.path.join(METRICS_DIR, 'spark_startup.jsonl')} | tail -n 1 || true
+        """
@@ -0,0 +1,20 @@
+"""Статистика пропускной способности загрузчиков"""
+import os
+import time
+
+
+def load_stats(path, rows, started, label='LOAD'):
+    """Сводка по загрузке файла: строки, байты, время, rows/s и MB/s"""
+    elapsed = max(time.monotonic() - started, 1e-9)
+    file_bytes = os.path.getsize(path)
+    stats = {
+        'file': path,
+        'rows': rows,
+        'bytes': file_bytes,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows / elapsed, 1),
+        'mb_per_sec': round(file_bytes / elapsed / 1024 / 1024, 2),
+    }
+    print(f"{label} {os.path.basename(path)}: {rows} rows in {stats['seconds']}s, "
+          f"{stats['mb_per_sec']} MB/s, {stats['rows_per_sec']} rows/s")
+    return stats
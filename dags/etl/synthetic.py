@@ -0,0 +1,311 @@
+"""Синтетические наборы данных в форматах реальных источников.
+
+Генерируются музейные билеты (CSV, схема ``MUSEUM_TICKET_SCHEMA``),
+реестр предпринимателей (JSON массив, поля ``ENTREPRENEUR_FIELDS`` после
+разворачивания) и кадастровые объекты (XML с элементами ``item``).
+Файлы пишутся потоково до заданного размера, поэтому объём не ограничен
+памятью. Генерация детерминирована: один ``seed`` даёт те же файлы.
+
+``duplicate_rate`` — доля полных повторов уже выданных записей,
+``dirty_rate`` — доля записей с одним испорченным значением из тех, что
+проверяют правила ``etl.quality``.
+"""
+import csv
+import datetime
+import json
+import os
+import random
+from xml.sax.saxutils import XMLGenerator
+
+from etl.schemas import MUSEUM_TICKET_SCHEMA, column_names
+
+# Начало периода дат и его длина: даты не зависят от момента генерации
+BASE_DATE = datetime.datetime(2024, 1, 1)
+PERIOD_DAYS = 730
+
+# Сколько последних записей хранится как кандидаты для повторов
+DUPLICATE_POOL = 1000
+
+MUSEUMS = [
+    ('Государственный исторический музей', '7703048890'),
+    ('Третьяковская галерея', '7706035300'),
+    ('Музей Москвы', '7710071979'),
+    ('Музей космонавтики', '7717044305'),
+    ('Дарвиновский музей', '7736058017'),
+]
+EVENT_KINDS = ['Выставка', 'Экскурсия', 'Лекция', 'Мастер-класс', 'Концерт']
+VISITOR_CATEGORIES = ['Взрослый', 'Детский', 'Льготный', 'Студенческий']
+ORDER_STATUSES = ['PAID', 'CANCELLED', 'REFUNDED']
+TICKET_STATUSES = ['ACTIVE', 'USED', 'RETURNED']
+FIRST_NAMES = ['Александр', 'Мария', 'Иван', 'Анна', 'Дмитрий', 'Елена', 'Сергей', 'Ольга']
+SURNAMES = ['Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Васильев', 'Петрова', 'Соколов', 'Новикова']
+OKVED = [
+    ('47.91', 'Торговля розничная по почте или по информационно-коммуникационной сети Интернет'),
+    ('62.01', 'Разработка компьютерного программного обеспечения'),
+    ('49.41', 'Деятельность автомобильного грузового транспорта'),
+    ('56.10', 'Деятельность ресторанов и услуги по доставке продуктов питания'),
+]
+OBJECT_TYPES = ['Земельный участок', 'Здание', 'Помещение', 'Сооружение']
+OBJECT_STATUSES = ['Актуальный', 'Архивный', 'Временный']
+
+
+def _moment(rng):
+    return BASE_DATE + datetime.timedelta(seconds=rng.randrange(PERIOD_DAYS * 86400))
+
+
+def _digits(rng, count):
+    return ''.join(rng.choice('0123456789') for _ in range(count))
+
+
+class RecordStream:
+    """Поток записей с повторами и испорченными значениями в заданных долях.
+
+    Номера новых записей (из них строятся ключи) идут с ``first_index``;
+    ``last_index`` — номер последней выданной новой записи.
+    """
+
+    def __init__(self, make_record, spoil_record, seed=0, duplicate_rate=0.0, dirty_rate=0.0, first_index=1):
+        self.rng = random.Random(seed)
+        self.last_index = first_index - 1
+        self.make_record = make_record
+        self.spoil_record = spoil_record
+        self.duplicate_rate = duplicate_rate
+        self.dirty_rate = dirty_rate
+        self.pool = []
+        self.counts = {'records': 0, 'duplicates': 0, 'dirty': 0}
+
+    def __iter__(self):
+        while True:
+            rng = self.rng
+            self.counts['records'] += 1
+            if self.pool and rng.random() < self.duplicate_rate:
+                self.counts['duplicates'] += 1
+                yield rng.choice(self.pool)
+                continue
+
+            self.last_index += 1
+            record = self.make_record(rng, self.last_index)
+            if rng.random() < self.dirty_rate:
+                self.counts['dirty'] += 1
+                self.spoil_record(rng, record)
+            if len(self.pool) < DUPLICATE_POOL:
+                self.pool.append(record)
+            else:
+                self.pool[rng.randrange(DUPLICATE_POOL)] = record
+            yield record
+
+
+def museum_ticket(rng, index):
+    museum, inn = rng.choice(MUSEUMS)
+    created = _moment(rng)
+    start = created + datetime.timedelta(days=rng.randrange(60), hours=rng.randrange(10, 20))
+    name, surname = rng.choice(FIRST_NAMES), rng.choice(SURNAMES)
+    event_kind = rng.choice(EVENT_KINDS)
+    event_id = rng.randrange(1, 5000)
+    spot_id = rng.randrange(1, 300)
+    return {
+        'created': created.strftime('%Y-%m-%d %H:%M:%S+03:00'),
+        'order_status': rng.choice(ORDER_STATUSES),
+        'ticket_status': rng.choice(TICKET_STATUSES),
+        'ticket_price': rng.choice([150, 250, 300, 500, 700, 1000]),
+        'visitor_category': rng.choice(VISITOR_CATEGORIES),
+        'event_id': event_id,
+        'is_active': rng.random() < 0.9,
+        'valid_to': (start + datetime.timedelta(days=1)).strftime('%Y-%m-%d'),
+        'count_visitor': rng.randrange(1, 5),
+        'is_entrance': rng.random() < 0.7,
+        'is_entrance_mdate': (start + datetime.timedelta(minutes=rng.randrange(90))).strftime('%Y-%m-%d %H:%M:%S+03:00'),
+        'event_name': f'{event_kind} №{event_id}',
+        'event_kind_name': event_kind,
+        'spot_id': spot_id,
+        'spot_name': f'Зал {spot_id}',
+        'museum_name': museum,
+        'start_datetime': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'ticket_id': index,
+        'update_timestamp': (created + datetime.timedelta(hours=rng.randrange(48))).strftime('%Y-%m-%d %H:%M:%S+03:00'),
+        'client_name': f'{surname} {name}',
+        'name': name,
+        'surname': surname,
+        'client_phone': rng.choice('78') + _digits(rng, 10),
+        'museum_inn': inn,
+        'birthday_date': (BASE_DATE - datetime.timedelta(days=rng.randrange(6000, 30000))).strftime('%d.%m.%Y'),
+        'order_number': f'ORD-{index // 3:010d}',
+        'ticket_number': f'TCK-{index:012d}',
+    }
+
+
+def spoil_museum_ticket(rng, record):
+    field = rng.choice(['client_phone', 'museum_inn', 'ticket_price', 'birthday_date'])
+    record[field] = {
+        'client_phone': _digits(rng, 6),
+        'museum_inn': _digits(rng, 7),
+        'ticket_price': rng.choice([-1, -150]),
+        'birthday_date': '31/02/99',
+    }[field]
+
+
+def entrepreneur(rng, index):
+    okved_code, okved_name = rng.choice(OKVED)
+    registered = _moment(rng)
+    return {
+        'date_exec': registered.strftime('%Y-%m-%d'),
+        'code_form_ind_entrep': '1',
+        'name_form_ind_entrep': 'Индивидуальный предприниматель',
+        'inf_surname_ind_entrep': {
+            'sex': rng.choice(['1', '2']),
+            'firstname': rng.choice(FIRST_NAMES),
+            'surname': rng.choice(SURNAMES),
+            'midname': rng.choice(['Иванович', 'Петровна', 'Сергеевич', None]),
+        },
+        'citizenship_kind': '1',
+        'inf_authority_reg_ind_entrep': {
+            'name': f'Межрайонная ИФНС России №{rng.randrange(1, 50)} по г. Москве',
+            'code': f'77{rng.randrange(1, 99):02d}',
+        },
+        'inf_reg_tax_ind_entrep': f'ИФНС №{rng.randrange(1, 50)}',
+        'inf_okved': {'code': okved_code, 'name': okved_name},
+        'process_dttm': registered.strftime('%Y-%m-%dT%H:%M:%S'),
+        'error_code': None,
+        'dob': (BASE_DATE - datetime.timedelta(days=rng.randrange(7000, 25000))).strftime('%Y-%m-%d'),
+        'date_ogrnip': registered.strftime('%Y-%m-%d'),
+        'id_card': f'{_digits(rng, 4)} {_digits(rng, 6)}',
+        'innfl': _digits(rng, 12),
+        'ogrnip': '3' + _digits(rng, 14),
+        'inf_okved_opt': [{'code': code, 'name': name} for code, name in rng.sample(OKVED, 2)],
+        'insured_pf': _digits(rng, 12),
+        'email_ind_entrep': f'ip{index}@example.ru',
+        'insuref_fss': _digits(rng, 10),
+    }
+
+
+def spoil_entrepreneur(rng, record):
+    field = rng.choice(['innfl', 'ogrnip', 'date_exec'])
+    record[field] = {
+        'innfl': _digits(rng, 9),
+        'ogrnip': _digits(rng, 11),
+        'date_exec': '2024/13/45',
+    }[field]
+
+
+def cadastral_object(rng, index):
+    quarter = f'{rng.randrange(1, 92):02d}:{rng.randrange(1, 40):02d}:{rng.randrange(10 ** 7):07d}'
+    return {
+        'object_common_data': {
+            'cad_number': f'{quarter}:{index}',
+            'quarter_cad_number': quarter,
+            'type': rng.choice(OBJECT_TYPES),
+            'previously_posted': rng.choice(['true', 'false']),
+        },
+        'metadata': {
+            'status': rng.choice(OBJECT_STATUSES),
+            'last_change_record_number': f'{quarter}-{rng.randrange(1, 100)}',
+            'last_container_fixed_at': _moment(rng).strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'object_formation': {
+            'method': rng.choice(['Образование', 'Раздел', 'Объединение']),
+            'area': f'{rng.uniform(10, 5000):.1f}',
+        },
+    }
+
+
+def spoil_cadastral_object(rng, record):
+    record['object_common_data']['cad_number'] = f'{_digits(rng, 3)}-{_digits(rng, 5)}'
+
+
+def _stream_kwargs(seed, duplicate_rate, dirty_rate, first_index):
+    return {'seed': seed, 'duplicate_rate': duplicate_rate, 'dirty_rate': dirty_rate, 'first_index': first_index}
+
+
+def write_museum_csv(path, target_bytes, seed=0, duplicate_rate=0.0, dirty_rate=0.0, first_index=1):
+    """CSV музейных билетов (разделитель ``;``) размером ~``target_bytes``"""
+    stream = RecordStream(museum_ticket, spoil_museum_ticket,
+                          **_stream_kwargs(seed, duplicate_rate, dirty_rate, first_index))
+    columns = column_names(MUSEUM_TICKET_SCHEMA)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(columns)
+        for record in stream:
+            writer.writerow([record[column] for column in columns])
+            if f.tell() >= target_bytes:
+                break
+    return dict(stream.counts, file=path, bytes=os.path.getsize(path), last_index=stream.last_index)
+
+
+def write_entrepreneur_json(path, target_bytes, seed=0, duplicate_rate=0.0, dirty_rate=0.0, first_index=1):
+    """JSON массив записей реестра предпринимателей размером ~``target_bytes``"""
+    stream = RecordStream(entrepreneur, spoil_entrepreneur,
+                          **_stream_kwargs(seed, duplicate_rate, dirty_rate, first_index))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        separator = ''
+        for record in stream:
+            f.write(separator)
+            f.write(json.dumps(record, ensure_ascii=False))
+            separator = ',\n'
+            if f.tell() >= target_bytes:
+                break
+        f.write('\n]\n')
+    return dict(stream.counts, file=path, bytes=os.path.getsize(path), last_index=stream.last_index)
+
+
+def _write_element(xml_writer, name, value):
+    xml_writer.startElement(name, {})
+    if isinstance(value, dict):
+        for key, child in value.items():
+            _write_element(xml_writer, key, child)
+    elif value is not None:
+        xml_writer.characters(str(value))
+    xml_writer.endElement(name)
+
+
+def write_cadastral_xml(path, target_bytes, seed=0, duplicate_rate=0.0, dirty_rate=0.0, first_index=1):
+    """XML кадастровых объектов (элементы ``item``) размером ~``target_bytes``"""
+    stream = RecordStream(cadastral_object, spoil_cadastral_object,
+                          **_stream_kwargs(seed, duplicate_rate, dirty_rate, first_index))
+    with open(path, 'w', encoding='utf-8') as f:
+        xml_writer = XMLGenerator(f, encoding='utf-8')
+        xml_writer.startDocument()
+        xml_writer.startElement('extract_cadastral_objects', {})
+        for record in stream:
+            _write_element(xml_writer, 'item', record)
+            f.write('\n')
+            if f.tell() >= target_bytes:
+                break
+        xml_writer.endElement('extract_cadastral_objects')
+        xml_writer.endDocument()
+    return dict(stream.counts, file=path, bytes=os.path.getsize(path), last_index=stream.last_index)
+
+
+WRITERS = {
+    'csv': write_museum_csv,
+    'json': write_entrepreneur_json,
+    'xml': write_cadastral_xml,
+}
+
+
+def generate_dataset(output_dir, size_mb=256, files=4, formats=('csv', 'json', 'xml'), seed=0,
+                     duplicate_rate=0.01, dirty_rate=0.005):
+    """Набор ``files`` файлов каждого формата общим объёмом ~``size_mb`` МБ на формат.
+
+    Файлы кладутся в ``output_dir/<формат>/``; каждый файл получает свой
+    seed, производный от ``seed``. Номера записей продолжаются из файла в
+    файл, поэтому ключи пересекаются только через ``duplicate_rate``.
+    Возвращает пути и счётчики записей.
+    """
+    target_bytes = size_mb * 1024 * 1024 // files
+    result = {}
+    for fmt_index, fmt in enumerate(formats):
+        directory = os.path.join(output_dir, fmt)
+        os.makedirs(directory, exist_ok=True)
+        stats = []
+        next_index = 1
+        for i in range(files):
+            path = os.path.join(directory, f'synthetic_{i:03d}.{fmt}')
+            stats.append(WRITERS[fmt](path, target_bytes, seed=seed * 1000 + fmt_index * 100 + i,
+                                      duplicate_rate=duplicate_rate, dirty_rate=dirty_rate, first_index=next_index))
+            next_index = stats[-1]['last_index'] + 1
+        result[fmt] = stats
+        total = sum(item['bytes'] for item in stats)
+        records = sum(item['records'] for item in stats)
+        print(f"Generated {len(stats)} {fmt} files: {records} records, {total / 1024 / 1024:.1f} MB")
+    return result
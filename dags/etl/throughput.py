@@ -0,0 +1,92 @@
+"""Отставание streaming запросов от Kafka и план запуска Spark job'а.
+
+Последние offset'ы топиков берутся из Kafka (high watermark), позиции
+запросов — из файлов, которые публикуют job'ы (``OFFSETS_DIR``). Запросу
+засчитывается отставание только по топикам, на которые он подписан. Для
+запроса, ещё не публиковавшего позицию, backlog — весь хранимый топик
+(job читает с ``earliest``). План (``etl.spark_jobs.throughput.plan_throughput``)
+уходит в XCom и подставляется в ``spark_submit_command(throughput_task_id=...)``.
+"""
+import json
+import os
+
+from etl.config import KAFKA_BOOTSTRAP_SERVERS, METRICS_DIR, OFFSETS_DIR, SPARK_MAX_CORES
+from etl.spark_jobs.throughput import plan_throughput, record_decision
+
+WATERMARK_TIMEOUT_SECONDS = 10
+
+
+def topic_watermarks(topics, bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS):
+    """``{топик: {раздел: (low, high)}}``; отсутствующие топики пропускаются"""
+    from confluent_kafka import Consumer, TopicPartition
+
+    consumer = Consumer({
+        'bootstrap.servers': bootstrap_servers,
+        'group.id': 'etl-throughput-probe',
+        'enable.auto.commit': False,
+    })
+    try:
+        metadata = consumer.list_topics(timeout=WATERMARK_TIMEOUT_SECONDS)
+        watermarks = {}
+        for topic in topics:
+            if topic not in metadata.topics or metadata.topics[topic].error is not None:
+                print(f"Topic {topic} is not available, lag is not measured")
+                continue
+            watermarks[topic] = {
+                str(partition): consumer.get_watermark_offsets(
+                    TopicPartition(topic, partition), timeout=WATERMARK_TIMEOUT_SECONDS
+                )
+                for partition in metadata.topics[topic].partitions
+            }
+        return watermarks
+    finally:
+        consumer.close()
+
+
+def query_offsets(query, offsets_dir=OFFSETS_DIR):
+    """Опубликованная позиция запроса ``{топик: {раздел: offset}}`` или None"""
+    path = os.path.join(offsets_dir, f'{query}.json')
+    try:
+        with open(path) as f:
+            return json.load(f)['offsets']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def topic_lag(watermarks, positions):
+    """Отставание по топикам ``{топик: offsets}`` из watermark'ов и позиций ``{запрос: (топики, offsets)}``.
+
+    Запрос учитывается только для топиков, которые он читает; для топика
+    берётся самый отстающий из них. Топик без новых сообщений (позиции на
+    high watermark) даёт нулевое отставание.
+    """
+    lag = {}
+    for topic, partitions in watermarks.items():
+        per_query = []
+        for subscribed, offsets in positions.values():
+            if topic not in subscribed:
+                continue
+            committed = (offsets or {}).get(topic, {})
+            per_query.append(sum(
+                max(high - max(committed.get(partition, low), low), 0)
+                for partition, (low, high) in partitions.items()
+            ))
+        lag[topic] = max(per_query) if per_query else 0
+    return lag
+
+
+def measure_lag(queries, bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS, offsets_dir=OFFSETS_DIR):
+    """Отставание по топикам для запросов ``{запрос: [топики]}``"""
+    topics = sorted({topic for subscribed in queries.values() for topic in subscribed})
+    watermarks = topic_watermarks(topics, bootstrap_servers)
+    positions = {query: (set(subscribed), query_offsets(query, offsets_dir)) for query, subscribed in queries.items()}
+    return topic_lag(watermarks, positions)
+
+
+def plan_job_throughput(job, queries, max_cores=SPARK_MAX_CORES):
+    """Задача Airflow перед spark-submit: отставание, план и запись решения"""
+    lag = measure_lag(queries)
+    total = sum(lag.values())
+    plan = plan_throughput(total, max_cores)
+    record_decision(job, 'pre-run', total, plan, METRICS_DIR, topics=lag)
+    return plan
@@ -0,0 +1,178 @@
+"""DDL таблиц хранилища (схема dwh), вынесенных из DAG'ов"""
+
+# Курсы валют к USD по дням. Курс действует с rate_date до следующей даты
+# этой валюты. Начальное заполнение повторяет прежние фиксированные
+# коэффициенты и не перезаписывает уже загруженные курсы.
+CURRENCY_RATES_SQL = """
+CREATE SCHEMA IF NOT EXISTS dwh;
+
+CREATE TABLE IF NOT EXISTS dwh.dim_currency_rates (
+    currency VARCHAR(10) NOT NULL,
+    rate_date DATE NOT NULL,
+    rate_to_usd NUMERIC(18,8) NOT NULL,
+    source VARCHAR(50) DEFAULT 'seed',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (currency, rate_date)
+);
+
+INSERT INTO dwh.dim_currency_rates (currency, rate_date, rate_to_usd)
+SELECT seed.currency, day::date, seed.rate_to_usd
+FROM (VALUES ('USD', 1.0), ('EUR', 1.1), ('RUB', 0.01)) AS seed (currency, rate_to_usd)
+CROSS JOIN generate_series(DATE '2025-01-01', CURRENT_DATE + 1, INTERVAL '1 day') AS day
+ON CONFLICT (currency, rate_date) DO NOTHING;
+"""
+
+# Факты транзакций, секционированные по месяцам transaction_date.
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования.
+# Строки вне созданных секций попадают в DEFAULT и переносятся в свою
+# секцию при её создании. Индексы, созданные на родителе, создаются в каждой
+# секции; BRIN по времени занимает килобайты и почти не замедляет загрузку.
+FACT_TRANSACTIONS_SQL = """
+CREATE SCHEMA IF NOT EXISTS dwh;
+CREATE SCHEMA IF NOT EXISTS dwh_archive;
+
+-- Прежняя несекционированная таблица переименовывается; данные переносятся ниже
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'dwh' AND c.relname = 'fact_transactions' AND c.relkind = 'r'
+    ) THEN
+        ALTER TABLE dwh.fact_transactions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+        ALTER TABLE dwh.fact_transactions ADD COLUMN IF NOT EXISTS user_city VARCHAR(100);
+        ALTER TABLE dwh.fact_transactions ADD COLUMN IF NOT EXISTS user_email_domain VARCHAR(200);
+        DROP INDEX IF EXISTS dwh.idx_fact_transactions_date;
+        DROP INDEX IF EXISTS dwh.idx_fact_transactions_user;
+        DROP INDEX IF EXISTS dwh.idx_fact_transactions_updated;
+        DROP INDEX IF EXISTS dwh.idx_fact_transactions_date_currency;
+        ALTER TABLE dwh.fact_transactions RENAME CONSTRAINT fact_transactions_pkey TO fact_transactions_unpartitioned_pkey;
+        ALTER TABLE dwh.fact_transactions RENAME TO fact_transactions_unpartitioned;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS dwh.fact_transactions (
+    transaction_id VARCHAR(100) NOT NULL,
+    user_id INTEGER,
+    amount DECIMAL(15,2),
+    currency VARCHAR(10),
+    amount_usd DECIMAL(15,2),
+    transaction_date DATE NOT NULL,
+    transaction_hour INTEGER,
+    user_city VARCHAR(100),
+    user_email_domain VARCHAR(200),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (transaction_id, transaction_date)
+) PARTITION BY RANGE (transaction_date);
+
+CREATE TABLE IF NOT EXISTS dwh.fact_transactions_default
+    PARTITION OF dwh.fact_transactions DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_fact_transactions_user ON dwh.fact_transactions (user_id);
+CREATE INDEX IF NOT EXISTS idx_fact_transactions_date_currency ON dwh.fact_transactions (transaction_date, currency);
+CREATE INDEX IF NOT EXISTS brin_fact_transactions_date ON dwh.fact_transactions USING brin (transaction_date);
+CREATE INDEX IF NOT EXISTS brin_fact_transactions_updated ON dwh.fact_transactions USING brin (updated_at);
+
+-- Месячная секция, содержащая month_start; строки её диапазона из DEFAULT переносятся в неё
+CREATE OR REPLACE FUNCTION dwh.create_fact_transactions_partition(month_start DATE)
+RETURNS TEXT LANGUAGE plpgsql AS $$
+DECLARE
+    range_start DATE := date_trunc('month', month_start)::date;
+    range_end DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::date;
+    partition_table TEXT := 'fact_transactions_p' || to_char(month_start, 'YYYYMM');
+BEGIN
+    IF to_regclass('dwh.' || partition_table) IS NOT NULL THEN
+        RETURN partition_table;
+    END IF;
+
+    DROP TABLE IF EXISTS pg_temp.tmp_default_rows;
+    CREATE TEMP TABLE tmp_default_rows (LIKE dwh.fact_transactions_default);
+    WITH moved AS (
+        DELETE FROM dwh.fact_transactions_default
+        WHERE transaction_date >= range_start AND transaction_date < range_end
+        RETURNING *
+    )
+    INSERT INTO tmp_default_rows SELECT * FROM moved;
+
+    EXECUTE format(
+        'CREATE TABLE dwh.%I PARTITION OF dwh.fact_transactions FOR VALUES FROM (%L) TO (%L)',
+        partition_table, range_start, range_end
+    );
+    INSERT INTO dwh.fact_transactions SELECT * FROM tmp_default_rows;
+    DROP TABLE pg_temp.tmp_default_rows;
+    RETURN partition_table;
+END $$;
+
+-- Обслуживание секций: текущий месяц и months_ahead вперёд, месяцы из DEFAULT;
+-- секции старше retention_months отсоединяются и переносятся в dwh_archive
+CREATE OR REPLACE FUNCTION dwh.manage_fact_transactions_partitions(
+    months_ahead INTEGER DEFAULT 3,
+    retention_months INTEGER DEFAULT 24
+)
+RETURNS TABLE (partition_table TEXT, partition_action TEXT) LANGUAGE plpgsql AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => retention_months))::date;
+    month_start DATE;
+    rec RECORD;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', CURRENT_DATE),
+            date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead),
+            INTERVAL '1 month'
+        )::date
+        UNION
+        SELECT DISTINCT date_trunc('month', d.transaction_date)::date
+        FROM dwh.fact_transactions_default d
+        WHERE d.transaction_date >= cutoff
+        ORDER BY 1
+    LOOP
+        partition_table := dwh.create_fact_transactions_partition(month_start);
+        partition_action := 'ensured';
+        RETURN NEXT;
+    END LOOP;
+
+    FOR rec IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'dwh.fact_transactions'::regclass
+          AND c.relname ~ '^fact_transactions_p[0-9]{6}$'
+          AND to_date(right(c.relname, 6), 'YYYYMM') < cutoff
+    LOOP
+        EXECUTE format('ALTER TABLE dwh.fact_transactions DETACH PARTITION dwh.%I', rec.relname);
+        EXECUTE format('DROP TABLE IF EXISTS dwh_archive.%I', rec.relname);
+        EXECUTE format('ALTER TABLE dwh.%I SET SCHEMA dwh_archive', rec.relname);
+        partition_table := rec.relname;
+        partition_action := 'archived';
+        RETURN NEXT;
+    END LOOP;
+END $$;
+
+-- Перенос данных прежней таблицы: секции создаются по её месяцам
+DO $$
+BEGIN
+    IF to_regclass('dwh.fact_transactions_unpartitioned') IS NOT NULL THEN
+        PERFORM dwh.create_fact_transactions_partition(m.month_start)
+        FROM (
+            SELECT DISTINCT date_trunc('month', COALESCE(transaction_date, created_at::date))::date AS month_start
+            FROM dwh.fact_transactions_unpartitioned
+        ) m
+        WHERE m.month_start IS NOT NULL;
+
+        INSERT INTO dwh.fact_transactions (transaction_id, user_id, amount, currency, amount_usd,
+                                           transaction_date, transaction_hour, user_city,
+                                           user_email_domain, created_at, updated_at)
+        SELECT transaction_id, user_id, amount, currency, amount_usd,
+               COALESCE(transaction_date, created_at::date, CURRENT_DATE), transaction_hour, user_city,
+               user_email_domain, created_at, updated_at
+        FROM dwh.fact_transactions_unpartitioned
+        ON CONFLICT DO NOTHING;
+
+        DROP TABLE dwh.fact_transactions_unpartitioned;
+    END IF;
+END $$;
+"""
+
+# Секции на текущий и 3 следующих месяца, архивирование старше 24 месяцев
+MANAGE_FACT_PARTITIONS_SQL = "SELECT * FROM dwh.manage_fact_transactions_partitions(3, 24);"
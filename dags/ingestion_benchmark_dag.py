@@ -0,0 +1,85 @@
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from airflow.providers.postgres.operators.postgres import PostgresOperator
+from datetime import datetime, timedelta
+from etl.benchmark import BENCHMARK_TABLES_SQL, CASES
+
+default_args = {
+    'owner': 'data-engineer',
+    'depends_on_past': False,
+    'start_date': datetime(2025, 1, 1),
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 0,
+    'retry_delay': timedelta(minutes=5),
+}
+
+
+def generate_benchmark_data(params):
+    """Синтетические CSV/JSON/XML заданного объёма (детерминированы seed'ом)"""
+    import os
+    from etl.config import BENCHMARK_DIR
+    from etl.synthetic import generate_dataset
+
+    result = generate_dataset(
+        os.path.join(BENCHMARK_DIR, 'data'),
+        size_mb=int(params['size_mb']),
+        files=int(params['files']),
+        seed=int(params['seed']),
+        duplicate_rate=float(params['duplicate_rate']),
+        dirty_rate=float(params['dirty_rate']),
+    )
+    return {fmt: sum(item['records'] for item in stats) for fmt, stats in result.items()}
+
+
+def run_benchmark_case(case_name, params, run_id):
+    """Замер одного пути загрузки; результат в etl_benchmark_results"""
+    import os
+    from airflow.providers.postgres.hooks.postgres import PostgresHook
+    from etl.benchmark import run_case, save_results
+    from etl.config import BENCHMARK_DIR, POSTGRES_CONN_ID
+
+    dsn = PostgresHook(postgres_conn_id=POSTGRES_CONN_ID).get_uri()
+    stats = run_case(case_name, os.path.join(BENCHMARK_DIR, 'data'), os.path.join(BENCHMARK_DIR, 'work'), dsn=dsn)
+    save_results(dsn, [stats], run_id, label=params['label'], params=dict(params))
+    return stats
+
+
+with DAG(
+        'ingestion_benchmark',
+        default_args=default_args,
+        description='Synthetic data generation and ingestion throughput benchmark',
+        schedule_interval=None,  # Запуск только вручную
+        catchup=False,
+        params={
+            'size_mb': 1024,
+            'files': 4,
+            'seed': 0,
+            'duplicate_rate': 0.01,
+            'dirty_rate': 0.005,
+            'label': '',
+        },
+        tags=['etl', 'benchmark'],
+) as dag:
+    # Таблица результатов и отдельные таблицы для загрузки (нужны таблицы data_ingestion_pipeline)
+    create_benchmark_tables = PostgresOperator(
+        task_id='create_benchmark_tables',
+        postgres_conn_id='postgres_default',
+        sql=BENCHMARK_TABLES_SQL,
+    )
+
+    generate_data = PythonOperator(
+        task_id='generate_benchmark_data',
+        python_callable=generate_benchmark_data,
+    )
+
+    # Сценарии идут по очереди: параллельные замеры мешали бы друг другу
+    previous = [create_benchmark_tables, generate_data]
+    for case_name in CASES:
+        benchmark_case = PythonOperator(
+            task_id=f'benchmark_{case_name}',
+            python_callable=run_benchmark_case,
+            op_kwargs={'case_name': case_name},
+        )
+        previous >> benchmark_case
+        previous = benchmark_case
@@ -1,8 +1,14 @@
 from airflow import DAG
 from airflow.operators.bash import BashOperator
 from airflow.operators.python import PythonOperator
+from airflow.providers.postgres.operators.postgres import PostgresOperator
 from datetime import datetime, timedelta
-import json
+from etl.config import SPARK_POOL
+from etl.metrics import push_task_metrics
+from etl.operators import InferSchemaOperator, KafkaProduceOperator
+from etl.spark_submit import build_job_package, spark_submit_command
+from etl.throughput import plan_job_throughput
+from etl.warehouse import CURRENCY_RATES_SQL
 
 default_args = {
     'owner': 'data-engineer',
@@ -12,165 +18,66 @@ default_args = {
     'email_on_retry': False,
     'retries': 1,
     'retry_delay': timedelta(minutes=3),
+    # Длительность, строки и байты задачи в Pushgateway
+    'on_success_callback': push_task_metrics,
 }
 
 
-def create_spark_streaming_job():
-    """Создание Spark Streaming job для обработки Kafka данных"""
-    spark_code = '''
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import *
-from pyspark.sql.types import *
-import json
-
-# Создание Spark сессии
-spark = SparkSession.builder \\
-    .appName("KafkaSparkStreaming") \\
-    .master("spark://spark-master:7077") \\
-    .config("spark.sql.adaptive.enabled", "true") \\
-    .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \\
-    .getOrCreate()
-
-spark.sparkContext.setLogLevel("WARN")
-
-# Схемы для разных типов данных
-user_schema = StructType([
-    StructField("user_id", IntegerType(), True),
-    StructField("name", StringType(), True),
-    StructField("email", StringType(), True),
-    StructField("registration_date", StringType(), True)
-])
-
-transaction_schema = StructType([
-    StructField("transaction_id", StringType(), True),
-    StructField("user_id", IntegerType(), True),
-    StructField("amount", DoubleType(), True),
-    StructField("currency", StringType(), True),
-    StructField("timestamp", StringType(), True)
-])
-
-event_schema = StructType([
-    StructField("event_id", StringType(), True),
-    StructField("user_id", IntegerType(), True),
-    StructField("event_type", StringType(), True),
-    StructField("properties", StringType(), True),
-    StructField("timestamp", StringType(), True)
-])
-
-# Чтение из Kafka
-kafka_df = spark \\
-    .readStream \\
-    .format("kafka") \\
-    .option("kafka.bootstrap.servers", "kafka:9092") \\
-    .option("subscribe", "user-events,transactions,system-events") \\
-    .option("startingOffsets", "latest") \\
-    .load()
-
-# Парсинг сообщений
-parsed_df = kafka_df.select(
-    col("topic"),
-    col("partition"),
-    col("offset"),
-    col("timestamp").alias("kafka_timestamp"),
-    col("value").cast("string").alias("json_data")
-)
-
-# Обработка разных топиков
-def process_user_events(df):
-    return df.filter(col("topic") == "user-events") \\
-        .select(
-            from_json(col("json_data"), user_schema).alias("data"),
-            col("kafka_timestamp")
-        ) \\
-        .select("data.*", "kafka_timestamp") \\
-        .withColumn("processed_at", current_timestamp())
-
-def process_transactions(df):
-    return df.filter(col("topic") == "transactions") \\
-        .select(
-            from_json(col("json_data"), transaction_schema).alias("data"),
-            col("kafka_timestamp")
-        ) \\
-        .select("data.*", "kafka_timestamp") \\
-        .withColumn("processed_at", current_timestamp()) \\
-        .withColumn("amount_usd", 
-            when(col("currency") == "RUB", col("amount") / 100)
-            .when(col("currency") == "EUR", col("amount") * 1.1)
-            .otherwise(col("amount"))
-        )
+# Закреплённые типы полей, которые использует streaming job
+TOPIC_SCHEMA_HINTS = {
+    'user-events': {'user_id': 'integer'},
+    'transactions': {'user_id': 'integer', 'amount': 'double', 'currency': 'string', 'timestamp': 'timestamp'},
+    'system-events': {'user_id': 'integer', 'properties': 'string'},
+}
+
+
+def _utc_now():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def generate_user_events(count=10):
+    """Тестовые пользовательские события"""
+    for i in range(1, count + 1):
+        yield {
+            'user_id': i,
+            'name': f'User{i}',
+            'email': f'user{i}@example.com',
+            'registration_date': _utc_now(),
+        }
+
 
-def process_system_events(df):
-    return df.filter(col("topic") == "system-events") \\
-        .select(
-            from_json(col("json_data"), event_schema).alias("data"),
-            col("kafka_timestamp")
-        ) \\
-        .select("data.*", "kafka_timestamp") \\
-        .withColumn("processed_at", current_timestamp())
-
-# Обработка каждого типа данных
-user_events_df = process_user_events(parsed_df)
-transactions_df = process_transactions(parsed_df)
-system_events_df = process_system_events(parsed_df)
-
-# Запись в консоль для мониторинга
-user_query = user_events_df \\
-    .writeStream \\
-    .outputMode("append") \\
-    .format("console") \\
-    .option("truncate", False) \\
-    .queryName("user_events_console") \\
-    .start()
-
-transaction_query = transactions_df \\
-    .writeStream \\
-    .outputMode("append") \\
-    .format("console") \\
-    .option("truncate", False) \\
-    .queryName("transactions_console") \\
-    .start()
-
-# Агрегация данных
-transaction_aggregates = transactions_df \\
-    .groupBy(
-        window(col("kafka_timestamp"), "5 minutes"),
-        col("currency")
-    ) \\
-    .agg(
-        count("*").alias("transaction_count"),
-        sum("amount").alias("total_amount"),
-        avg("amount").alias("avg_amount"),
-        max("amount").alias("max_amount")
-    ) \\
-    .withColumn("window_start", col("window.start")) \\
-    .withColumn("window_end", col("window.end")) \\
-    .drop("window")
-
-# Запись агрегатов
-aggregate_query = transaction_aggregates \\
-    .writeStream \\
-    .outputMode("update") \\
-    .format("console") \\
-    .option("truncate", False) \\
-    .queryName("transaction_aggregates") \\
-    .start()
-
-print("Spark Streaming jobs started...")
-print("Monitoring queries for 2 minutes...")
-
-# Ожидание обработки
-user_query.awaitTermination(120)
-transaction_query.awaitTermination(120)
-aggregate_query.awaitTermination(120)
-
-print("Spark Streaming completed!")
-spark.stop()
-'''
-
-    with open('/tmp/spark_streaming_job.py', 'w') as f:
-        f.write(spark_code)
-
-    print("Spark streaming job created!")
+def generate_transactions(count=15):
+    """Тестовые транзакции"""
+    import random
+    import time
+
+    run_id = int(time.time())
+    for i in range(1, count + 1):
+        yield {
+            'transaction_id': f'tx_{run_id}_{i}',
+            'user_id': random.randint(1, 10),
+            'amount': random.randint(100, 10099),
+            'currency': random.choice(['USD', 'EUR', 'RUB']),
+            'timestamp': _utc_now(),
+        }
+
+
+def generate_system_events(count=8):
+    """Тестовые системные события"""
+    import json
+    import random
+    import time
+
+    run_id = int(time.time())
+    events = ['login', 'logout', 'page_view', 'click', 'purchase']
+    for i in range(1, count + 1):
+        yield {
+            'event_id': f'evt_{run_id}_{i}',
+            'user_id': random.randint(1, 10),
+            'event_type': random.choice(events),
+            'properties': json.dumps({'page': 'home'}),
+            'timestamp': _utc_now(),
+        }
 
 
 with DAG(
@@ -216,69 +123,76 @@ with DAG(
         """,
     )
 
-    # Генерация тестовых данных в Kafka
-    generate_test_data = BashOperator(
-        task_id='generate_test_data',
-        bash_command="""
-        echo "Generating test data for Kafka topics..."
-
-        # Пользовательские события
-        for i in {1..10}; do
-            echo "{\\"user_id\\": $i, \\"name\\": \\"User$i\\", \\"email\\": \\"user$i@example.com\\", \\"registration_date\\": \\"$(date -u +%Y-%m-%dT%H:%M:%SZ)\\"}" | \\
-            docker exec -i kafka kafka-console-producer \\
-                --topic user-events \\
-                --bootstrap-server kafka:9092
-            sleep 1
-        done
+    # Генерация тестовых данных в Kafka (пакетная отправка одним продюсером на топик)
+    generate_user_events_data = KafkaProduceOperator(
+        task_id='generate_user_events_data',
+        topic='user-events',
+        messages_callable=generate_user_events,
+        messages_kwargs={'count': 10},
+        key='user_id',
+    )
 
-        # Транзакции
-        currencies=("USD" "EUR" "RUB")
-        for i in {1..15}; do
-            currency=${currencies[$((RANDOM % 3))]}
-            amount=$((RANDOM % 10000 + 100))
-            user_id=$((RANDOM % 10 + 1))
-            echo "{\\"transaction_id\\": \\"tx_$(date +%s)_$i\\", \\"user_id\\": $user_id, \\"amount\\": $amount, \\"currency\\": \\"$currency\\", \\"timestamp\\": \\"$(date -u +%Y-%m-%dT%H:%M:%SZ)\\"}" | \\
-            docker exec -i kafka kafka-console-producer \\
-                --topic transactions \\
-                --bootstrap-server kafka:9092
-            sleep 2
-        done
+    generate_transactions_data = KafkaProduceOperator(
+        task_id='generate_transactions_data',
+        topic='transactions',
+        messages_callable=generate_transactions,
+        messages_kwargs={'count': 15},
+        key='user_id',
+    )
 
-        # Системные события
-        events=("login" "logout" "page_view" "click" "purchase")
-        for i in {1..8}; do
-            event_type=${events[$((RANDOM % 5))]}
-            user_id=$((RANDOM % 10 + 1))
-            echo "{\\"event_id\\": \\"evt_$(date +%s)_$i\\", \\"user_id\\": $user_id, \\"event_type\\": \\"$event_type\\", \\"properties\\": \\"{\\\\\\"page\\\\\\": \\\\\\"home\\\\\\"}\\", \\"timestamp\\": \\"$(date -u +%Y-%m-%dT%H:%M:%SZ)\\"}" | \\
-            docker exec -i kafka kafka-console-producer \\
-                --topic system-events \\
-                --bootstrap-server kafka:9092
-            sleep 1
-        done
+    generate_system_events_data = KafkaProduceOperator(
+        task_id='generate_system_events_data',
+        topic='system-events',
+        messages_callable=generate_system_events,
+        messages_kwargs={'count': 8},
+        key='user_id',
+    )
 
-        echo "Test data generation completed!"
-        """,
+    generate_test_data = [
+        generate_user_events_data,
+        generate_transactions_data,
+        generate_system_events_data,
+    ]
+
+    # Схемы сообщений по выборке из топиков
+    infer_topic_schemas = [
+        InferSchemaOperator(
+            task_id=f"infer_{topic.replace('-', '_')}_schema",
+            name=topic,
+            topic=topic,
+            hints=hints,
+        )
+        for topic, hints in TOPIC_SCHEMA_HINTS.items()
+    ]
+
+    # Сборка пакета Spark job'ов для --py-files
+    build_spark_package = PythonOperator(
+        task_id='build_job_package',
+        python_callable=build_job_package,
+    )
+
+    # Курсы валют для amount_usd транзакций
+    create_currency_rates = PostgresOperator(
+        task_id='create_currency_rates',
+        postgres_conn_id='postgres_default',
+        sql=CURRENCY_RATES_SQL,
     )
 
-    # Создание Spark streaming job
-    create_streaming_job = PythonOperator(
-        task_id='create_streaming_job',
-        python_callable=create_spark_streaming_job,
+    # Размер micro-batch и ресурсы по отставанию запросов от топиков
+    plan_streaming_throughput = PythonOperator(
+        task_id='plan_streaming_throughput',
+        python_callable=plan_job_throughput,
+        op_kwargs={'job': 'kafka_streaming',
+                   'queries': {'topic_fan_out': ['user-events', 'transactions', 'system-events'],
+                               'transaction_windows': ['transactions']}},
     )
 
     # Запуск Spark Streaming
     run_spark_streaming = BashOperator(
         task_id='run_spark_streaming',
-        bash_command="""
-        echo "Starting Spark Streaming job..."
-        docker exec spark-master /opt/spark/bin/spark-submit \\
-            --master spark://spark-master:7077 \\
-            --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.5.1,org.postgresql:postgresql:42.7.0 \\
-            --executor-memory 1g \\
-            --executor-cores 1 \\
-            --total-executor-cores 2 \\
-            /tmp/spark_streaming_job.py
-        """,
+        bash_command=spark_submit_command('kafka_streaming', dependencies=['kafka'],
+                                          throughput_task_id='plan_streaming_throughput'),
+        pool=SPARK_POOL,
     )
 
     # Проверка результатов
@@ -302,4 +216,9 @@ with DAG(
     )
 
     # Определение зависимостей
-    create_kafka_topics >> generate_test_data >> create_streaming_job >> run_spark_streaming >> check_processing_results
\ No newline at end of file
+    create_kafka_topics >> generate_test_data
+    for generate_task, infer_task in zip(generate_test_data, infer_topic_schemas):
+        generate_task >> infer_task
+    infer_topic_schemas >> build_spark_package >> plan_streaming_throughput >> run_spark_streaming
+    run_spark_streaming >> check_processing_results
+    create_currency_rates >> run_spark_streaming
\ No newline at end of file
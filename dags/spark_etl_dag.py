@@ -2,8 +2,11 @@ from airflow import DAG
 from airflow.operators.bash import BashOperator
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
-import requests
-import json
+from etl.config import SPARK_POOL
+from etl.metrics import push_task_metrics
+from etl.operators import KafkaProduceOperator
+from etl.spark_submit import build_job_package, spark_submit_command
+from etl.throughput import plan_job_throughput
 
 # Параметры DAG по умолчанию
 default_args = {
@@ -14,8 +17,23 @@ default_args = {
     'email_on_retry': False,
     'retries': 1,
     'retry_delay': timedelta(minutes=5),
+    # Длительность, строки и байты задачи в Pushgateway
+    'on_success_callback': push_task_metrics,
 }
 
+
+def generate_etl_data(count=10):
+    """Генерация тестовых данных для топика etl-data"""
+    import random
+
+    for i in range(1, count + 1):
+        yield {
+            'id': i,
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'value': random.randint(0, 99),
+        }
+
+
 # Создание DAG
 with DAG(
         'spark_etl_pipeline',
@@ -52,150 +70,42 @@ with DAG(
     )
 
     # Задача 3: Генерация тестовых данных и отправка в Kafka
-    generate_and_send_data = BashOperator(
+    generate_and_send_data = KafkaProduceOperator(
         task_id='generate_and_send_data',
-        bash_command="""
-        echo "Generating test data and sending to Kafka..."
-        # Генерируем JSON данные и отправляем в Kafka
-        for i in {1..10}; do
-            echo "{\"id\": $i, \"timestamp\": \"$(date -u +%Y-%m-%dT%H:%M:%SZ)\", \"value\": $((RANDOM % 100))}" | \
-            docker exec -i kafka kafka-console-producer \
-                --topic etl-data \
-                --bootstrap-server kafka:9092
-        done
-        echo "Sent 10 messages to Kafka topic 'etl-data'"
-        """,
+        topic='etl-data',
+        messages_callable=generate_etl_data,
+        messages_kwargs={'count': 10},
+        key='id',
+    )
+
+    # Сборка пакета Spark job'ов для --py-files
+    build_spark_package = PythonOperator(
+        task_id='build_job_package',
+        python_callable=build_job_package,
+    )
+
+    # Размер micro-batch и ресурсы по отставанию от etl-data
+    plan_kafka_throughput = PythonOperator(
+        task_id='plan_kafka_throughput',
+        python_callable=plan_job_throughput,
+        op_kwargs={'job': 'kafka_console', 'queries': {'kafka_console': ['etl-data']}},
     )
 
     # Задача 4: Spark задача для обработки данных из Kafka
     spark_kafka_processing = BashOperator(
         task_id='spark_kafka_processing',
-        bash_command="""
-        echo "Running Spark job to process Kafka data..."
-
-        # Создаём временный Python скрипт для Spark
-        cat > /tmp/spark_kafka_job.py << 'EOF'
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, from_json, current_timestamp
-from pyspark.sql.types import StructType, StructField, StringType, IntegerType, TimestampType
-
-# Создание Spark сессию
-spark = SparkSession.builder \
-    .appName("KafkaETLJob") \
-    .master("spark://spark-master:7077") \
-    .config("spark.sql.adaptive.enabled", "true") \
-    .getOrCreate()
-
-# Схема для JSON данных
-schema = StructType([
-    StructField("id", IntegerType(), True),
-    StructField("timestamp", StringType(), True),
-    StructField("value", IntegerType(), True)
-])
-
-try:
-    # Чтение данных из Kafka
-    kafka_df = spark \
-        .readStream \
-        .format("kafka") \
-        .option("kafka.bootstrap.servers", "kafka:9092") \
-        .option("subscribe", "etl-data") \
-        .option("startingOffsets", "earliest") \
-        .load()
-
-    # Парсинг JSON и добавление колонок
-    parsed_df = kafka_df \
-        .select(
-            from_json(col("value").cast("string"), schema).alias("data"),
-            current_timestamp().alias("processing_time")
-        ) \
-        .select(
-            col("data.id"),
-            col("data.timestamp"),
-            col("data.value"),
-            col("processing_time")
-        )
-
-    # Вывод результата
-    query = parsed_df \
-        .writeStream \
-        .outputMode("append") \
-        .format("console") \
-        .option("truncate", False) \
-        .start()
-
-    # Ожидание в течение 30 секунд для обработки
-    query.awaitTermination(30)
-    query.stop()
-
-    print("Spark Kafka processing completed successfully!")
-
-except Exception as e:
-    print(f"Error in Spark job: {e}")
-    raise
-
-finally:
-    spark.stop()
-EOF
-
-        # Запуск Spark job
-        docker exec -i spark-master /opt/spark/bin/spark-submit \
-            --master spark://spark-master:7077 \
-            --packages org.apache.spark:spark-sql-kafka-0-10_2.12:3.5.1 \
-            /tmp/spark_kafka_job.py
-        """,
+        bash_command=spark_submit_command(
+            'kafka_console', dependencies=['kafka'], executor_memory=None,
+            throughput_task_id='plan_kafka_throughput',
+        ),
+        pool=SPARK_POOL,
     )
 
     # Задача 5: Простая Spark задача для подсчёта статистики
     spark_statistics = BashOperator(
         task_id='spark_statistics',
-        bash_command="""
-        echo "Running Spark statistics job..."
-
-        # Создание Python скрипта для статистики
-        cat > /tmp/spark_stats.py << 'EOF'
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, count, avg, max, min
-
-# Создание Spark сессии
-spark = SparkSession.builder \
-    .appName("StatisticsJob") \
-    .master("spark://spark-master:7077") \
-    .getOrCreate()
-
-try:
-    # Создание тестовых данных
-    data = [(i, f"user_{i}", i * 10) for i in range(1, 101)]
-    df = spark.createDataFrame(data, ["id", "name", "score"])
-
-    # Вычисление статистики
-    stats = df.agg(
-        count("*").alias("total_records"),
-        avg("score").alias("avg_score"),
-        max("score").alias("max_score"),
-        min("score").alias("min_score")
-    )
-
-    print("=== Statistics Results ===")
-    stats.show()
-
-    # Сохранение результата
-    stats.coalesce(1).write.mode("overwrite").json("/tmp/spark_stats_output")
-    print("Statistics saved to /tmp/spark_stats_output")
-
-except Exception as e:
-    print(f"Error in statistics job: {e}")
-    raise
-
-finally:
-    spark.stop()
-EOF
-
-        # Запуск статистики
-        docker exec -i spark-master /opt/spark/bin/spark-submit \
-            --master spark://spark-master:7077 \
-            /tmp/spark_stats.py
-        """,
+        bash_command=spark_submit_command('statistics', executor_memory=None, total_executor_cores=None),
+        pool=SPARK_POOL,
     )
 
     # Задача 6: Проверка результатов
@@ -214,4 +124,4 @@ EOF
     )
 
     # Определение порядка выполнения задач
-    check_spark_cluster >> create_kafka_topic >> generate_and_send_data >> spark_kafka_processing >> spark_statistics >> check_results
\ No newline at end of file
+    check_spark_cluster >> create_kafka_topic >> generate_and_send_data >> build_spark_package >> plan_kafka_throughput >> spark_kafka_processing >> spark_statistics >> check_results
\ No newline at end of file